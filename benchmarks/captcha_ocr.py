@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+'''
+Accuracy and throughput benchmark of the offline captcha recognizer.
+
+Trains templates on a part of a labeled corpus (files named `012345*.png`)
+and evaluates on the rest. Without a corpus, noisy synthetic captchas are used.
+
+Usage:
+    ./benchmarks/captcha_ocr.py [CORPUS] [--synthetic N] [--train-fraction F] [--threshold T]
+'''
+
+import argparse
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw, ImageFont
+from checkege.captcha_ocr import CaptchaRecognizer, read_corpus
+
+def synthetic_captcha(code: str, rng: random.Random) -> bytes:
+    img = Image.new("L", (200, 60), 235)
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.load_default(size=34)
+
+    x = 12
+    for digit in code:
+        draw.text((x + rng.randint(-2, 2), 10 + rng.randint(-4, 4)), digit, fill=rng.randint(0, 60), font=font)
+        x += 30
+
+    for _ in range(3):
+        draw.line([(rng.randint(0, 200), rng.randint(0, 60)), (rng.randint(0, 200), rng.randint(0, 60))], fill=150, width=1)
+    for _ in range(300):
+        img.putpixel((rng.randrange(200), rng.randrange(60)), rng.randint(0, 255))
+
+    buf = io.BytesIO()
+    img.save(buf, "PNG")
+    return buf.getvalue()
+
+def synthetic_corpus(count: int, seed: int = 0) -> list[tuple[bytes, str]]:
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        code = "".join(rng.choice("0123456789") for _ in range(6))
+        corpus.append((synthetic_captcha(code, rng), code))
+    return corpus
+
+def main():
+    parser = argparse.ArgumentParser(description="Captcha recognizer benchmark")
+    parser.add_argument("corpus", nargs="?", help="directory with labeled captchas")
+    parser.add_argument("--synthetic", type=int, default=400, metavar="N", help="number of synthetic captchas without a corpus")
+    parser.add_argument("--train-fraction", type=float, default=0.5)
+    parser.add_argument("--threshold", type=float, default=0.85)
+    parser.add_argument("--save", metavar="PATH", help="save trained templates")
+    args = parser.parse_args()
+
+    corpus = list(read_corpus(args.corpus)) if args.corpus else synthetic_corpus(args.synthetic)
+    random.Random(1).shuffle(corpus)
+    split = int(len(corpus) * args.train_fraction)
+    train, test = corpus[:split], corpus[split:]
+    if not train or not test:
+        print("error: corpus is too small", file=sys.stderr)
+        return 1
+
+    recognizer = CaptchaRecognizer()
+    started = time.perf_counter()
+    used = recognizer.train(train)
+    train_time = time.perf_counter() - started
+    if not recognizer.is_trained:
+        print(f"error: not every digit is present in the {used} usable training captchas", file=sys.stderr)
+        return 1
+
+    correct = accepted = accepted_correct = segmented = digits_correct = 0
+    started = time.perf_counter()
+    for image, code in test:
+        result = recognizer.recognize(image)
+        if result is None:
+            continue
+
+        segmented += 1
+        digits_correct += sum(a == b for a, b in zip(result.code, code))
+        correct += result.code == code
+        if result.confidence >= args.threshold:
+            accepted += 1
+            accepted_correct += result.code == code
+    elapsed = time.perf_counter() - started
+
+    print(f"corpus:     {len(corpus)} captchas ({'synthetic' if not args.corpus else args.corpus})")
+    print(f"training:   {used}/{len(train)} usable, {train_time:.2f} s")
+    print(f"segmented:  {segmented / len(test):.1%}")
+    print(f"accuracy:   {correct / len(test):.1%} codes, {digits_correct / (len(test) * 6):.1%} digits")
+    print(f"threshold:  {args.threshold}: {accepted / len(test):.1%} solved automatically, "
+          f"{(accepted_correct / accepted) if accepted else 0:.1%} of them correct")
+    print(f"throughput: {len(test) / elapsed:.0f} captchas/s ({elapsed / len(test) * 1000:.2f} ms each)")
+
+    if args.save:
+        recognizer.save(args.save)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+'''
+Load test of the client against the local mock API (benchmarks/mock_server.py).
+
+Drives full check flows (captcha, login, results) at increasing concurrency
+and reports throughput and latency percentiles of a flow:
+  client  every participant has its own CheckegeClient, as separate CLI runs
+  batch   BatchRunner with one shared session, as --batch
+
+The mock runs in a thread with its own event loop, so the client loop
+is not slowed down by serving.
+
+Usage:
+    ./benchmarks/load.py [--participants N] [--concurrency 1,4,16,64] [--mode client,batch]
+                         [--latency [ENDPOINT=]MS ...] [--jitter MS] [--error-rate P]
+                         [--burst-every S] [--burst-length S] [--prefetch N] [--solve-ms MS] [--json]
+'''
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_server import MockPortal, parse_latency
+from checkege.batch import BatchRunner, RosterEntry
+from checkege.client import CheckegeClient
+from checkege.metrics import Metrics
+
+NAMES = ("Иван", "Мария", "Алексей", "Анна", "Дмитрий", "Елена", "Сергей", "Ольга")
+SURNAMES = ("Иванов", "Петров", "Смирнов", "Кузнецов", "Попов", "Соколов", "Лебедев", "Козлов")
+PATRONYMICS = ("Иванович", "Петрович", "Сергеевич", "Алексеевич", "Дмитриевич", "Андреевич")
+
+def roster(count: int, seed: int = 0) -> list[RosterEntry]:
+    rng = random.Random(seed)
+    return [RosterEntry(rng.choice(NAMES), rng.choice(SURNAMES), rng.choice(PATRONYMICS),
+                        f"{i:06d}", rng.choice((77, 78, 50, 66))) for i in range(count)]
+
+class MockThread:
+    '''
+    Serves a MockPortal from a background thread.
+    '''
+
+    def __init__(self, portal: MockPortal):
+        self.portal = portal
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="mock-portal", daemon=True)
+
+    def start(self) -> str:
+        self.thread.start()
+        return asyncio.run_coroutine_threadsafe(self.portal.start(), self.loop).result()
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.portal.stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+def percentile(values: list[float], q: float) -> float | None:
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[round(q * 100) - 1]
+
+async def run_clients(entries: list[RosterEntry], concurrency: int, solve, metrics: Metrics) -> tuple[list[float], int]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def flow(entry: RosterEntry):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            client = CheckegeClient(metrics=metrics)
+            try:
+                token, image = await client.get_captcha()
+                data = entry.login_data()
+                data.setCaptcha(token, await solve(image))
+                await client.login(data)
+                await client.get_results()
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                errors += 1
+            finally:
+                await client.stop()
+
+    await asyncio.gather(*(flow(entry) for entry in entries))
+    return latencies, errors
+
+async def run_batch(entries: list[RosterEntry], concurrency: int, solve, metrics: Metrics,
+                    prefetch: int) -> tuple[list[float], int]:
+    runner = BatchRunner(solve, concurrency, prefetch=prefetch, metrics=metrics)
+    latencies = []
+    errors = 0
+
+    def on_result(result):
+        nonlocal errors
+        if result.ok:
+            latencies.append(result.elapsed)
+        else:
+            errors += 1
+
+    await runner.run(entries, on_result)
+    return latencies, errors
+
+async def measure(mode: str, entries: list[RosterEntry], concurrency: int, solve, prefetch: int) -> dict:
+    metrics = Metrics()
+    start = time.perf_counter()
+    if mode == "client":
+        latencies, errors = await run_clients(entries, concurrency, solve, metrics)
+    else:
+        latencies, errors = await run_batch(entries, concurrency, solve, metrics, prefetch)
+    elapsed = time.perf_counter() - start
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 1)
+
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "flows": len(entries),
+        "ok": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "flows_per_second": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "p50_ms": ms(percentile(latencies, 0.5)),
+        "p90_ms": ms(percentile(latencies, 0.9)),
+        "p99_ms": ms(percentile(latencies, 0.99)),
+        "requests": sum(metrics.counters.get("responses_total", {}).values()),
+        "retries": sum(metrics.counters.get("retries_total", {}).values()),
+    }
+
+async def run(args, portal: MockPortal) -> list[dict]:
+    async def solve(image: bytes) -> str | None:
+        if args.solve_ms:
+            await asyncio.sleep(args.solve_ms / 1000)
+        return portal.code_of(image)
+
+    entries = roster(args.participants)
+    report = []
+    for mode in args.mode:
+        for concurrency in args.concurrency:
+            report.append(await measure(mode, entries, concurrency, solve, args.prefetch))
+            if not args.json:
+                print_row(report[-1])
+    return report
+
+COLUMNS = ("mode", "concurrency", "ok", "errors", "seconds", "flows_per_second",
+           "p50_ms", "p90_ms", "p99_ms", "requests", "retries")
+
+def print_row(row: dict):
+    print("  ".join(f"{str(row[column]):>{max(len(column), 6)}}" for column in COLUMNS), flush=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="CheckEGE client load test")
+    parser.add_argument("--participants", type=int, default=200)
+    parser.add_argument("--concurrency", default="1,4,16,64", help="comma-separated levels")
+    parser.add_argument("--mode", default="client,batch", help="client, batch or both")
+    parser.add_argument("--latency", action="append", default=[], metavar="[ENDPOINT=]MS")
+    parser.add_argument("--jitter", type=float, default=0, metavar="MS")
+    parser.add_argument("--error-rate", type=float, default=0, metavar="P")
+    parser.add_argument("--burst-every", type=float, default=0, metavar="S")
+    parser.add_argument("--burst-length", type=float, default=0, metavar="S")
+    parser.add_argument("--prefetch", type=int, default=2, help="captcha prefetch in batch mode")
+    parser.add_argument("--solve-ms", type=float, default=0, help="simulated captcha solving time")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+    args.concurrency = [int(level) for level in args.concurrency.split(",")]
+    args.mode = [mode.strip() for mode in args.mode.split(",")]
+    if any(mode not in ("client", "batch") for mode in args.mode):
+        parser.error("--mode must be client, batch or both")
+
+    portal = MockPortal(parse_latency(args.latency or ["20"]), args.jitter / 1000, args.error_rate,
+                        args.burst_every, args.burst_length, seed=args.seed)
+    mock = MockThread(portal)
+    CheckegeClient.BASE_URL = mock.start()
+
+    try:
+        if not args.json:
+            print("  ".join(f"{column:>{max(len(column), 6)}}" for column in COLUMNS))
+        report = asyncio.run(run(args, portal))
+    finally:
+        mock.stop()
+
+    if args.json:
+        print(json.dumps({"runs": report, "responses": {f"{endpoint} {status}": count
+                                                         for (endpoint, status), count in sorted(portal.counts.items())}},
+                         indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
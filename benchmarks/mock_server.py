@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+'''
+Local mock of the checkege.rustest.ru API for offline load testing.
+
+Emulates `region`, `captcha`, `participant/login` and `exam` with injected
+latency, random 5xx errors and periodic bursts of 429 Too Many Requests.
+Every participant gets stable results covering all statuses of the portal,
+written and oral parts.
+
+Usage:
+    ./benchmarks/mock_server.py [--port 8765] [--latency [ENDPOINT=]MS ...] [--jitter MS]
+                                [--error-rate P] [--burst-every S] [--burst-length S]
+
+Then point the client at it:
+    CHECKEGE_BASE_URL=http://localhost:8765/api/ ./main.py
+'''
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import secrets
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web
+from checkege.exams_model import STATUS_NAMES
+from checkege.regions import regions
+
+ERROR_STATUSES = (500, 502, 503, 504)
+
+# subject, extra fields, marks are (min100, max100) or (min5, max5) for Mark5-only exams
+SUBJECTS = (
+    ("Русский язык", {}, (24, 100)),
+    ("Математика (профильный уровень)", {}, (27, 100)),
+    ("Математика (базовый уровень)", {"IsBasicMath": True}, (2, 5)),
+    ("Физика", {}, (36, 100)),
+    ("Обществознание", {}, (42, 100)),
+    ("Английский язык", {"IsForeignLanguage": True}, (22, 100)),
+    ("Итоговое сочинение", {"IsComposition": True}, (2, 5)),
+)
+
+def render_captcha(code: str, rng: random.Random) -> bytes:
+    from PIL import Image, ImageDraw, ImageFont
+
+    img = Image.new("L", (200, 60), 235)
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.load_default(size=34)
+    for i, digit in enumerate(code):
+        draw.text((12 + 30 * i, 10 + rng.randint(-4, 4)), digit, fill=rng.randint(0, 60), font=font)
+    for _ in range(3):
+        draw.line([(rng.randint(0, 200), rng.randint(0, 60)), (rng.randint(0, 200), rng.randint(0, 60))], fill=150)
+
+    buf = io.BytesIO()
+    img.save(buf, "PNG")
+    return buf.getvalue()
+
+def participant_exams(participant: str) -> list[dict]:
+    '''
+    Stable set of exams of a participant. Statuses rotate through all
+    known ones, so a large roster shows every display status.
+    '''
+    rng = random.Random(participant)
+    statuses = list(STATUS_NAMES) + [None]  # None: final results without an appeal
+    exams = []
+    for i, (subject, extra, (low, high)) in enumerate(rng.sample(SUBJECTS, rng.randint(2, 5))):
+        status = rng.choice(statuses)
+        exam = {
+            "ExamId": 1000 + i,
+            "ExamDate": f"2025-06-{2 + 3 * i:02d}T00:00:00",
+            "Subject": subject,
+            "Status": status if status is not None else 0,
+            "HasResult": status is None or status >= 100,
+            **extra,
+        }
+        if high == 5:
+            exam["Mark5"] = rng.randint(low, high)
+        else:
+            # the oral part shares marks with the written one
+            exam.update(TestMark=rng.randint(0, high), MinMark=low, Mark5=None)
+        if extra.get("IsForeignLanguage"):
+            oral_status = rng.choice(statuses)
+            exam.update({
+                "OralExamId": 2000 + i,
+                "OralExamDate": f"2025-06-{3 + 3 * i:02d}T00:00:00",
+                "OralSubject": subject + " (устный)",
+                "OralStatus": oral_status if oral_status is not None else 0,
+                "HasOralResult": oral_status is None or oral_status >= 100,
+            })
+        exams.append(exam)
+    return exams
+
+class MockPortal:
+    '''
+    The mock API. `latency` maps endpoints (and "default") to a delay in
+    seconds, `jitter` is added uniformly on top. A share `error_rate` of
+    requests fails with a random 5xx; every `burst_every` seconds all
+    requests get 429 for `burst_length` seconds.
+    '''
+
+    def __init__(self, latency: dict[str, float] | None = None, jitter: float = 0.0,
+                 error_rate: float = 0.0, burst_every: float = 0.0, burst_length: float = 0.0,
+                 session_ttl: int = 3600, captchas: int = 32, seed: int | None = None):
+        self.latency = {"default": 0.0, **(latency or {})}
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.burst_every = burst_every
+        self.burst_length = burst_length
+        self.session_ttl = session_ttl
+        self.rng = random.Random(seed)
+        self.started = time.monotonic()
+        # rendering is slow, so a few images are rendered once and reused
+        self.images = []
+        for _ in range(captchas):
+            code = "".join(self.rng.choice("0123456789") for _ in range(6))
+            self.images.append((code, base64.b64encode(render_captcha(code, self.rng)).decode()))
+        self.codes = {base64.b64decode(image): code for code, image in self.images}
+        self.tokens: dict[str, str] = {}
+        self.sessions: dict[str, tuple[str, float]] = {}
+        self.counts: dict[tuple[str, int], int] = {}
+        self.runner: web.AppRunner | None = None
+
+    def code_of(self, image: bytes) -> str | None:
+        '''
+        The code of a captcha image served by this mock, for fake solvers.
+        '''
+        return self.codes.get(image)
+
+    def burst_left(self) -> float:
+        if self.burst_every <= 0 or self.burst_length <= 0:
+            return 0.0
+        phase = (time.monotonic() - self.started) % self.burst_every
+        return max(0.0, self.burst_length - phase)
+
+    @web.middleware
+    async def inject(self, request: web.Request, handler):
+        endpoint = request.path[len("/api/"):]
+        delay = self.latency.get(endpoint, self.latency["default"]) + self.rng.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        burst = self.burst_left()
+        if burst > 0:
+            response = web.Response(status=429, headers={"Retry-After": str(math.ceil(burst))})
+        elif self.error_rate > 0 and self.rng.random() < self.error_rate:
+            response = web.Response(status=self.rng.choice(ERROR_STATUSES))
+        else:
+            response = await handler(request)
+
+        key = (endpoint, response.status)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        return response
+
+    async def region(self, request: web.Request) -> web.Response:
+        return web.json_response([{"Id": region_id} for region_id in regions])
+
+    async def captcha(self, request: web.Request) -> web.Response:
+        code, image = self.rng.choice(self.images)
+        token = secrets.token_hex(16)
+        self.tokens[token] = code
+        return web.json_response({"Token": token, "Image": image})
+
+    async def login(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        code = self.tokens.pop(form.get("Token", ""), None)
+        if code is None or form.get("Captcha") != code:
+            return web.Response(status=400, text="Неверный код с картинки")
+        if not form.get("Hash") or not form.get("Document") or not form.get("Region", "").isdigit():
+            return web.Response(status=400, text="Не заполнены обязательные поля")
+
+        cookie = secrets.token_hex(16)
+        participant = f"{form['Hash']}:{form['Document']}:{form['Region']}"
+        self.sessions[cookie] = (participant, time.time() + self.session_ttl)
+        response = web.Response(status=204)
+        response.set_cookie("Participant", cookie, max_age=self.session_ttl, httponly=True)
+        return response
+
+    async def exam(self, request: web.Request) -> web.Response:
+        session = self.sessions.get(request.cookies.get("Participant", ""))
+        if session is None or session[1] < time.time():
+            return web.Response(status=401)
+
+        body = json.dumps({"Result": {"Exams": participant_exams(session[0])}}, ensure_ascii=False).encode("utf-8")
+        etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(body=body, content_type="application/json", headers={"ETag": etag})
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self.inject])
+        app.add_routes([
+            web.get("/api/region", self.region),
+            web.get("/api/captcha", self.captcha),
+            web.post("/api/participant/login", self.login),
+            web.get("/api/exam", self.exam),
+        ])
+        return app
+
+    async def start(self, host: str = "localhost", port: int = 0) -> str:
+        '''
+        Start serving in the running loop, returns the API base URL.
+        '''
+        self.runner = web.AppRunner(self.app(), access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{port}/api/"
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+def parse_latency(values: list[str]) -> dict[str, float]:
+    latency = {}
+    for value in values:
+        endpoint, _, ms = value.rpartition("=")
+        latency[endpoint or "default"] = float(ms) / 1000
+    return latency
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock of the checkege API")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", action="append", default=[], metavar="[ENDPOINT=]MS",
+                        help="response delay, e.g. --latency 50 --latency exam=400")
+    parser.add_argument("--jitter", type=float, default=0, metavar="MS", help="random extra delay")
+    parser.add_argument("--error-rate", type=float, default=0, metavar="P", help="share of 5xx responses")
+    parser.add_argument("--burst-every", type=float, default=0, metavar="S", help="period of 429 bursts")
+    parser.add_argument("--burst-length", type=float, default=0, metavar="S", help="length of 429 bursts")
+    parser.add_argument("--session-ttl", type=int, default=3600, metavar="S")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    portal = MockPortal(parse_latency(args.latency), args.jitter / 1000, args.error_rate,
+                        args.burst_every, args.burst_length, args.session_ttl, seed=args.seed)
+    print(f"CHECKEGE_BASE_URL=http://{args.host}:{args.port}/api/")
+    web.run_app(portal.app(), host=args.host, port=args.port, access_log=None, print=None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+'''
+Cold-start benchmark: measures import cost of the CLI using `python -X importtime`.
+
+Usage:
+    ./benchmarks/startup.py [--runs N] [--top N] [--json]
+'''
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What each code path imports before doing any work.
+SCENARIOS = {
+    "cli": "import checkege.cli",
+    "results": "import checkege.cli, checkege.client",
+    "login": "import checkege.cli, checkege.client, checkege.captcha_gui, cryptography.fernet",
+}
+
+# Modules that must not be loaded by a plain `import checkege.cli`.
+HEAVY = ("aiohttp", "cryptography", "tkinter", "PIL", "readline", "gnureadline")
+
+def importtime(code: str) -> dict[str, tuple[int, int]]:
+    '''
+    Returns {module: (self_us, cumulative_us)} for a single cold run.
+    '''
+
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+def main():
+    parser = argparse.ArgumentParser(description="CheckEGE CLI startup benchmark")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=10, help="number of slowest modules to show")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    report = {}
+    for scenario, code in SCENARIOS.items():
+        totals = []
+        for _ in range(args.runs):
+            modules = importtime(code)
+            totals.append(sum(self_us for self_us, _ in modules.values()))
+
+        slowest = sorted(modules.items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+        report[scenario] = {
+            "median_ms": statistics.median(totals) / 1000,
+            "min_ms": min(totals) / 1000,
+            "modules": len(modules),
+            "heavy": sorted({name.split(".")[0] for name in modules} & set(HEAVY)),
+            "slowest": [(name, self_us / 1000) for name, (self_us, _) in slowest],
+        }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for scenario, result in report.items():
+            print(f"{scenario:<8} median {result['median_ms']:7.1f} ms, "
+                  f"min {result['min_ms']:7.1f} ms, {result['modules']} modules, "
+                  f"heavy: {', '.join(result['heavy']) or '-'}")
+            for name, ms in result["slowest"]:
+                print(f"    {ms:7.2f} ms  {name}")
+
+    if report["cli"]["heavy"]:
+        print(f"error: `import checkege.cli` loads {', '.join(report['cli']['heavy'])}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
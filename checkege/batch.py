@@ -0,0 +1,313 @@
+import asyncio
+import csv
+import inspect
+import itertools
+import json
+import os
+import time
+import aiohttp
+from typing import AsyncIterable, Awaitable, Callable, Iterable, Iterator
+from .captcha_pool import Captcha, CaptchaPool
+from .client import CheckegeClient, LoginError, SessionExpiredError
+from .exams_model import ExamStatus
+from .login_model import LoginData
+from .metrics import Metrics
+from .regions import index
+from .retry import CircuitBreaker, RateLimit
+from .transport import ConnectionStats, TransportConfig
+from .sessions import SessionStore
+
+class RosterEntry:
+    def __init__(self, name: str, surname: str, patronymic: str, passnum: str, region: int):
+        self.name = name.strip()
+        self.surname = surname.strip()
+        self.patronymic = patronymic.strip()
+        self.passnum = passnum.strip()
+        self.region = region
+
+    @property
+    def display_name(self) -> str:
+        return f"{self.surname} {self.name} {self.patronymic}"
+
+    def login_data(self) -> LoginData:
+        return LoginData(self.name, self.surname, self.patronymic, self.passnum, self.region)
+
+    @classmethod
+    def from_row(cls, row: dict) -> "RosterEntry":
+        '''
+        Build an entry from a roster row (CSV or JSONL).
+        Region may be given either by number or by name (case and ё/е insensitive).
+        '''
+
+        for field in ("name", "surname", "patronymic", "region"):
+            if not str(row.get(field) or "").strip():
+                raise ValueError(f"Missing field \"{field}\"")
+        # JSON rows may have numbers, which only passport and region can be
+        for field in ("name", "surname", "patronymic"):
+            if not isinstance(row[field], str):
+                raise ValueError(f"Field \"{field}\" must be a string")
+
+        passnum = str(row.get("passnum") or row.get("passport") or "").strip()
+        if not passnum.isdigit() or len(passnum) != 6:
+            raise ValueError("Passport must contain 6 digits")
+
+        region = index.resolve(row["region"])
+        if region is None:
+            raise ValueError(f"Unknown region \"{row['region']}\"")
+
+        return cls(row["name"], row["surname"], row["patronymic"], passnum, region)
+
+class InvalidEntry:
+    '''
+    Roster row that could not be parsed. Checking it fails with the
+    parse error, so one bad row does not stop a long streaming run.
+    '''
+
+    def __init__(self, row: int, error: str):
+        self.row = row
+        self.error = error
+
+    @property
+    def display_name(self) -> str:
+        return f"Строка {self.row}"
+
+    def login_data(self) -> LoginData:
+        raise ValueError(self.error)
+
+def iter_roster(path: str, strict: bool = True) -> Iterator[RosterEntry]:
+    '''
+    Read a roster of participants from a CSV (with a header row) or JSONL
+    file lazily, row by row. The file is opened right away.
+    Expected fields: name, surname, patronymic, passnum (or passport), region.
+    Invalid rows raise ValueError, or become an InvalidEntry unless `strict`.
+    '''
+
+    jsonl = os.path.splitext(path)[1].lower() in (".jsonl", ".ndjson", ".json")
+    if jsonl:
+        f = open(path, "r", encoding="utf-8")
+        rows = (line for line in f if line.strip())
+    else:
+        f = open(path, "r", encoding="utf-8-sig", newline="")
+        rows = csv.DictReader(f)
+
+    def entries():
+        with f:
+            for i, row in enumerate(rows, start=1):
+                try:
+                    if jsonl:
+                        row = json.loads(row)
+                        if not isinstance(row, dict):
+                            raise ValueError("expected a JSON object")
+                    entry = RosterEntry.from_row(row)
+                except ValueError as e:
+                    if strict:
+                        raise ValueError(f"{path}, row {i}: {e}") from None
+                    entry = InvalidEntry(i, str(e))
+                yield entry
+
+    return entries()
+
+def read_roster(path: str) -> list[RosterEntry]:
+    '''
+    Read a whole roster, see `iter_roster`.
+    '''
+    return list(iter_roster(path))
+
+ROSTER_FIELDS = ("name", "surname", "patronymic", "passnum", "region")
+
+def write_roster(path: str, entries: list[RosterEntry]):
+    '''
+    Write a roster readable by `read_roster`: JSONL or CSV by file extension.
+    '''
+
+    rows = [{field: getattr(entry, field) for field in ROSTER_FIELDS} for entry in entries]
+    if os.path.splitext(path)[1].lower() in (".jsonl", ".ndjson", ".json"):
+        with open(path, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+    else:
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, ROSTER_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+
+class BatchResult:
+    def __init__(self, entry: RosterEntry, exams: list[ExamStatus] | None = None, error: Exception | None = None,
+                 index: int | None = None, elapsed: float | None = None):
+        self.entry = entry
+        self.exams = exams
+        self.error = error
+        # position of the entry in the roster
+        self.index = index
+        # seconds the check took, from taking the entry to its result
+        self.elapsed = elapsed
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+# Roster entries read at once in a worker thread.
+READ_CHUNK = 256
+
+# Solves captcha image and returns the code, or None if it was skipped.
+CaptchaSolveFunc = Callable[[bytes], Awaitable[str | None]]
+
+# Gets the captcha image and whether the portal accepted its code.
+CaptchaReportFunc = Callable[[bytes, bool], Awaitable[None]]
+
+class BatchRunner:
+    '''
+    Checks results for many participants at once.
+    Every participant gets an isolated cookie jar, while all of them
+    share a single session and its connection pool. With a `store`, sessions are saved
+    per participant and reused on the next run without a captcha login.
+    With `prefetch` > 0 captchas are fetched ahead of demand into a pool.
+    All clients share one circuit breaker, so an overloaded portal pauses
+    the whole batch instead of every worker retrying on its own.
+    Saved sessions expiring within `refresh_margin` seconds are replaced
+    by a fresh login right away rather than failing later.
+    With a `rate_limit` all requests of the batch fit into its budget.
+    The outcome of every captcha login is passed to `report_captcha`.
+    '''
+
+    def __init__(self, solve_captcha: CaptchaSolveFunc, concurrency: int = 8,
+                 store: SessionStore | None = None, prefetch: int = 0,
+                 transport: TransportConfig | None = None, refresh_margin: float = 300,
+                 metrics: Metrics | None = None, rate_limit: RateLimit | None = None,
+                 report_captcha: CaptchaReportFunc | None = None):
+        self.solve_captcha = solve_captcha
+        self.report_captcha = report_captcha
+        self.concurrency = concurrency
+        self.store = store
+        self.prefetch = prefetch
+        self.transport = transport or TransportConfig(limit_per_host=concurrency + prefetch)
+        self.pool: CaptchaPool | None = None
+        self.breaker = CircuitBreaker()
+        self.stats = ConnectionStats()
+        self.metrics = metrics
+        self.rate_limit = rate_limit
+        self.refresh_margin = refresh_margin
+        self.reused = 0
+        self.logins = 0
+
+    async def run(self, entries: Iterable[RosterEntry] | AsyncIterable[RosterEntry],
+                  on_result: Callable[[BatchResult], Awaitable[None] | None] | None = None,
+                  skip: Callable[[int], bool] | None = None, collect: bool = True) -> list[BatchResult]:
+        '''
+        Check all entries. The roster is read lazily, a chunk at a time
+        and only as fast as the workers take entries, so any iterable
+        (e.g. `iter_roster`), or an async one fed as the check goes, can be
+        streamed through. Entries whose roster position `skip` returns True
+        for are not checked.
+        Returns the results in roster order, or nothing without `collect`,
+        so memory use does not depend on the roster size.
+        '''
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        results: list[BatchResult] = []
+        traces = [tracer.trace_config() for tracer in (self.stats, self.metrics) if tracer]
+        session = self.transport.shared_session(CheckegeClient.BASE_URL, traces)
+        pool_client = None
+        if self.prefetch > 0:
+            pool_client = CheckegeClient(breaker=self.breaker, transport=self.transport, session=session,
+                                         metrics=self.metrics, rate_limit=self.rate_limit)
+            self.pool = CaptchaPool(pool_client, self.prefetch)
+
+        async def stop_workers():
+            for _ in range(self.concurrency):
+                await queue.put(None)
+
+        async def read():
+            if isinstance(entries, AsyncIterable):
+                async for entry in entries:
+                    yield entry
+                return
+            iterator = iter(entries)
+            # a roster file is read off the event loop
+            while chunk := await asyncio.to_thread(list, itertools.islice(iterator, READ_CHUNK)):
+                for entry in chunk:
+                    yield entry
+
+        async def produce():
+            index = 0
+            async for entry in read():
+                if skip is None or not skip(index):
+                    await queue.put((index, entry))
+                index += 1
+            await stop_workers()
+
+        async def work():
+            while (item := await queue.get()) is not None:
+                index, entry = item
+                start = time.perf_counter()
+                try:
+                    exams = await self.__check(entry, session)
+                    result = BatchResult(entry, exams=exams, index=index, elapsed=time.perf_counter() - start)
+                except Exception as e:
+                    result = BatchResult(entry, error=e, index=index, elapsed=time.perf_counter() - start)
+
+                if on_result:
+                    # awaiting slow consumers (e.g. exports) holds back the workers
+                    ret = on_result(result)
+                    if inspect.isawaitable(ret):
+                        await ret
+                if collect:
+                    results.append(result)
+
+        workers = [asyncio.create_task(work()) for _ in range(self.concurrency)]
+        try:
+            await asyncio.gather(produce(), *workers)
+        finally:
+            # a failed roster read (or result handler) ends the run, the workers
+            # must not go on with the session closed under them
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            if self.pool:
+                await self.pool.stop()
+                await pool_client.stop()
+                self.pool = None
+            await session.close()
+        return sorted(results, key=lambda result: result.index)
+
+    async def __check(self, entry: RosterEntry, session: aiohttp.ClientSession) -> list[ExamStatus]:
+        data = entry.login_data()
+        client = CheckegeClient(store=self.store, session_key=data.participant_key(), breaker=self.breaker,
+                                transport=self.transport, session=session, metrics=self.metrics,
+                                rate_limit=self.rate_limit)
+        try:
+            await client.restore()
+            if client.is_logged_in and not client.needs_refresh(self.refresh_margin):
+                try:
+                    exams = await client.get_results()
+                    self.reused += 1
+                    return exams
+                except SessionExpiredError:
+                    # saved session is no longer valid, login again
+                    pass
+
+            if self.pool:
+                captcha = await self.pool.take()
+            else:
+                captcha = Captcha(*await client.get_captcha())
+            if not captcha.token or not captcha.image:
+                raise Exception("Failed to fetch captcha.")
+
+            start = time.perf_counter()
+            code = await self.solve_captcha(captcha.image)
+            if self.metrics:
+                self.metrics.observe("phase_seconds", ("captcha_solve",), time.perf_counter() - start)
+            if not code:
+                raise Exception("Captcha was not solved.")
+
+            data.setCaptcha(captcha.token, code)
+            try:
+                await client.login(data)
+            except LoginError:
+                if self.report_captcha:
+                    await self.report_captcha(captcha.image, False)
+                raise
+            if self.report_captcha:
+                await self.report_captcha(captcha.image, True)
+            self.logins += 1
+            return await client.get_results()
+        finally:
+            await client.stop()
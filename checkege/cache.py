@@ -0,0 +1,206 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+# Seconds a response is fresh, per endpoint. Endpoints not listed are not cached.
+DEFAULT_TTLS = {
+    "region": 24 * 60 * 60,
+    "exam": 30,
+}
+
+# Seconds after the TTL a response is still served while a fresh one is fetched.
+DEFAULT_STALE = {
+    "region": 7 * 24 * 60 * 60,
+    "exam": 5 * 60,
+}
+
+class CacheEntry:
+    __slots__ = ("body", "stored")
+
+    def __init__(self, body: bytes, stored: float):
+        self.body = body
+        self.stored = stored
+
+class DiskCache:
+    '''
+    On-disk tier of the response cache, a SQLite table of response bodies.
+    '''
+
+    def __init__(self, path: str | None = None):
+        self.path = path or self.default_path()
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, body BLOB NOT NULL, stored REAL NOT NULL)")
+        self.db.commit()
+
+    @staticmethod
+    def default_path():
+        '''
+        Returns the path to the response cache database.
+        '''
+        if os.getenv("CHECKEGE_CACHE"):
+            return os.getenv("CHECKEGE_CACHE")
+
+        path = "cache.db"
+        if os.name == "nt":
+            path = os.path.join(os.getenv("APPDATA"), "checkege", "cache.db")
+        elif os.name == "posix":
+            path = os.path.join(os.getenv("HOME"), ".checkege", "cache.db")
+
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        return path
+
+    def __load(self, key: str) -> CacheEntry | None:
+        with self.lock:
+            row = self.db.execute("SELECT body, stored FROM responses WHERE key = ?", (key,)).fetchone()
+        return CacheEntry(*row) if row else None
+
+    async def load(self, key: str) -> CacheEntry | None:
+        return await asyncio.to_thread(self.__load, key)
+
+    def __put(self, key: str, entry: CacheEntry):
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO responses (key, body, stored) VALUES (?, ?, ?)",
+                            (key, entry.body, entry.stored))
+
+    async def put(self, key: str, entry: CacheEntry):
+        await asyncio.to_thread(self.__put, key, entry)
+
+    def delete(self, key: str):
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def clear(self):
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM responses")
+
+    def close(self):
+        self.db.close()
+
+class ResponseCache:
+    '''
+    Cache of portal responses: an in-memory LRU bounded by `max_entries`
+    and `max_bytes`, backed by an optional `disk` tier for the endpoints in
+    `disk_endpoints` (all cached ones by default).
+    A response younger than its endpoint TTL is returned as is. A stale one,
+    within the stale window after the TTL, is returned too while a fresh
+    one is fetched in the background. Older ones are fetched right away.
+    One cache can be shared by many clients.
+    '''
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 8 * 1024 * 1024,
+                 ttls: dict[str, float] | None = None, stale: dict[str, float] | None = None,
+                 disk: DiskCache | None = None, disk_endpoints: tuple[str, ...] | None = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self.stale = DEFAULT_STALE if stale is None else stale
+        self.disk = disk
+        self.disk_endpoints = disk_endpoints
+        self.entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self.size = 0
+        self.revalidating: dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def __on_disk(self, endpoint: str) -> bool:
+        return self.disk is not None and (self.disk_endpoints is None or endpoint in self.disk_endpoints)
+
+    def __remember(self, key: str, entry: CacheEntry):
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old.body)
+        if len(entry.body) > self.max_bytes:
+            return
+
+        self.entries[key] = entry
+        self.size += len(entry.body)
+        while self.entries and (len(self.entries) > self.max_entries or self.size > self.max_bytes):
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted.body)
+
+    async def __lookup(self, key: str, endpoint: str) -> CacheEntry | None:
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            return entry
+
+        if self.__on_disk(endpoint):
+            entry = await self.disk.load(key)
+            if entry is not None:
+                self.__remember(key, entry)
+        return entry
+
+    async def put(self, key: str, endpoint: str, body: bytes):
+        if endpoint not in self.ttls:
+            return
+        entry = CacheEntry(body, time.time())
+        self.__remember(key, entry)
+        if self.__on_disk(endpoint):
+            await self.disk.put(key, entry)
+
+    def invalidate(self, key: str, endpoint: str):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry.body)
+        task = self.revalidating.pop(key, None)
+        if task is not None:
+            task.cancel()
+        if self.__on_disk(endpoint):
+            self.disk.delete(key)
+
+    def __revalidate(self, key: str, endpoint: str, fetch: Callable[[], Awaitable[bytes]]):
+        if key in self.revalidating:
+            return
+
+        async def revalidate():
+            try:
+                await self.put(key, endpoint, await fetch())
+            except Exception:
+                # the stale response stays until it expires
+                pass
+            finally:
+                self.revalidating.pop(key, None)
+
+        self.revalidating[key] = asyncio.get_running_loop().create_task(revalidate())
+
+    async def get(self, key: str, endpoint: str, fetch: Callable[[], Awaitable[bytes]],
+                  bypass: bool = False) -> bytes:
+        '''
+        Returns the cached body of `key` or the one returned by `fetch`,
+        which must raise on anything but a successful response.
+        With `bypass` the cache is not read, but still updated.
+        '''
+        ttl = self.ttls.get(endpoint)
+        if ttl is None:
+            return await fetch()
+
+        if not bypass:
+            entry = await self.__lookup(key, endpoint)
+            if entry is not None:
+                age = time.time() - entry.stored
+                if age < ttl:
+                    self.hits += 1
+                    return entry.body
+                if age < ttl + self.stale.get(endpoint, 0):
+                    self.stale_hits += 1
+                    self.__revalidate(key, endpoint, fetch)
+                    return entry.body
+
+        self.misses += 1
+        body = await fetch()
+        await self.put(key, endpoint, body)
+        return body
+
+    async def close(self):
+        for task in list(self.revalidating.values()):
+            task.cancel()
+        self.revalidating.clear()
+        if self.disk is not None:
+            self.disk.close()
@@ -2,6 +2,7 @@ import tkinter as tk
 import tkinter.messagebox as mbox
 from PIL import Image, ImageTk
 import io
+import sys
 
 class CaptchaGUI:
     def __init__(self):
@@ -14,7 +15,8 @@ class CaptchaGUI:
     def set_captcha(self, image: bytes):
         self.image = image
 
-    def solve(self) -> int:
+    def solve(self) -> str | None:
+        self.code = None
         self.window = tk.Tk()
         self.window.title("Необходимо решить капчу")
 
@@ -47,5 +49,12 @@ class CaptchaGUI:
             mbox.showerror("Ошибка", "Капча должна содержать только цифры.")
             return
         
-        self.code = int(code)
+        self.code = code
         self.window.destroy()
+
+if __name__ == "__main__":
+    # Used by solvers.GuiSolver: reads captcha image from stdin
+    # and prints the code entered by the user.
+    gui = CaptchaGUI()
+    gui.set_captcha(sys.stdin.buffer.read())
+    print(gui.solve() or "")
@@ -0,0 +1,278 @@
+import asyncio
+import io
+import os
+import time
+from collections import OrderedDict
+from typing import Iterable, Iterator
+from PIL import Image, ImageChops, ImageFilter, ImageOps, ImageStat
+from .solvers import CaptchaSolver
+
+# The portal captcha is always 6 digits, so recognition boils down to
+# cutting the image into 6 glyphs and matching each against 10 templates.
+# All per-pixel work is done by Pillow operations on whole images.
+DIGITS = 6
+TEMPLATE_SIZE = (16, 24)
+
+def binarize(image: bytes) -> Image.Image:
+    '''
+    Returns a black and white image where ink is white (255).
+    '''
+
+    img = Image.open(io.BytesIO(image)).convert("L")
+    img = ImageOps.autocontrast(img).filter(ImageFilter.MedianFilter(3))
+    threshold = otsu_threshold(img.histogram())
+    return img.point([255 if value < threshold else 0 for value in range(256)])
+
+def otsu_threshold(histogram: list[int]) -> int:
+    total = sum(histogram)
+    sum_all = sum(value * count for value, count in enumerate(histogram))
+    sum_back, weight_back = 0, 0
+    best, threshold = -1.0, 128
+
+    for value, count in enumerate(histogram):
+        weight_back += count
+        if weight_back == 0: continue
+        weight_fore = total - weight_back
+        if weight_fore == 0: break
+
+        sum_back += value * count
+        mean_back = sum_back / weight_back
+        mean_fore = (sum_all - sum_back) / weight_fore
+        between = weight_back * weight_fore * (mean_back - mean_fore) ** 2
+        if between > best:
+            best, threshold = between, value + 1
+    return threshold
+
+def segment(ink: Image.Image, min_ink: int = 3) -> list[Image.Image] | None:
+    '''
+    Cut the binarized captcha into glyphs normalized to TEMPLATE_SIZE.
+    Returns None if the image can't be split into exactly 6 glyphs.
+    '''
+
+    # mean ink of every column in one pass
+    columns = list(ink.resize((ink.width, 1), Image.Resampling.BOX).getdata())
+
+    runs, start = [], None
+    for x, value in enumerate(columns + [0]):
+        if value > min_ink and start is None:
+            start = x
+        elif value <= min_ink and start is not None:
+            if x - start >= 2:
+                runs.append([start, x])
+            start = None
+
+    # glyphs broken apart: glue together the closest neighbours
+    while len(runs) > DIGITS:
+        gaps = [runs[i + 1][0] - runs[i][1] for i in range(len(runs) - 1)]
+        i = gaps.index(min(gaps))
+        runs[i:i + 2] = [[runs[i][0], runs[i + 1][1]]]
+
+    # glyphs touching each other: split the widest run at its thinnest column
+    while 0 < len(runs) < DIGITS:
+        i = max(range(len(runs)), key=lambda i: runs[i][1] - runs[i][0])
+        x0, x1 = runs[i]
+        if x1 - x0 < 4:
+            break
+        quarter = (x1 - x0) // 4
+        cut = min(range(x0 + quarter, x1 - quarter), key=lambda x: columns[x])
+        runs[i:i + 1] = [[x0, cut], [cut, x1]]
+
+    if len(runs) != DIGITS:
+        return None
+
+    glyphs = []
+    for x0, x1 in runs:
+        glyph = ink.crop((x0, 0, x1, ink.height))
+        bbox = glyph.getbbox()
+        if bbox:
+            glyph = glyph.crop(bbox)
+        glyphs.append(glyph.resize(TEMPLATE_SIZE, Image.Resampling.BILINEAR))
+    return glyphs
+
+def similarity(a: Image.Image, b: Image.Image) -> float:
+    return 1 - ImageStat.Stat(ImageChops.difference(a, b)).mean[0] / 255
+
+def read_corpus(directory: str) -> Iterator[tuple[bytes, str]]:
+    '''
+    Yields (image, code) of labeled captchas: files named like `012345.png`
+    or `012345_anything.png`.
+    '''
+
+    for name in sorted(os.listdir(directory)):
+        code = name[:DIGITS]
+        if not code.isdigit() or not name.lower().endswith(".png"):
+            continue
+        with open(os.path.join(directory, name), "rb") as f:
+            yield f.read(), code
+
+class Recognition:
+    def __init__(self, code: str, confidence: float, scores: list[float]):
+        self.code = code
+        self.confidence = confidence
+        self.scores = scores
+
+class CaptchaRecognizer:
+    '''
+    Template matching recognizer of 6-digit captchas.
+    Templates are the averaged glyphs of a labeled corpus.
+    '''
+
+    def __init__(self, templates: dict[str, Image.Image] | None = None):
+        self.templates = templates or {}
+        self.samples = {digit: 1 for digit in self.templates}
+
+    @property
+    def is_trained(self) -> bool:
+        return len(self.templates) == 10
+
+    @staticmethod
+    def default_path():
+        '''
+        Returns the path to the templates file.
+        '''
+        if os.getenv("CHECKEGE_OCR_TEMPLATES"):
+            return os.getenv("CHECKEGE_OCR_TEMPLATES")
+
+        path = "captcha_templates.png"
+        if os.name == "nt":
+            path = os.path.join(os.getenv("APPDATA"), "checkege", "captcha_templates.png")
+        elif os.name == "posix":
+            path = os.path.join(os.getenv("HOME"), ".checkege", "captcha_templates.png")
+
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        return path
+
+    @classmethod
+    def load(cls, path: str | None = None) -> "CaptchaRecognizer":
+        '''
+        Load templates saved with `save`, or return an untrained recognizer.
+        '''
+        path = path or cls.default_path()
+        if not os.path.exists(path):
+            return cls()
+
+        width, height = TEMPLATE_SIZE
+        with Image.open(path) as atlas:
+            atlas = atlas.convert("L")
+            templates = {}
+            for digit in range(10):
+                template = atlas.crop((digit * width, 0, (digit + 1) * width, height))
+                if template.getbbox():
+                    templates[str(digit)] = template
+        return cls(templates)
+
+    def save(self, path: str | None = None):
+        # all 10 templates side by side in one image
+        width, height = TEMPLATE_SIZE
+        atlas = Image.new("L", (width * 10, height))
+        for digit, template in self.templates.items():
+            atlas.paste(template, (int(digit) * width, 0))
+        atlas.save(path or self.default_path())
+
+    def train(self, samples: Iterable[tuple[bytes, str]]) -> int:
+        '''
+        Add labeled captchas to the templates.
+        Returns the number of captchas that could be used.
+        '''
+
+        used = 0
+        for image, code in samples:
+            glyphs = segment(binarize(image))
+            if glyphs is None:
+                continue
+
+            for digit, glyph in zip(code, glyphs):
+                count = self.samples.get(digit, 0)
+                if count == 0:
+                    self.templates[digit] = glyph
+                else:
+                    # running average of all samples of the digit
+                    self.templates[digit] = Image.blend(self.templates[digit], glyph, 1 / (count + 1))
+                self.samples[digit] = count + 1
+            used += 1
+        return used
+
+    def recognize(self, image: bytes) -> Recognition | None:
+        '''
+        Returns the recognized code with confidence in [0, 1]:
+        similarity of the worst matching glyph to its template.
+        '''
+
+        if not self.is_trained:
+            return None
+
+        glyphs = segment(binarize(image))
+        if glyphs is None:
+            return None
+
+        code, scores = "", []
+        for glyph in glyphs:
+            digit, score = max(
+                ((digit, similarity(glyph, template)) for digit, template in self.templates.items()),
+                key=lambda match: match[1]
+            )
+            code += digit
+            scores.append(score)
+        return Recognition(code, min(scores), scores)
+
+# Fallback codes kept until the portal accepts or rejects them, a code
+# that never gets a verdict (e.g. the login failed on network) is dropped.
+UNCONFIRMED_SAMPLES = 256
+
+class RecognizingSolver(CaptchaSolver):
+    '''
+    Solves captchas locally and asks the `fallback` solver only when
+    recognition confidence is below `threshold`.
+    Captchas solved by the fallback are saved to `corpus` (if given)
+    to train the recognizer later, once the portal has accepted them.
+    '''
+
+    interactive = False
+
+    def __init__(self, fallback: CaptchaSolver, recognizer: CaptchaRecognizer | None = None,
+                 threshold: float = 0.85, corpus: str | None = None):
+        super().__init__()
+        self.fallback = fallback
+        self.recognizer = recognizer or CaptchaRecognizer.load()
+        self.threshold = threshold
+        self.corpus = corpus
+        self.recognized = 0
+        self.fallbacks = 0
+        # fallback codes waiting for the portal's verdict, oldest first
+        self.unconfirmed: OrderedDict[bytes, str] = OrderedDict()
+
+    @property
+    def unattended(self) -> bool:
+        return self.fallback.unattended
+
+    def solve_blocking(self, image: bytes) -> str | None:
+        result = self.recognizer.recognize(image)
+        if result and result.confidence >= self.threshold:
+            return result.code
+        return None
+
+    def __save_sample(self, image: bytes, code: str):
+        os.makedirs(self.corpus, exist_ok=True)
+        with open(os.path.join(self.corpus, f"{code}_{time.time_ns()}.png"), "wb") as f:
+            f.write(image)
+
+    async def solve(self, image: bytes) -> str | None:
+        code = await asyncio.to_thread(self.solve_blocking, image)
+        if code:
+            self.recognized += 1
+            return code
+
+        self.fallbacks += 1
+        code = await self.fallback.solve(image)
+        if code and self.corpus:
+            self.unconfirmed[image] = code
+            while len(self.unconfirmed) > UNCONFIRMED_SAMPLES:
+                self.unconfirmed.popitem(last=False)
+        return code
+
+    async def report(self, image: bytes, accepted: bool):
+        code = self.unconfirmed.pop(image, None)
+        if code and accepted:
+            await asyncio.to_thread(self.__save_sample, image, code)
+        await self.fallback.report(image, accepted)
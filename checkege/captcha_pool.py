@@ -0,0 +1,111 @@
+import asyncio
+import time
+from collections import deque
+from .client import CheckegeClient
+
+# Seconds a captcha is usable for, with time left to solve it.
+MAX_AGE = 240
+
+class Captcha:
+    def __init__(self, token: str, image: bytes, fetched: float | None = None):
+        self.token = token
+        self.image = image
+        self.fetched = fetched if fetched is not None else time.monotonic()
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.fetched
+
+class CaptchaPool:
+    '''
+    Keeps a few captchas fetched ahead of demand, so login workers
+    usually don't wait for GET captcha. When none are ready a worker
+    fetches its own instead of queueing behind the pool, and its errors
+    reach it as usual. The pool refills the whole shortfall at once and
+    backs off exponentially from `retry_delay` up to `max_retry_delay`
+    while fetching fails or returns empty captchas.
+    Captchas older than `max_age` are dropped before the portal would
+    reject their tokens, so `max_age` has to leave enough time to
+    actually solve the captcha.
+    '''
+
+    def __init__(self, client: CheckegeClient, size: int = 4, max_age: float = MAX_AGE,
+                 retry_delay: float = 2, max_retry_delay: float = 60):
+        self.client = client
+        self.size = size
+        self.max_age = max_age
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.ready: deque[Captcha] = deque()
+        self.taken = asyncio.Event()
+        self.task: asyncio.Task | None = None
+        self.failures = 0
+        self.fetched = 0
+        self.dropped = 0
+        self.direct = 0
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self.__fill())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def __drop_expired(self):
+        # captchas are kept in fetch order, the oldest ones are on the left
+        while self.ready and self.ready[0].age >= self.max_age:
+            self.ready.popleft()
+            self.dropped += 1
+
+    async def __fetch(self) -> bool:
+        try:
+            token, image = await self.client.get_captcha()
+        except Exception:
+            return False
+        if not token or not image:
+            return False
+
+        self.ready.append(Captcha(token, image))
+        self.fetched += 1
+        return True
+
+    async def __fill(self):
+        while True:
+            self.__drop_expired()
+
+            missing = self.size - len(self.ready)
+            if missing <= 0:
+                # sleep until a captcha is taken or the oldest one expires
+                self.taken.clear()
+                try:
+                    await asyncio.wait_for(self.taken.wait(), self.max_age - self.ready[0].age)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            fetched = await asyncio.gather(*(self.__fetch() for _ in range(missing)))
+            if all(fetched):
+                self.failures = 0
+            else:
+                self.failures += 1
+                await asyncio.sleep(min(self.max_retry_delay, self.retry_delay * 2 ** (self.failures - 1)))
+
+    async def take(self) -> Captcha:
+        '''
+        Returns the oldest captcha that is still valid, or a freshly
+        fetched one if none are ready.
+        '''
+        self.start()
+        self.__drop_expired()
+        if self.ready:
+            self.taken.set()
+            return self.ready.popleft()
+
+        self.direct += 1
+        return Captcha(*await self.client.get_captcha())
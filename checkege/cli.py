@@ -1,47 +1,75 @@
-RESET_COLOR = "\033[0m"
-BOLD = "\033[1m"
-ITALIC = "\033[3m"
-RED = "\033[31m"
-GREEN = "\033[32m"
-YELLOW = "\033[33m"
-BLUE = "\033[34m"
-GRAY = "\033[90m"
-
-from . import client, captcha_gui, regions, login_model
+from .colors import RESET_COLOR, BOLD, ITALIC, RED, GREEN, YELLOW, BLUE, GRAY
+from . import regions, sessions, login_model, solvers, render, history, prompt, errors, metrics
+import argparse
+import asyncio
 import os
-from getpass import getpass
 import sys
 import traceback
+import time
 import hashlib
 import base64
 import json
-from cryptography.fernet import Fernet
 
-if os.name == "nt":
-    from pyreadline3 import Readline
-else:
+# Heavy modules (aiohttp, cryptography, tkinter, PIL, readline) are imported
+# only by the features using them, to keep startup fast.
+
+# Exit codes, stable for scripts.
+EXIT_OK = 0
+EXIT_ERROR = 1        # unexpected error
+EXIT_USAGE = 2        # bad arguments or missing participant data
+EXIT_LOGIN = 3        # the portal rejected the login
+EXIT_CAPTCHA = 4      # captcha could not be fetched or solved
+EXIT_UNAVAILABLE = 5  # the portal is down or overloaded
+EXIT_FAILED = 6       # some participants of a batch could not be checked
+EXIT_INTERRUPTED = 130  # stopped with Ctrl+C, as shells report SIGINT
+
+# Login states.
+LOGIN_CONFIG = "config"
+LOGIN_REGION = "region"
+LOGIN_NAME = "name"
+LOGIN_SURNAME = "surname"
+LOGIN_PATRONYMIC = "patronymic"
+LOGIN_PASSNUM = "passnum"
+LOGIN_CAPTCHA = "captcha"
+LOGIN_DONE = "done"
+LOGIN_FAILED = "failed"
+
+# Unsolved captchas in a row before a non-interactive login gives up.
+CAPTCHA_ATTEMPTS = 3
+
+# Participant data accepted from arguments, stdin JSON and environment.
+PARTICIPANT_FIELDS = {
+    "name": "имя",
+    "surname": "фамилия",
+    "patronymic": "отчество",
+    "passnum": "последние 6 цифр паспорта, лучше передавать через окружение",
+    "region": "номер или название региона",
+}
+
+def load_readline():
+    if os.name == "nt":
+        from pyreadline3 import Readline
+        return Readline()
+
     try:
-        import gnureadline as _readline
+        import gnureadline as readline
     except ImportError:
-        import readline as _readline
+        import readline
+    return readline
 
 class Completer:
-    def __init__(self, regions: dict[int, str], readline, line: str):
-        self.regions = regions
-        self.reg = sorted(regions.values())
+    def __init__(self, index: regions.RegionIndex, readline, line: str):
+        self.index = index
         self.readline = readline
         self.line = line
 
     def complete(self, text, state):
         if text.isnumeric():
             if state != 0: return None
-            return self.regions.get(int(text), None)
+            return self.index.regions.get(int(text), None)
         
         if state == 0:
-            if not text:
-                self.matches = self.reg[:]
-            else:
-                self.matches = [r for r in self.reg if text.lower() in r.lower()]
+            self.matches = self.index.search(text)
         
         try:
             return self.matches[state]
@@ -67,14 +95,30 @@ class Completer:
 
 class Cli:
     def __init__(self):
-        self.client = client.CheckegeClient()
-        self.captcha_gui = captcha_gui.CaptchaGUI()
-        self.regions = None
+        self.store = sessions.SessionStore()
+        self.client = None
+        self.solver = None
+        self.sink = None
+        self.history = None
+        self.metrics = metrics.Metrics()
+        self.metrics_dir = None
+        self.vault = None
+        self.journal = None
+        self.stats = None
+        self.stats_by = None
+        self.stats_path = None
+        self.region_catalog = None
+        self.regions_task = None
+        self.captcha_task = None
+        self.captcha_attempts = 0
+        self.interactive = True
+        self.exit_code = EXIT_ERROR
         self.name = None
         self.surname = None
         self.patronymic = None
         self.passnum = None
         self.region = None
+        self.supplied = False
 
     def __cfg_path(self):
         if os.getenv("CHECKEGE_CFG"):
@@ -94,6 +138,8 @@ class Cli:
         if self.passnum is None:
             raise ValueError("Паспорт не установлен.")
         
+        from cryptography.fernet import Fernet
+
         # a bit cursed but it works
         key = hashlib.sha256(self.passnum.encode('utf-8')).hexdigest().encode()
         fernet_key = base64.urlsafe_b64encode(hashlib.shake_256(key).digest(32))
@@ -103,34 +149,44 @@ class Cli:
         path = self.__cfg_path()
         if not os.path.exists(path): return
 
+        if not self.interactive:
+            # saved data is encrypted with the passport, use it if it's given
+            if self.passnum is not None:
+                self.__read_config(path, quiet=True)
+            return
+
         self.print_important("Желаете ли вы загрузить сохранённые данные для входа?")
-        choice = input(f"Введите {ITALIC}{YELLOW}Y{RESET_COLOR} для загрузки или {ITALIC}{YELLOW}N{RESET_COLOR} для ввода данных вручную: ").strip().lower()
+        choice = (await prompt.ainput(f"Введите {ITALIC}{YELLOW}Y{RESET_COLOR} для загрузки или {ITALIC}{YELLOW}N{RESET_COLOR} для ввода данных вручную: ")).strip().lower()
         if choice not in ("y", "yes", "д", "да"):
             self.print_notice("Удаление сохраненной конфигурации.")
             os.remove(self.__cfg_path())
             return
 
         self.print_notice("Ваш паспорт - ваш пароль от сохраненных данных.")
-        passnum = getpass(f"Введите {ITALIC}{RED}последние 6 цифр{RESET_COLOR} паспорта {GRAY}(данные скрыты){RESET_COLOR}: ").strip()
-        if not passnum.isdigit() or len(passnum) != 6:
+        while True:
+            passnum = (await prompt.agetpass(f"Введите {ITALIC}{RED}последние 6 цифр{RESET_COLOR} паспорта {GRAY}(данные скрыты){RESET_COLOR}: ")).strip()
+            if passnum.isdigit() and len(passnum) == 6:
+                break
             self.print_error("Паспорт должен содержать 6 цифр.")
-            return await self.try_load_config()
 
         self.passnum = passnum
+        self.__read_config(path)
 
+    def __read_config(self, path: str, quiet: bool = False):
         fernet = self.__get_fernet()
         
         try:
-            with open(path, "r") as f:
+            with open(path, "r") as f, self.metrics.phase("config_decrypt"):
                 encrypted_data = f.read()
                 data = fernet.decrypt(encrypted_data).decode('utf-8')
                 config = json.loads(data)
 
-                self.name = config.get("name")
-                self.surname = config.get("surname")
-                self.patronymic = config.get("patronymic")
-                self.region = config.get("region")
+                self.name = self.name or config.get("name")
+                self.surname = self.surname or config.get("surname")
+                self.patronymic = self.patronymic or config.get("patronymic")
+                self.region = self.region or config.get("region")
         except Exception as e:
+            if quiet: return
             self.print_error(f"Не удалось загрузить конфигурацию.")
             self.print_notice("Откат к вводу данных вручную.")
             return
@@ -167,194 +223,728 @@ class Cli:
     def print_success(self, message: str):
         print(f"{GREEN}{message}{RESET_COLOR}")
 
+    def prefetch_captcha(self):
+        '''
+        Start loading the captcha (and opening the connection to the portal)
+        while the user is typing.
+        '''
+        from .captcha_pool import Captcha
+
+        async def fetch():
+            return Captcha(*await self.client.get_captcha())
+
+        if self.captcha_task is None:
+            self.captcha_task = asyncio.create_task(fetch())
+
+    async def take_captcha(self):
+        from .captcha_pool import Captcha, MAX_AGE
+
+        self.prefetch_captcha()
+        task, self.captcha_task = self.captcha_task, None
+        captcha = await task
+        # the user could have been typing for a while
+        if captcha.age > MAX_AGE:
+            captcha = Captcha(*await self.client.get_captcha())
+        return captcha
+
     async def login(self) -> bool:
-        await self.try_load_config()
+        '''
+        Login as an explicit state machine: every step returns the next
+        state. Invalid input repeats the step, or fails the login right
+        away in non-interactive mode. On failure `self.exit_code` tells why.
+        '''
+        steps = {
+            LOGIN_CONFIG: self.__login_config,
+            LOGIN_REGION: self.__login_region,
+            LOGIN_NAME: self.__login_name,
+            LOGIN_SURNAME: self.__login_surname,
+            LOGIN_PATRONYMIC: self.__login_patronymic,
+            LOGIN_PASSNUM: self.__login_passnum,
+            LOGIN_CAPTCHA: self.__login_captcha,
+        }
 
-        if self.region == None:
-            if self.regions == None:
-                self.print_notice("Загружаю список регионов...")
-                self.regions = await self.client.get_regions()
-                #self.regions = regions.regions
-                self.print_notice(f"Загружено {YELLOW}{len(self.regions)}{GRAY} регионов.")
+        self.prefetch_captcha()
+        if not isinstance(self.region, int) and self.region_catalog is None:
+            self.region_catalog = regions.RegionCatalog()
+            self.regions_task = self.region_catalog.revalidate_in_background(self.client.get_regions)
 
-            if os.name == "nt":
-                readline = Readline()
-            else:
-                readline = _readline
+        self.captcha_attempts = 0
+        state = LOGIN_CONFIG
+        while state not in (LOGIN_DONE, LOGIN_FAILED):
+            state = await steps[state]()
+        return state == LOGIN_DONE
+
+    def __fail(self, message: str, exit_code: int) -> str:
+        self.print_error(message)
+        self.exit_code = exit_code
+        return LOGIN_FAILED
+
+    async def __login_config(self) -> str:
+        fields = (self.region, self.name, self.surname, self.patronymic, self.passnum)
+        if any(field is None for field in fields):
+            await self.try_load_config()
+        return LOGIN_REGION
+
+    async def __login_region(self) -> str:
+        index = self.region_catalog.index if self.region_catalog else regions.index
+        if isinstance(self.region, int):
+            return LOGIN_NAME
+
+        region = self.region
+        if region is None:
+            if not self.interactive:
+                return self.__fail("Не указан регион (--region или CHECKEGE_REGION).", EXIT_USAGE)
+
+            readline = load_readline()
 
             line = "Введите регион (исп. TAB): "
-            compl = Completer(self.regions, readline, line)
+            compl = Completer(index, readline, line)
             if os.name != "nt":
                 readline.set_completion_display_matches_hook(compl.display_matches)
 
             readline.set_completer_delims('\t\n;')
             readline.set_completer(compl.complete)
             readline.parse_and_bind('tab: complete')
-            region = input(line).strip()
+            region = (await prompt.ainput(line)).strip()
             readline.set_completer(None)
 
-            if not region:
-                self.print_error("Регион не может быть пустым.")
-                return await self.login()
-
-            if region.isnumeric():
-                region = int(region)
-                if region not in self.regions:
-                    self.print_error(f"Регион {RESET_COLOR}{YELLOW}{ITALIC}{region}{RESET_COLOR}{RED} не найден (поиск по №).")
-                    return await self.login()
-            elif region in self.regions.values():
-                region = list(self.regions.keys())[list(self.regions.values()).index(region)]
+        region = str(region).strip()
+        self.region = None
+        if not region:
+            message = "Регион не может быть пустым."
+        else:
+            self.region = index.resolve(region)
+            if self.region is not None:
+                return LOGIN_NAME
+            elif region.isnumeric():
+                message = f"Регион {RESET_COLOR}{YELLOW}{ITALIC}{region}{RESET_COLOR}{RED} не найден (поиск по №)."
             else:
-                self.print_error(f"Регион {RESET_COLOR}{YELLOW}{ITALIC}\"{region}\"{RESET_COLOR}{RED} не найден (поиск по названию).")
-                return await self.login()
-
-            self.region = region
-
-        if self.name is None:
-            name = input("Введите имя: ").strip()
-            if not name:
-                self.print_error("Имя не может быть пустым.")
-                return await self.login()
-            
-            self.name = name
-
-        if self.surname is None:
-            surname = input("Введите фамилию: ").strip()
-            if not surname:
-                self.print_error("Фамилия не может быть пустой.")
-                return await self.login()
-            
-            self.surname = surname
-
-        if self.patronymic is None:
-            patronymic = input("Введите отчество: ").strip()
-            if not patronymic:
-                self.print_error("Отчество не может быть пустым.")
-                return await self.login()
-            
-            self.patronymic = patronymic
-
-        if self.passnum is None:
-            passnum = getpass(f"Введите {ITALIC}{RED}последние 6 цифр{RESET_COLOR} паспорта {GRAY}(данные скрыты){RESET_COLOR}: ").strip()
-            if not passnum.isdigit() or len(passnum) != 6:
-                self.print_error("Паспорт должен содержать 6 цифр.")
-                return await self.login()
-
-            self.passnum = passnum
-
-        await self.save_config()
-
-        token, captcha_image = await self.client.get_captcha()
+                message = f"Регион {RESET_COLOR}{YELLOW}{ITALIC}\"{region}\"{RESET_COLOR}{RED} не найден (поиск по названию)."
+
+        if not self.interactive:
+            return self.__fail(message, EXIT_USAGE)
+        self.print_error(message)
+        return LOGIN_REGION
+
+    async def __login_field(self, attr: str, line: str, error: str, missing: str, state: str, next_state: str,
+                            secret: bool = False, valid=bool) -> str:
+        value = getattr(self, attr)
+        if value is None:
+            if not self.interactive:
+                return self.__fail(missing, EXIT_USAGE)
+            value = await (prompt.agetpass(line) if secret else prompt.ainput(line))
+
+        value = str(value).strip()
+        if valid(value):
+            setattr(self, attr, value)
+            return next_state
+
+        setattr(self, attr, None)
+        if not self.interactive:
+            return self.__fail(error, EXIT_USAGE)
+        self.print_error(error)
+        return state
+
+    async def __login_name(self) -> str:
+        return await self.__login_field("name", "Введите имя: ", "Имя не может быть пустым.",
+                                        "Не указано имя (--name или CHECKEGE_NAME).", LOGIN_NAME, LOGIN_SURNAME)
+
+    async def __login_surname(self) -> str:
+        return await self.__login_field("surname", "Введите фамилию: ", "Фамилия не может быть пустой.",
+                                        "Не указана фамилия (--surname или CHECKEGE_SURNAME).", LOGIN_SURNAME, LOGIN_PATRONYMIC)
+
+    async def __login_patronymic(self) -> str:
+        return await self.__login_field("patronymic", "Введите отчество: ", "Отчество не может быть пустым.",
+                                        "Не указано отчество (--patronymic или CHECKEGE_PATRONYMIC).", LOGIN_PATRONYMIC, LOGIN_PASSNUM)
+
+    async def __login_passnum(self) -> str:
+        state = await self.__login_field(
+            "passnum", f"Введите {ITALIC}{RED}последние 6 цифр{RESET_COLOR} паспорта {GRAY}(данные скрыты){RESET_COLOR}: ",
+            "Паспорт должен содержать 6 цифр.", "Не указан паспорт (CHECKEGE_PASSNUM или --stdin-json).",
+            LOGIN_PASSNUM, LOGIN_CAPTCHA, secret=True, valid=lambda value: value.isdigit() and len(value) == 6
+        )
+        # config.json belongs to the interactive user, scripted runs
+        # for other participants must not overwrite it
+        if state == LOGIN_CAPTCHA and self.interactive and not self.supplied:
+            await self.save_config()
+        return state
+
+    async def __login_captcha(self) -> str:
+        from .client import LoginError
+
+        if not self.interactive and not self.solver.unattended:
+            return self.__fail("Нужна капча: укажите --captcha-command, CHECKEGE_CAPTCHA_COMMAND или --captcha file.", EXIT_CAPTCHA)
+
+        captcha = await self.take_captcha()
+        token, captcha_image = captcha.token, captcha.image
         if not token or not captcha_image:
-            self.print_error("Не удалось получить капчу.")
-            return False
+            return self.__fail("Не удалось получить капчу.", EXIT_CAPTCHA)
 
-        self.captcha_gui.set_captcha(captcha_image)
-        captcha_code = self.captcha_gui.solve()
+        with self.metrics.phase("captcha_solve"):
+            captcha_code = await self.solver.solve(captcha_image)
 
         if not captcha_code:
-            return await self.login()
+            self.captcha_attempts += 1
+            if not self.interactive and self.captcha_attempts >= CAPTCHA_ATTEMPTS:
+                return self.__fail(f"Капча не решена за {CAPTCHA_ATTEMPTS} попытки.", EXIT_CAPTCHA)
+            return LOGIN_CAPTCHA
 
         data = login_model.LoginData(self.name, self.surname, self.patronymic, self.passnum, self.region)
+        if self.client.session_key != "default":
+            # the data could have been corrected while logging in
+            self.client.session_key = data.participant_key()
         data.setCaptcha(token, captcha_code)
-        await self.client.login(data)
+        try:
+            await self.client.login(data)
+        except LoginError as e:
+            await self.solver.report(captcha_image, False)
+            return self.__fail(f"Не удалось войти: {e}", EXIT_LOGIN)
+        await self.solver.report(captcha_image, True)
         self.print_success("Успешный вход!")
-        return True
+        return LOGIN_DONE
     
     async def print_results(self) -> bool:
         if not self.client.is_logged_in:
             self.print_error("Необходимо войти в систему.")
             return False
 
-        exams = await self.client.get_results()
+        # show the last known results while fresh ones are loading
+        fetch = asyncio.create_task(self.client.get_results())
+        cached = await self.history.latest(self.history_key)
+        if cached and cached[1]:
+            checked, cached_exams = cached
+            self.print_notice(f"Сохраненные результаты ({time.strftime('%d.%m %H:%M', time.localtime(checked))}):")
+            self.print_table(cached_exams)
+
+        from .client import SessionExpiredError
+        try:
+            exams = await fetch
+        except SessionExpiredError:
+            self.print_error("Сессия истекла.")
+            return False
+        changes = await self.history.record(self.history_key, exams, self.participant_name())
         if not exams:
             self.print_notice("Нет доступных экзаменов.")
             return False
 
-        self.print_notice("Результаты:")
+        if not cached or not cached[1]:
+            self.print_notice("Результаты:")
+            self.print_table(exams)
+        elif changes:
+            self.print_important("Изменения:")
+            self.print_table([change.exam for change in changes])
+        else:
+            self.print_notice("Результаты не изменились.")
+
+        if self.sink:
+            await self.sink.write(self.participant_name(), exams)
+        return True
 
-        # at first, calculate the longest names
-        longest_date = max(len(exam.date) for exam in exams)
-        longest_subject = max(len(exam.subject) for exam in exams)
-        longest_status = max(len(exam.display_status) for exam in exams)
-        longest_mark = max(len(exam.mark.display) if exam.mark else len("Неизвестно") for exam in exams)
-        longest_type = max(len(exam.exam_type) for exam in exams)
-        has_oral = any(exam.is_oral for exam in exams)
-        total_width = longest_date + longest_subject + longest_status + longest_mark + 13 + ((longest_type + 3) if has_oral else 0)
-        
-        LINETYPE_FIRST = 0
-        LINETYPE_MIDDLE = 1
-        LINETYPE_LAST = 2
-        def print_line(type: int):
-            print(GRAY)
-            corner1 = "┏" if type == LINETYPE_FIRST else "┣" if type == LINETYPE_MIDDLE else "┗"
-            corner2 = "┓" if type == LINETYPE_FIRST else "┫" if type == LINETYPE_MIDDLE else "┛"
-            connector = "┳" if type == LINETYPE_FIRST else "╋" if type == LINETYPE_MIDDLE else "┻"
-
-            print(corner1 , end="")
-            print("━" * (longest_date + 2), end="")
-            print(connector, end="")
-            print("━" * (longest_subject + 2), end="")
-            print(connector, end="")
-            print("━" * (longest_status + 2), end="")
-            print(connector, end="")
-            print("━" * (longest_mark + 2), end="")
-            if has_oral:
-                print(connector, end="")
-                print("━" * (longest_type + 2), end="")
-            print(corner2, end="")
-            print()
-            print(RESET_COLOR, end='')
-        
-        print_line(LINETYPE_FIRST)
-        for exam in exams:
-            mark = exam.mark.display if exam.mark else "Неизвестно"
-            mark_color = exam.mark.color if exam.mark else GRAY
-            oral_status = "письменный" if not exam.is_oral else "устный"
+    @property
+    def history_key(self) -> str:
+        # sessions saved before participants were tracked are keyed by themselves
+        return self.client.participant or self.client.session_key
+
+    def participant_name(self) -> str:
+        return " ".join(part for part in (self.surname, self.name, self.patronymic) if part)
+
+    def print_table(self, exams):
+        with self.metrics.phase("render"):
+            render.print_exams(exams)
+
+    async def watch_results(self, interval: float) -> int:
+        from . import watch
+        from .client import SessionExpiredError
+
+        refresh_failed = False
+        async def refresh():
+            nonlocal refresh_failed
+            self.print_important(f"[{time.strftime('%H:%M:%S')}] Сессия скоро истечет, требуется вход.")
+            refresh_failed = not await self.login()
+            return not refresh_failed
+
+        watcher = watch.Watcher(self.client, interval, refresh=refresh)
+        self.print_notice(f"Проверка результатов каждые {YELLOW}{interval:g}{GRAY} с. Для выхода нажмите Ctrl+C.")
+
+        async def on_change(exams, changed, removed):
+            await self.history.record(self.history_key, exams, self.participant_name())
+            if removed:
+                subjects = ", ".join(exam.subject for exam in removed)
+                self.print_important(f"[{time.strftime('%H:%M:%S')}] Больше не в списке: {subjects}")
+            if len(changed) < len(exams):
+                if changed:
+                    subjects = ", ".join(exam.subject for exam in exams if (exam.id, exam.is_oral) in changed)
+                    self.print_important(f"[{time.strftime('%H:%M:%S')}] Изменения: {subjects}")
+            else:
+                self.print_notice(f"[{time.strftime('%H:%M:%S')}] Результаты:")
+            self.print_table(exams)
+
+        def on_error(e):
+            if isinstance(e, SessionExpiredError):
+                return False
+            self.print_error(f"[{time.strftime('%H:%M:%S')}] Ошибка: {e}")
+            return True
+
+        while True:
+            try:
+                await watcher.watch(on_change, on_error)
+            except SessionExpiredError:
+                # the login has just failed, trying again at once would too
+                if refresh_failed:
+                    return self.exit_code
 
-            d = f"{GRAY} ┃ {RESET_COLOR}"
+            self.print_error("Необходимо заново войти в систему.")
+            if not await self.login(): return self.exit_code
+
+    async def open_vault(self) -> bool:
+        '''
+        Unlock the vault of profiles, the password is asked once per run
+        (or taken from CHECKEGE_VAULT_PASSWORD).
+        '''
+        from . import vault
+
+        self.vault = vault.Vault()
+        password = os.getenv("CHECKEGE_VAULT_PASSWORD")
+        if not password and not self.interactive:
+            self.print_error("Не указан пароль хранилища (CHECKEGE_VAULT_PASSWORD).")
+            return False
+        if not password:
+            if self.vault.exists:
+                password = await prompt.agetpass(f"Введите пароль хранилища {GRAY}(данные скрыты){RESET_COLOR}: ")
+            else:
+                self.print_important("Создание нового хранилища.")
+                password = await prompt.agetpass(f"Придумайте пароль хранилища {GRAY}(данные скрыты){RESET_COLOR}: ")
+                if password != await prompt.agetpass("Повторите пароль: "):
+                    self.print_error("Пароли не совпадают.")
+                    return False
+
+        if not password:
+            self.print_error("Пароль не может быть пустым.")
+            return False
 
+        try:
+            with self.metrics.phase("vault_unlock"):
+                await self.vault.unlock(password)
+        except ValueError:
+            self.print_error("Неверный пароль хранилища.")
+            return False
+        return True
 
-            print(f"{GRAY}┃{RESET_COLOR} {exam.date:<{longest_date}}{RESET_COLOR}{d}", end="")
-            print(f"{ITALIC}{exam.subject:<{longest_subject}}{RESET_COLOR}{d}{exam.display_status_color}{exam.display_status:<{longest_status}}{RESET_COLOR}{d}{mark_color}{mark:<{longest_mark}}{RESET_COLOR}", end="")
-            if has_oral:
-                print(f"{d}{GRAY}{oral_status:<{longest_type}}{RESET_COLOR} {GRAY}┃{RESET_COLOR}", end="")
+    async def manage_vault(self, import_path: str | None, export_path: str | None) -> int:
+        from . import batch
+
+        if not await self.open_vault(): return EXIT_USAGE
+
+        if import_path:
+            try:
+                entries = batch.read_roster(import_path)
+            except (OSError, ValueError) as e:
+                self.print_error(f"Не удалось прочитать список участников: {e}")
+                return EXIT_USAGE
+            count = await self.vault.import_entries(entries)
+            self.print_success(f"Добавлено {count} участников, всего в хранилище {self.vault.count()}.")
+
+        if export_path:
+            entries = await self.vault.export_entries()
+            try:
+                batch.write_roster(export_path, entries)
+            except OSError as e:
+                self.print_error(f"Не удалось сохранить список участников: {e}")
+                return EXIT_ERROR
+            self.print_success(f"Выгружено {len(entries)} участников в {export_path}.")
+        return EXIT_OK
+
+    async def load_entries(self, path: str | None) -> list | None:
+        '''
+        Participants to check: from a roster file, or from the vault without a path.
+        '''
+        from . import batch
+
+        if path is None:
+            if not await self.open_vault(): return None
+            return await self.vault.entries()
+
+        try:
+            # a roster file is streamed, bad rows are reported as failed checks
+            return batch.iter_roster(path, strict=False)
+        except (OSError, ValueError) as e:
+            self.print_error(f"Не удалось прочитать список участников: {e}")
+            return None
+
+    def open_journal(self, roster: str | None, restart: bool):
+        '''
+        Checkpoint of a batch run over the roster file (or the vault without it).
+        '''
+        from . import journal
+
+        # positions in the vault change with any update of a profile
+        source = journal.BatchJournal.file_source(roster) if roster else f"{self.vault.path}\0{self.vault.fingerprint()}"
+        self.journal = journal.BatchJournal(source, restart=restart)
+        if self.journal.is_resumed:
+            self.print_notice(f"Продолжение прерванной проверки: {YELLOW}{self.journal.resumed}{GRAY} участников "
+                              f"уже проверено (--restart, чтобы начать заново).")
+
+    async def run_batch(self, entries, concurrency: int, prefetch: int,
+                        processes: int = 1, rate: float | None = None) -> int:
+        from . import batch, retry
+
+        if isinstance(entries, list):
+            self.print_notice(f"Загружено {YELLOW}{len(entries)}{GRAY} участников.")
+        if processes > 1:
+            from . import shard
+            runner = shard.ShardedRunner(self.solver.solve, processes, concurrency, self.store, prefetch,
+                                         rate=rate, metrics=self.metrics, report_captcha=self.solver.report)
+        else:
+            rate_limit = retry.RateLimit(rate) if rate else None
+            runner = batch.BatchRunner(self.solver.solve, concurrency, self.store, prefetch,
+                                       metrics=self.metrics, rate_limit=rate_limit,
+                                       report_captcha=self.solver.report)
+
+        # results are printed as soon as every participant is checked
+        table = render.StreamingTable()
+        checked = failed = 0
+        async def on_result(result):
+            nonlocal checked, failed
+            checked += 1
+            with self.metrics.phase("render"):
+                table.add(render.participant_rows(result.entry.display_name, result.exams, result.error))
+            if result.ok:
+                data = result.entry.login_data()
+                await self.history.record(data.participant_key(), result.exams, result.entry.display_name)
+                if self.stats is not None:
+                    self.stats.add(result.exams, data.region)
+                if self.sink:
+                    await self.sink.write(result.entry.display_name, result.exams)
             else:
-                print(f" {GRAY}┃{RESET_COLOR}", end="")
+                failed += 1
+            if self.journal:
+                await self.journal.record(result.index, result.ok, result.error)
+
+        skip = self.journal.is_done if self.journal else None
+        try:
+            await runner.run(entries, on_result, skip, collect=False)
+        finally:
+            table.close()
+
+        if self.stats is not None:
+            if self.journal and self.journal.is_resumed:
+                self.print_notice("Статистика только по проверенным в этом запуске, по всем - --stats-input с файлом экспорта.")
+            if not self.summarize():
+                return EXIT_ERROR
+
+        if self.journal:
+            # with failures the journal stays, a rerun checks only them
+            await self.journal.close(complete=not failed)
+            self.journal = None
+
+        self.print_notice(f"Сессии: {runner.reused} переиспользовано, {runner.logins} входов с капчей.")
+        self.print_notice(f"Соединения: {runner.stats.created} открыто, {runner.stats.reused} переиспользовано.")
+        if failed:
+            self.print_error(f"Не удалось проверить {failed} из {checked} участников, повторный запуск проверит только их.")
+            return EXIT_FAILED
+
+        self.print_success(f"Проверено {checked} участников.")
+        return EXIT_OK
+
+    def summarize(self) -> bool:
+        '''
+        Print the cohort statistics and save them with --stats-export.
+        '''
+        from . import stats
+
+        by, path = self.stats_by, self.stats_path
+        with self.metrics.phase("aggregate"):
+            groups = stats.aggregate(self.stats, by)
+            counts = stats.status_counts(self.stats)
+        if not groups:
+            self.print_notice("Нет результатов для статистики.")
+            return True
+
+        render.write(render.render(stats.summary_rows(groups, by)) + render.render(stats.status_rows(counts)))
+        if path:
+            try:
+                stats.write_summary(path, groups, counts, by)
+            except (OSError, ValueError) as e:
+                self.print_error(f"Не удалось сохранить статистику: {e}")
+                return False
+            self.print_success(f"Статистика сохранена в {path}.")
+        return True
 
-            print_line(LINETYPE_MIDDLE if exam != exams[-1] else LINETYPE_LAST)
+    def summarize_export(self, path: str) -> int:
+        from . import export
 
+        try:
+            self.stats.add_records(export.read_export(path))
+        except (OSError, ValueError, KeyError) as e:
+            self.print_error(f"Не удалось прочитать файл экспорта: {e}")
+            return EXIT_USAGE
+        return EXIT_OK if self.summarize() else EXIT_ERROR
+
+    async def serve(self, address: str, ttl: float) -> int:
+        from . import service
+
+        host, _, port = address.rpartition(":")
+        if not port.isdigit():
+            self.print_error("--serve ожидает [HOST:]PORT.")
+            return EXIT_USAGE
+
+        solve = self.solver.solve if self.solver.unattended else None
+        if solve is None:
+            self.print_notice("Капча не решается автоматически (--captcha-command), "
+                              "доступны только участники с сохраненной сессией.")
+
+        results = service.ResultsService(self.store, solve, ttl, metrics=self.metrics,
+                                         report_captcha=self.solver.report)
+        self.print_success(f"Сервис запущен на http://{host or 'localhost'}:{port}/")
+        await results.serve(host or "localhost", int(port), os.getenv("CHECKEGE_SERVICE_TOKEN"))
+        return EXIT_OK
+
+    def train_ocr(self, corpus: str) -> int:
+        from . import captcha_ocr
+
+        recognizer = captcha_ocr.CaptchaRecognizer.load()
+        try:
+            used = recognizer.train(captcha_ocr.read_corpus(corpus))
+        except OSError as e:
+            self.print_error(f"Не удалось прочитать капчи: {e}")
+            return EXIT_USAGE
+
+        if not recognizer.is_trained:
+            self.print_error(f"Использовано {used} капч, но в них встречаются не все цифры.")
+            return EXIT_ERROR
+
+        recognizer.save()
+        self.print_success(f"Распознавание обучено на {used} капчах.")
+        return EXIT_OK
+
+    def parse_args(self, argv: list[str]) -> argparse.Namespace:
+        parser = argparse.ArgumentParser(description="Проверка результатов ЕГЭ из терминала.")
+        parser.add_argument("--clear", action="store_true", help="удалить сохраненные cookies и данные для входа")
+        parser.add_argument("--batch", metavar="ROSTER", help="проверить всех участников из CSV/JSONL файла")
+        parser.add_argument("--vault", action="store_true", help="проверить всех участников из зашифрованного хранилища")
+        parser.add_argument("--vault-import", metavar="ROSTER", help="добавить участников из CSV/JSONL файла в хранилище")
+        parser.add_argument("--vault-export", metavar="PATH", help="выгрузить участников из хранилища в CSV/JSONL файл")
+        parser.add_argument("--watch", type=float, nargs="?", const=60, metavar="SECONDS", help="следить за результатами и сообщать об изменениях")
+        parser.add_argument("--captcha", choices=sorted(solvers.SOLVERS), metavar="SOLVER",
+                            help=f"способ ввода капчи: {', '.join(sorted(solvers.SOLVERS))} (по умолчанию {solvers.default_solver_name()})")
+        parser.add_argument("--ocr", type=float, nargs="?", const=0.85, metavar="THRESHOLD",
+                            help="распознавать капчу автоматически, при низкой уверенности спрашивать пользователя")
+        parser.add_argument("--ocr-train", metavar="DIR", help="обучить распознавание на размеченных капчах (файлы 012345*.png)")
+        parser.add_argument("--export", metavar="PATH", help="сохранить результаты в файл: .jsonl, .csv или .ccol (колоночный)")
+        parser.add_argument("--concurrency", type=int, default=8, metavar="N", help="число одновременных проверок в пакетном режиме")
+        parser.add_argument("--prefetch", type=int, default=2, metavar="N", help="сколько капч загружать заранее в пакетном режиме")
+        parser.add_argument("--restart", action="store_true",
+                            help="начать пакетную проверку заново, не продолжая прерванную")
+        parser.add_argument("--processes", type=int, default=1, metavar="N",
+                            help="разделить пакетную проверку между N процессами (0 - по числу ядер)")
+        parser.add_argument("--rate", type=float, metavar="N", help="не больше N запросов в секунду в пакетном режиме")
+        parser.add_argument("--serve", metavar="[HOST:]PORT",
+                            help="запустить локальный HTTP сервис результатов (токен доступа в CHECKEGE_SERVICE_TOKEN)")
+        parser.add_argument("--serve-ttl", type=float, default=60, metavar="SECONDS",
+                            help="сколько секунд сервис отдает результаты участника из памяти")
+        parser.add_argument("--stats", nargs="?", const="subject", metavar="BY",
+                            help="после пакетной проверки вывести статистику по группам: subject, region, date, oral "
+                                 "(через запятую, по умолчанию subject)")
+        parser.add_argument("--stats-input", metavar="EXPORT", help="вывести статистику по файлу экспорта, без проверки")
+        parser.add_argument("--stats-export", metavar="PATH", help="сохранить статистику в файл: .csv или .json")
+        parser.add_argument("--metrics", metavar="DIR",
+                            help="при выходе сохранить метрики запросов в DIR/checkege.prom и DIR/checkege.json (или CHECKEGE_METRICS)")
+
+        scripted = parser.add_argument_group("неинтерактивный режим (cron, CI)")
+        scripted.add_argument("--non-interactive", action="store_true",
+                              help="никогда ничего не спрашивать, код возврата сообщает результат")
+        scripted.add_argument("--captcha-command", metavar="COMMAND",
+                              help="команда, получающая PNG капчи на stdin и печатающая код (или CHECKEGE_CAPTCHA_COMMAND)")
+        scripted.add_argument("--stdin-json", action="store_true",
+                              help="прочитать данные участника из JSON объекта на stdin")
+        for field, title in PARTICIPANT_FIELDS.items():
+            scripted.add_argument(f"--{field}", metavar=field.upper(), help=f"{title} (или CHECKEGE_{field.upper()})")
+        return parser.parse_args(argv)
+
+    def load_participant(self, args: argparse.Namespace) -> bool:
+        '''
+        Participant data for scripted runs. Arguments win over stdin JSON,
+        which wins over environment variables.
+        '''
+        values = {field: os.getenv(f"CHECKEGE_{field.upper()}") for field in PARTICIPANT_FIELDS}
+        if args.stdin_json:
+            try:
+                data = json.load(sys.stdin)
+                if not isinstance(data, dict):
+                    raise ValueError("expected a JSON object")
+            except ValueError as e:
+                self.print_error(f"Не удалось прочитать данные участника из stdin: {e}")
+                return False
+            values.update({field: data[field] for field in PARTICIPANT_FIELDS if data.get(field) is not None})
+        values.update({field: getattr(args, field) for field in PARTICIPANT_FIELDS if getattr(args, field) is not None})
+
+        for field, value in values.items():
+            if value is not None:
+                setattr(self, field, str(value))
+                self.supplied = True
         return True
-        
-    
+
+    def login_data(self) -> login_model.LoginData | None:
+        '''
+        Data of the participant, if all of it is known.
+        '''
+        region = self.region
+        if region is not None and not isinstance(region, int):
+            region = regions.index.resolve(region)
+        fields = (self.name, self.surname, self.patronymic, self.passnum)
+        if region is None or any(field is None for field in fields):
+            return None
+        return login_model.LoginData(*fields, region)
+
     async def __run_safe(self) -> int:
         print(f"{BOLD}CheckEGE CLI {YELLOW}v1.0{RESET_COLOR}")
-
-        if len(sys.argv) >= 2 and sys.argv[1] == "--clear":
+        args = self.parse_args(sys.argv[1:])
+        self.interactive = not args.non_interactive
+        self.metrics_dir = args.metrics or os.getenv("CHECKEGE_METRICS")
+
+        if args.stdin_json and args.captcha == "stdin":
+            self.print_error("--stdin-json и --captcha stdin оба читают stdin.")
+            return EXIT_USAGE
+        if not self.load_participant(args):
+            return EXIT_USAGE
+
+        if args.captcha_command:
+            self.solver = solvers.CommandSolver(args.captcha_command)
+        elif args.captcha is None and not self.interactive and os.getenv("CHECKEGE_CAPTCHA_COMMAND"):
+            self.solver = solvers.CommandSolver()
+        else:
+            self.solver = solvers.get_solver(args.captcha)
+
+        if args.ocr_train:
+            return self.train_ocr(args.ocr_train)
+
+        if args.stats or args.stats_input or args.stats_export:
+            from . import stats
+            try:
+                self.stats_by = stats.parse_dimensions(args.stats or "subject")
+                if args.stats_export:
+                    stats.summary_format(args.stats_export)
+            except ValueError as e:
+                self.print_error(f"--stats: {e}")
+                return EXIT_USAGE
+            self.stats = stats.ResultColumns()
+            self.stats_path = args.stats_export
+            if args.stats_input:
+                return self.summarize_export(args.stats_input)
+
+        if args.vault_import or args.vault_export:
+            return await self.manage_vault(args.vault_import, args.vault_export)
+
+        if args.ocr is not None:
+            from . import captcha_ocr
+            corpus = os.path.join(os.path.dirname(captcha_ocr.CaptchaRecognizer.default_path()), "captchas")
+            self.solver = captcha_ocr.RecognizingSolver(self.solver, threshold=args.ocr, corpus=corpus)
+            if not self.solver.recognizer.is_trained:
+                self.print_notice(f"Распознавание капчи не обучено, решенные капчи сохраняются в {corpus}")
+
+        if args.serve:
+            return await self.serve(args.serve, max(0, args.serve_ttl))
+
+        entries = None
+        if args.batch or args.vault:
+            entries = await self.load_entries(args.batch)
+            if entries is None: return EXIT_USAGE
+            self.open_journal(args.batch, args.restart)
+
+        if args.export:
+            from . import export
+            try:
+                # a resumed run adds to the export of the interrupted one
+                self.sink = export.open_sink(args.export, append=bool(self.journal and self.journal.is_resumed))
+            except (OSError, ValueError) as e:
+                self.print_error(f"Не удалось открыть файл для экспорта: {e}")
+                return EXIT_USAGE
+
+        if not args.clear:
+            self.history = history.ResultsHistory()
+
+        if self.journal:
+            self.journal.durable = [self.store] + ([self.sink] if self.sink else [])
+
+        if entries is not None:
+            processes = args.processes if args.processes > 0 else (os.cpu_count() or 1)
+            rate = args.rate if args.rate and args.rate > 0 else None
+            return await self.run_batch(entries, max(1, args.concurrency), max(0, args.prefetch), processes, rate)
+
+        if args.clear:
             self.print_important("Очистка сохраненных данных...")
             if os.path.exists(self.__cfg_path()):
                 os.remove(self.__cfg_path())
-            self.client.clean()
+            self.store.clear()
+            history.ResultsHistory().clear()
             self.print_success("Успешно.")
-            return 0
-
-
-        if not self.client.is_logged_in:
+            return EXIT_OK
+
+        if self.supplied and not self.interactive:
+            # the passport alone is enough with saved data
+            await self.try_load_config()
+
+        # a given participant has their own session, the saved "default"
+        # one is of whoever logged in interactively
+        data = self.login_data()
+        from . import client
+        self.client = client.CheckegeClient(store=self.store, metrics=self.metrics,
+                                            session_key=data.participant_key() if data else "default")
+        if data or not self.supplied:
+            # with partial data the participant is unknown, a login is needed
+            await self.client.restore()
+
+        if self.client.is_logged_in and self.client.needs_refresh(60):
+            self.print_important("Сессия скоро истечет, требуется вход.")
+            if not await self.login(): return self.exit_code
+        elif self.client.is_logged_in and not await self.client.validate():
+            self.print_important("Сессия истекла, требуется вход.")
+            if not await self.login(): return self.exit_code
+        elif not self.client.is_logged_in:
             self.print_important("Требуется вход.")
-            if not await self.login(): return 1
+            if not await self.login(): return self.exit_code
+
+        if args.watch:
+            return await self.watch_results(max(5, args.watch))
 
         if not await self.print_results() and not self.client.is_logged_in:
             self.print_error("Необходимо заново войти в систему.")
-            if not await self.login(): return 1
-            if not await self.print_results(): return 1
-        return 0
+            if not await self.login(): return self.exit_code
+            if not await self.print_results(): return EXIT_ERROR
+        return EXIT_OK
 
     async def run(self) -> int:
         try:
             return await self.__run_safe()
+        except errors.PortalUnavailableError as e:
+            self.print_error(f"Портал недоступен: {e}")
+            return EXIT_UNAVAILABLE
         except Exception as e:
             traceback.print_exception(e)
             print(f"Ошибка: {e}")
-            return 1
+            return EXIT_ERROR
         finally:
-            await self.client.stop()
+            if self.regions_task:
+                self.regions_task.cancel()
+            if self.captcha_task:
+                # retrieve a failed prefetch and let it end before the session is closed
+                self.captcha_task.cancel()
+                await asyncio.gather(self.captcha_task, return_exceptions=True)
+            if self.journal:
+                await self.journal.close()
+                if self.journal.written:
+                    self.print_notice("Прогресс сохранен, повторный запуск продолжит проверку.")
+            if self.sink:
+                await self.sink.close()
+            if self.client:
+                await self.client.stop()
+            if self.history:
+                self.history.close()
+            if self.vault:
+                self.vault.close()
+            if self.metrics_dir:
+                try:
+                    self.metrics.write(self.metrics_dir)
+                except OSError as e:
+                    self.print_error(f"Не удалось сохранить метрики: {e}")
+            await self.store.close()
@@ -1,56 +1,219 @@
 import aiohttp
-import os
+import asyncio
 import json
 import base64
+import hashlib
+import os
+import time
+from multidict import CIMultiDictProxy
+from .cache import ResponseCache
+from .errors import CheckegeError, LoginError, PortalUnavailableError, SessionExpiredError
 from .exams_model import ExamStatus
 from .login_model import LoginData
+from .metrics import Metrics
 from .regions import regions
+from .retry import RETRY_STATUSES, CircuitBreaker, RateLimit, RetryPolicy, parse_retry_after
+from .sessions import SessionStore, cookie_expiry, dump_cookies, load_cookies
+from .transport import ConnectionStats, TransportConfig
+from yarl import URL
+
+# Statuses at which the portal has rejected the session cookies.
+EXPIRED_STATUSES = (400, 401, 403)
+
+SESSION_COOKIE = "Participant"
 
 class CheckegeClient:
-    BASE_URL = f"https://checkege.rustest.ru/api/"
+    # CHECKEGE_BASE_URL points the client elsewhere, e.g. at benchmarks/mock_server.py
+    BASE_URL = os.getenv("CHECKEGE_BASE_URL", "https://checkege.rustest.ru/api/")
 
-    def __init__(self):
+    def __init__(self, connector: aiohttp.BaseConnector | None = None,
+                 store: SessionStore | None = None, session_key: str = "default",
+                 retry: RetryPolicy | None = None, breaker: CircuitBreaker | None = None,
+                 transport: TransportConfig | None = None, session: aiohttp.ClientSession | None = None,
+                 stats: ConnectionStats | None = None, metrics: Metrics | None = None,
+                 cache: ResponseCache | None = None, rate_limit: RateLimit | None = None):
+        '''
+        Pass a shared `connector` to reuse one connection pool across many
+        clients, or a whole `session` made by `TransportConfig.shared_session`
+        (the cookie jar always stays per-client).
+        Cookies are kept in `store` under `session_key`; without a store
+        they live only in memory.
+        Failed requests are retried according to `retry`; pass a shared
+        `breaker` to pause many clients at once when the portal is overloaded,
+        and a shared `rate_limit` to cap their total request rate.
+        Connection reuse is counted in `stats`, request timings in `metrics`
+        (for a shared session they are traced by the session itself).
+        Regions and results are cached in `cache`, by default in memory of
+        this client only.
+        '''
+        self.store = store
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.rate_limit = rate_limit
+        self.transport = transport or TransportConfig()
+        self.stats = stats
+        self.metrics = metrics
+        self.own_cache = cache is None
+        self.cache = cache or ResponseCache()
+        self.session_key = session_key
+        self.results_etag = None
+        self.results_modified = None
+        self.results_hash = None
+        # when the session cookie expires and when the session last worked
+        self.expires: float | None = None
+        self.last_used: float | None = None
+        # key of the participant logged in, the session may be keyed otherwise
+        self.participant: str | None = None
+        self.probed: list[ExamStatus] | None = None
         self.jar = aiohttp.CookieJar()
-        self.client = aiohttp.ClientSession(
-            self.BASE_URL,
-            cookie_jar=self.jar
-        )
-
-        path = self.__jar_path()
-        if os.path.exists(path):
-            self.jar.load(path)
+        # a shared session keeps no cookies, they are sent from our jar
+        self.shared = session is not None
+        if session is None:
+            traces = [tracer.trace_config() for tracer in (stats, metrics) if tracer]
+            session = self.transport.session(self.BASE_URL, self.jar, connector, traces)
+        self.client = session
 
-    def __jar_path(self):
+    async def restore(self):
         '''
-        Returns the path to the cookie jar file.
+        Load saved cookies of this session from the store.
         '''
-        if os.getenv("CHECKEGE_JAR"):
-            return os.getenv("CHECKEGE_JAR")
-        
-        path = "cookies.txt"
-        if os.name == "nt":
-            path = os.path.join(os.getenv("APPDATA"), "checkege", "cookies.txt")
-        elif os.name == "posix":
-            path = os.path.join(os.getenv("HOME"), ".checkege", "cookies.txt")
-
-        if not os.path.exists(path):
-            os.makedirs(os.path.dirname(path), exist_ok=True)
-        return path
+        if self.store is None:
+            return
+
+        state = await self.store.load(self.session_key)
+        if state is None:
+            return
+        if state.is_expired:
+            self.store.delete(self.session_key)
+            return
+
+        load_cookies(self.jar, state.cookies, self.BASE_URL)
+        self.expires = state.expires
+        self.last_used = state.used
+        self.participant = state.participant
+
+    def __save_session(self):
+        if self.store is None:
+            return
+
+        if len(self.jar) == 0:
+            self.store.delete(self.session_key)
+        else:
+            self.store.put(self.session_key, dump_cookies(self.jar), self.expires, self.last_used, self.participant)
     
     @property
     def is_logged_in(self) -> bool:
         cookies = self.jar.filter_cookies(self.BASE_URL)
-        return "Participant" in cookies
+        if SESSION_COOKIE not in cookies:
+            return False
+        return self.expires is None or self.expires > time.time()
+
+    @property
+    def expires_in(self) -> float | None:
+        '''
+        Seconds until the session cookie expires, None if unknown.
+        '''
+        return None if self.expires is None else self.expires - time.time()
+
+    def needs_refresh(self, margin: float) -> bool:
+        '''
+        Whether the session expires within `margin` seconds and it's
+        time to login again before it fails in the middle of something.
+        '''
+        expires_in = self.expires_in
+        return expires_in is not None and expires_in < margin
+
+    async def validate(self, trust: float = 300) -> bool:
+        '''
+        Check that the portal still accepts the session.
+        A session that worked less than `trust` seconds ago is not checked,
+        otherwise results are fetched and kept for the next `get_results`.
+        '''
+        if not self.is_logged_in:
+            return False
+        if self.last_used is not None and time.time() - self.last_used < trust:
+            return True
+
+        try:
+            self.probed = await self.get_results(bypass_cache=True)
+        except SessionExpiredError:
+            return False
+        return True
+
+    async def __request(self, method: str, url: str, idempotent: bool = True,
+                        **kwargs) -> tuple[int, CIMultiDictProxy, bytes]:
+        '''
+        Send a request with retries, returns status, headers and body.
+        Non-idempotent requests are retried only when the portal surely
+        has not processed them: on connection errors and 429/503.
+        '''
+
+        kwargs.setdefault("timeout", self.transport.timeout(url))
+        attempt = 0
+        while True:
+            retry_after = None
+            if self.shared:
+                kwargs["cookies"] = self.jar.filter_cookies(URL(self.BASE_URL + url))
+            try:
+                async with self.breaker.request():
+                    if self.rate_limit:
+                        await self.rate_limit.acquire()
+                    start = time.perf_counter()
+                    async with self.client.request(method, url, **kwargs) as response:
+                        body = await response.read()
+                        status, headers = response.status, response.headers
+                        if self.shared:
+                            self.jar.update_cookies(response.cookies, response.url)
+                    if self.metrics:
+                        self.metrics.observe("request_seconds", (url,), time.perf_counter() - start)
+            except aiohttp.ClientConnectorError as e:
+                error, status = e, None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if not idempotent:
+                    self.breaker.record_failure()
+                    raise PortalUnavailableError(f"Request to {url} failed: {e}") from e
+                error, status = e, None
+            else:
+                retryable = status in RETRY_STATUSES if idempotent else status in (429, 503)
+                if not retryable:
+                    self.breaker.record_success()
+                    return status, headers, body
+
+                error = None
+                retry_after = parse_retry_after(headers.get("Retry-After"))
+
+            self.breaker.record_failure(retry_after)
+            if attempt + 1 >= self.retry.attempts:
+                if error is not None:
+                    raise PortalUnavailableError(f"Request to {url} failed: {error}") from error
+                raise PortalUnavailableError(f"Portal is unavailable: {status}", status)
 
-    async def get_regions(self) -> dict[int, str]:
+            if self.metrics:
+                self.metrics.increment("retries_total", (url,))
+            await asyncio.sleep(self.retry.delay(attempt, retry_after))
+            attempt += 1
+
+    @property
+    def results_key(self) -> str:
+        '''
+        Cache key of this session's results.
+        '''
+        return f"exam:{self.session_key}"
+
+    async def get_regions(self, bypass_cache: bool = False) -> dict[int, str]:
         '''
         Get eligible regions
         '''
 
-        url = f"region"
-        async with self.client.get(url) as response:
-            data = await response.json()
-            return {key["Id"]: regions[key["Id"]] for key in data if key["Id"] in regions}
+        async def fetch() -> bytes:
+            url = f"region"
+            status, _, body = await self.__request("GET", url)
+            if status != 200:
+                raise CheckegeError(f"Failed to fetch regions: {status}")
+            return body
+
+        data = json.loads(await self.cache.get("region", "region", fetch, bypass_cache))
+        return {key["Id"]: regions[key["Id"]] for key in data if key["Id"] in regions}
     
     async def get_captcha(self) -> tuple[str, bytes]:
         '''
@@ -59,14 +222,14 @@ class CheckegeClient:
         '''
 
         url = f"captcha"
-        async with self.client.get(url) as response:
-            if response.status != 200:
-                raise Exception(f"Failed to fetch captcha: {response.status}")
-            elif response.status == 403:
-                raise Exception("Captcha is required but not provided.")
-
-            data = await response.json()
-            return data.get("Token"), base64.b64decode(data.get("Image"))
+        status, _, body = await self.__request("GET", url)
+        if status == 403:
+            raise CheckegeError("Captcha is required but not provided.")
+        elif status != 200:
+            raise CheckegeError(f"Failed to fetch captcha: {status}")
+
+        data = json.loads(body)
+        return data.get("Token"), base64.b64decode(data.get("Image"))
     
     async def login(self, data: LoginData):
         '''
@@ -75,60 +238,118 @@ class CheckegeClient:
         '''
 
         url = f"participant/login"
-        async with self.client.post(url, data=data.form(), headers={
+        status, _, body = await self.__request("POST", url, idempotent=False, data=data.form(), headers={
             "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
             "X-Requested-With": "XMLHttpRequest",
             "Accept": "*/*",
             "Origin": "https://checkege.rustest.ru",
             "Referer": "https://checkege.rustest.ru/",
-        }) as response:
-            if response.status == 403:
-                raise Exception("Invalid login credentials or captcha required.")
-            elif response.status == 400:
-                print("Data: ")
-                print(str(data.form()._gen_form_urlencoded().decode()))
-                print("Response: ")
-                print(await response.text())
-            elif response.status != 204 and response.status != 200:
-                raise Exception(f"Login failed: {response.status}")
+        })
+        if status == 403:
+            raise LoginError("Invalid login credentials or captcha required.")
+        elif status == 400:
+            raise LoginError(f"Login rejected: {body.decode(errors='replace')}")
+        elif status != 204 and status != 200:
+            raise LoginError(f"Login failed: {status}")
 
-            self.jar.save(self.__jar_path())
+        self.expires = cookie_expiry(self.jar, SESSION_COOKIE)
+        self.last_used = time.time()
+        self.participant = data.participant_key()
+        # the session may belong to another participant now
+        self.cache.invalidate(self.results_key, "exam")
+        self.__save_session()
 
-    async def get_results(self) -> list[ExamStatus]:
+    async def get_results(self, bypass_cache: bool = False) -> list[ExamStatus]:
         '''
         Get EGE results, requires login and valid cookies.
+        Repeated calls are served from the cache unless `bypass_cache` is set.
+        '''
+
+        if not self.is_logged_in:
+            raise SessionExpiredError("Not logged in or cookies were invalidated.")
+        if self.probed is not None:
+            exams, self.probed = self.probed, None
+            return exams
+
+        async def fetch() -> bytes:
+            url = f"exam"
+            status, _, body = await self.__request("GET", url)
+            self.__check_results_status(status)
+            return body
+
+        body = await self.cache.get(self.results_key, "exam", fetch, bypass_cache)
+        return self.__parse_results(json.loads(body))
+
+    async def poll_results(self) -> list[ExamStatus] | None:
+        '''
+        Get EGE results only if they have changed since the previous poll,
+        returns None otherwise.
+        Uses conditional requests when the server supports them and
+        compares body hashes when it does not.
         '''
 
         if not self.is_logged_in:
-            raise Exception("Not logged in or cookies were invalidated.")
+            raise SessionExpiredError("Not logged in or cookies were invalidated.")
+
+        headers = {}
+        if self.results_etag:
+            headers["If-None-Match"] = self.results_etag
+        if self.results_modified:
+            headers["If-Modified-Since"] = self.results_modified
 
         url = f"exam"
+        status, response_headers, body = await self.__request("GET", url, headers=headers)
+        if status == 304:
+            self.last_used = time.time()
+            return None
+        self.__check_results_status(status)
+
+        await self.cache.put(self.results_key, "exam", body)
+        self.results_etag = response_headers.get("ETag")
+        self.results_modified = response_headers.get("Last-Modified")
+
+        digest = hashlib.sha256(body).digest()
+        if digest == self.results_hash:
+            return None
+
+        self.results_hash = digest
+        return self.__parse_results(json.loads(body))
+
+    def __check_results_status(self, status: int):
+        if status in EXPIRED_STATUSES:
+            self.jar.clear()
+            self.expires = self.last_used = None
+            self.cache.invalidate(self.results_key, "exam")
+            self.__save_session()
+            raise SessionExpiredError("Cookies have expired")
+        elif status != 200:
+            raise CheckegeError(f"Failed to fetch results: {status}")
+        self.last_used = time.time()
+
+    def __parse_results(self, data: dict) -> list[ExamStatus]:
         results = []
-        async with self.client.get(url) as response:
-            if response.status != 200:
-                raise Exception(f"Failed to fetch results: {response.status}")
-            elif response.status == 400 or response.status == 403:
-                self.jar.clear()
-                self.jar.save(self.__jar_path())
-                raise Exception("Cookies have expired")
-        
-            
-            data = await response.json()
-            for item in data.get("Result", []).get("Exams", []):
-                has_oral_part = item.get("OralExamId") != None
-                if has_oral_part:
-                    oral_exam = ExamStatus(item, is_oral=True)
-                    results.append(oral_exam)
-
-                exam = ExamStatus(item)
-                results.append(exam)
+        for item in data.get("Result", []).get("Exams", []):
+            has_oral_part = item.get("OralExamId") != None
+            if has_oral_part:
+                oral_exam = ExamStatus(item, is_oral=True)
+                results.append(oral_exam)
+
+            exam = ExamStatus(item)
+            results.append(exam)
         
         return results
     
     def clean(self):
         self.jar.clear()
-        self.jar.save(self.__jar_path())
+        self.expires = self.last_used = None
+        self.participant = None
+        self.probed = None
+        self.cache.invalidate(self.results_key, "exam")
+        self.__save_session()
     
     async def stop(self):
-        await self.client.close()
-        self.jar.save(self.__jar_path())
+        if self.own_cache:
+            await self.cache.close()
+        if not self.shared:
+            await self.client.close()
+        self.__save_session()
@@ -0,0 +1,8 @@
+RESET_COLOR = "\033[0m"
+BOLD = "\033[1m"
+ITALIC = "\033[3m"
+RED = "\033[31m"
+GREEN = "\033[32m"
+YELLOW = "\033[33m"
+BLUE = "\033[34m"
+GRAY = "\033[90m"
@@ -0,0 +1,19 @@
+class CheckegeError(Exception):
+    pass
+
+class SessionExpiredError(CheckegeError):
+    '''
+    Not logged in, or the portal has rejected the session cookies.
+    '''
+
+class LoginError(CheckegeError):
+    pass
+
+class PortalUnavailableError(CheckegeError):
+    '''
+    The portal kept failing after all retries.
+    '''
+
+    def __init__(self, message: str, status: int | None = None):
+        super().__init__(message)
+        self.status = status
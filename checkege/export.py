@@ -0,0 +1,205 @@
+import asyncio
+import csv
+import io
+import json
+import os
+import struct
+import sys
+from array import array
+from .exams_model import ExamStatus
+
+FIELDS = ("participant", "exam_id", "subject", "date", "status", "mark5", "mark100", "min100", "completion", "is_oral")
+
+# Column types of the columnar format.
+SCHEMA = {
+    "participant": "str",
+    "exam_id": "int",
+    "subject": "str",
+    "date": "str",
+    "status": "int",
+    "mark5": "int",
+    "mark100": "int",
+    "min100": "int",
+    "completion": "bool",
+    "is_oral": "bool",
+}
+
+def exam_record(participant: str, exam: ExamStatus) -> tuple:
+    mark = exam.mark
+    return (
+        participant,
+        exam.id,
+        exam.subject,
+        exam.date,
+        exam.int_status,
+        mark.mark5 if mark else None,
+        mark.mark100 if mark else None,
+        mark.min100 if mark else None,
+        mark.completion if mark else None,
+        exam.is_oral,
+    )
+
+class ExportSink:
+    '''
+    Base class of export sinks. Records are collected in chunks of
+    `chunk_size` and written to disk in a worker thread, so memory use
+    does not depend on the number of participants.
+    With `append`, records are added to an existing file, e.g. when a
+    batch run is resumed.
+    '''
+
+    def __init__(self, path: str, chunk_size: int = 1000, append: bool = False):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.rows: list[tuple] = []
+        self.lock = asyncio.Lock()
+        self.file = open(path, "ab" if append else "wb")
+        if self.file.tell() == 0:
+            self.write_header()
+
+    def write_header(self):
+        pass
+
+    def write_rows(self, rows: list[tuple]):
+        raise NotImplementedError
+
+    async def write(self, participant: str, exams: list[ExamStatus]):
+        self.rows.extend(exam_record(participant, exam) for exam in exams)
+        if len(self.rows) >= self.chunk_size:
+            await self.flush()
+
+    async def flush(self):
+        async with self.lock:
+            if not self.rows:
+                return
+            rows, self.rows = self.rows, []
+            await asyncio.to_thread(self.write_rows, rows)
+
+    async def close(self):
+        await self.flush()
+        await asyncio.to_thread(self.file.close)
+
+class JsonlSink(ExportSink):
+    def write_rows(self, rows: list[tuple]):
+        lines = [json.dumps(dict(zip(FIELDS, row)), ensure_ascii=False) + "\n" for row in rows]
+        self.file.write("".join(lines).encode("utf-8"))
+        self.file.flush()
+
+class CsvSink(ExportSink):
+    def write_header(self):
+        self.write_rows([FIELDS])
+
+    def write_rows(self, rows: list[tuple]):
+        buf = io.StringIO()
+        csv.writer(buf).writerows(rows)
+        self.file.write(buf.getvalue().encode("utf-8"))
+        self.file.flush()
+
+# Columnar format: a magic line, then row groups. Every group is the row
+# count (uint32) followed by all columns in FIELDS order:
+#   int  - int64 array, INT_NULL for missing values
+#   bool - int8 array, -1 for missing values
+#   str  - byte length (uint32) and utf-8 values joined with "\0"
+# All numbers are little-endian.
+COLUMNAR_MAGIC = b"CHECKEGE-COLUMNAR 1\n"
+INT_NULL = -2 ** 63
+
+class ColumnarSink(ExportSink):
+    def __init__(self, path: str, chunk_size: int = 10000, append: bool = False):
+        super().__init__(path, chunk_size, append)
+
+    def write_header(self):
+        self.file.write(COLUMNAR_MAGIC)
+
+    def write_rows(self, rows: list[tuple]):
+        parts = [struct.pack("<I", len(rows))]
+        for i, field in enumerate(FIELDS):
+            column = [row[i] for row in rows]
+            kind = SCHEMA[field]
+            if kind == "str":
+                data = "\0".join("" if value is None else str(value) for value in column).encode("utf-8")
+                parts += [struct.pack("<I", len(data)), data]
+            else:
+                values = array("q" if kind == "int" else "b",
+                               ((INT_NULL if kind == "int" else -1) if value is None else int(value) for value in column))
+                if sys.byteorder == "big":
+                    values.byteswap()
+                parts.append(values.tobytes())
+        self.file.write(b"".join(parts))
+        self.file.flush()
+
+def read_columnar(path: str) -> dict[str, list]:
+    '''
+    Load a columnar export into {field: list of values}, None for missing values.
+    '''
+
+    columns = {field: [] for field in FIELDS}
+    with open(path, "rb") as f:
+        if f.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+            raise ValueError(f"{path} is not a columnar export")
+
+        while header := f.read(4):
+            count, = struct.unpack("<I", header)
+            for field in FIELDS:
+                kind = SCHEMA[field]
+                if kind == "str":
+                    size, = struct.unpack("<I", f.read(4))
+                    values = f.read(size).decode("utf-8").split("\0") if count else []
+                    columns[field] += values
+                else:
+                    values = array("q" if kind == "int" else "b")
+                    values.frombytes(f.read(count * values.itemsize))
+                    if sys.byteorder == "big":
+                        values.byteswap()
+                    null = INT_NULL if kind == "int" else -1
+                    if kind == "bool":
+                        columns[field] += [None if value == null else bool(value) for value in values]
+                    else:
+                        columns[field] += [None if value == null else value for value in values]
+    return columns
+
+def parse_value(kind: str, value):
+    # CSV has text only, JSONL has the values as they were written
+    if value is None or value == "":
+        return None
+    if kind == "int":
+        return int(value)
+    if kind == "bool":
+        return value if isinstance(value, bool) else value == "True"
+    return str(value)
+
+def read_export(path: str) -> dict[str, list]:
+    '''
+    Load an export of any format into {field: list of values}, None for missing values.
+    '''
+
+    if os.path.splitext(path)[1].lower() == ".ccol":
+        return read_columnar(path)
+
+    columns = {field: [] for field in FIELDS}
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if os.path.splitext(path)[1].lower() == ".csv":
+            records = csv.DictReader(f)
+        else:
+            records = (json.loads(line) for line in f if line.strip())
+        for record in records:
+            for field in FIELDS:
+                columns[field].append(parse_value(SCHEMA[field], record.get(field)))
+    return columns
+
+SINKS = {
+    ".jsonl": JsonlSink,
+    ".ndjson": JsonlSink,
+    ".csv": CsvSink,
+    ".ccol": ColumnarSink,
+}
+
+def open_sink(path: str, append: bool = False) -> ExportSink:
+    '''
+    Open an export sink, the format is chosen by file extension:
+    .jsonl, .csv or .ccol (columnar). All of them can be appended to.
+    '''
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in SINKS:
+        raise ValueError(f"Unknown export format \"{ext}\", use one of: {', '.join(SINKS)}")
+    return SINKS[ext](path, append=append)
@@ -0,0 +1,230 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from .exams_model import ExamStatus, SCOPE_BASIC_MATH, SCOPE_COMPOSITION, SCOPE_FOREIGN_LANGUAGE
+
+SCOPE_FLAGS = {
+    SCOPE_BASIC_MATH: "IsBasicMath",
+    SCOPE_COMPOSITION: "IsComposition",
+    SCOPE_FOREIGN_LANGUAGE: "IsForeignLanguage",
+}
+
+# Columns of an exam state, in the order they are stored.
+STATE_FIELDS = ("subject", "date", "status", "has_results", "mark5", "mark100", "min100", "scope")
+
+def exam_state(exam: ExamStatus) -> tuple:
+    mark = exam.mark
+    return (
+        exam.subject,
+        exam.date,
+        exam.int_status,
+        exam.has_results,
+        mark.mark5 if mark else None,
+        mark.mark100 if mark else None,
+        mark.min100 if mark else None,
+        mark.scope if mark else 0,
+    )
+
+def state_exam(exam_id: int, is_oral: bool, state: tuple) -> ExamStatus:
+    '''
+    Rebuild ExamStatus from a stored state.
+    '''
+
+    subject, date, status, has_results, mark5, mark100, min100, scope = state
+    prefix = "Oral" if is_oral else ""
+    data = {
+        prefix + "ExamId": exam_id,
+        prefix + "ExamDate": date,
+        prefix + "Subject": subject,
+        prefix + "Status": status,
+        "Has" + prefix + "Result": bool(has_results),
+        "Mark5": mark5,
+        "TestMark": mark100,
+        "MinMark": min100,
+    }
+    if scope in SCOPE_FLAGS:
+        data[prefix + SCOPE_FLAGS[scope]] = True
+    return ExamStatus(data, is_oral)
+
+class Change:
+    def __init__(self, exam: ExamStatus, previous: ExamStatus | None):
+        self.exam = exam
+        self.previous = previous
+
+    @property
+    def is_new(self) -> bool:
+        return self.previous is None
+
+class ResultsHistory:
+    '''
+    Local SQLite history of fetched results.
+    Every check is a snapshot, while exam states are stored only when
+    they differ from the previous known state, so the table of states
+    is the timeline of every exam. An exam missing from a snapshot gets
+    a `removed` state, so the latest states are those of the last snapshot.
+    '''
+
+    def __init__(self, path: str | None = None):
+        self.path = path or self.default_path()
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.executescript(
+            "CREATE TABLE IF NOT EXISTS snapshots ("
+            "  id INTEGER PRIMARY KEY, participant TEXT NOT NULL, name TEXT, checked REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS snapshots_participant ON snapshots (participant, checked);"
+            "CREATE TABLE IF NOT EXISTS states ("
+            "  snapshot INTEGER NOT NULL, participant TEXT NOT NULL, exam_id INTEGER, is_oral INTEGER NOT NULL, position INTEGER,"
+            "  subject TEXT, date TEXT, status INTEGER, has_results INTEGER,"
+            "  mark5 INTEGER, mark100 INTEGER, min100 INTEGER, scope INTEGER, removed INTEGER NOT NULL DEFAULT 0);"
+            "CREATE INDEX IF NOT EXISTS states_exam ON states (participant, exam_id, is_oral, snapshot);"
+            "CREATE INDEX IF NOT EXISTS states_snapshot ON states (snapshot);"
+        )
+        # databases created before removed exams were tracked
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(states)")}
+        if "removed" not in columns:
+            self.db.execute("ALTER TABLE states ADD COLUMN removed INTEGER NOT NULL DEFAULT 0")
+        self.db.commit()
+
+    @staticmethod
+    def default_path():
+        '''
+        Returns the path to the history database.
+        '''
+        if os.getenv("CHECKEGE_HISTORY"):
+            return os.getenv("CHECKEGE_HISTORY")
+
+        path = "history.db"
+        if os.name == "nt":
+            path = os.path.join(os.getenv("APPDATA"), "checkege", "history.db")
+        elif os.name == "posix":
+            path = os.path.join(os.getenv("HOME"), ".checkege", "history.db")
+
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        return path
+
+    def __latest_states(self, participant: str) -> dict[tuple, tuple]:
+        rows = self.db.execute(
+            "SELECT exam_id, is_oral, " + ", ".join(STATE_FIELDS) + " FROM states s "
+            "WHERE participant = ? AND removed = 0 AND snapshot = ("
+            "  SELECT MAX(snapshot) FROM states WHERE participant = s.participant"
+            "  AND exam_id IS s.exam_id AND is_oral = s.is_oral) "
+            "ORDER BY position",
+            (participant,)
+        ).fetchall()
+        return {(row[0], bool(row[1])): tuple(row[2:]) for row in rows}
+
+    def __record(self, participant: str, name: str | None, exams: list[ExamStatus]) -> list[Change]:
+        with self.lock, self.db:
+            latest = self.__latest_states(participant)
+            snapshot = self.db.execute(
+                "INSERT INTO snapshots (participant, name, checked) VALUES (?, ?, ?)",
+                (participant, name, time.time())
+            ).lastrowid
+
+            changes, rows = [], []
+            for position, exam in enumerate(exams):
+                key = (exam.id, exam.is_oral)
+                state = exam_state(exam)
+                if latest.get(key) == state:
+                    continue
+
+                rows.append((snapshot, participant, exam.id, exam.is_oral, position) + state)
+                previous = latest.get(key)
+                changes.append(Change(exam, state_exam(*key, previous) if previous else None))
+
+            self.db.executemany(
+                "INSERT INTO states (snapshot, participant, exam_id, is_oral, position, " + ", ".join(STATE_FIELDS) + ") "
+                "VALUES (?, ?, ?, ?, ?, " + ", ".join("?" * len(STATE_FIELDS)) + ")",
+                rows
+            )
+            # exams the portal doesn't list anymore
+            present = {(exam.id, exam.is_oral) for exam in exams}
+            self.db.executemany(
+                "INSERT INTO states (snapshot, participant, exam_id, is_oral, removed) VALUES (?, ?, ?, ?, 1)",
+                [(snapshot, participant, exam_id, is_oral) for exam_id, is_oral in latest if (exam_id, is_oral) not in present]
+            )
+            return changes
+
+    async def record(self, participant: str, exams: list[ExamStatus], name: str | None = None) -> list[Change]:
+        '''
+        Save a snapshot of results. Returns what has changed since the previous one.
+        '''
+        return await asyncio.to_thread(self.__record, participant, name, exams)
+
+    def __latest(self, participant: str) -> tuple[float, list[ExamStatus]] | None:
+        with self.lock:
+            row = self.db.execute(
+                "SELECT MAX(checked) FROM snapshots WHERE participant = ?", (participant,)
+            ).fetchone()
+            if row[0] is None:
+                return None
+
+            states = self.__latest_states(participant)
+        exams = [state_exam(exam_id, is_oral, state) for (exam_id, is_oral), state in states.items()]
+        return row[0], exams
+
+    async def latest(self, participant: str) -> tuple[float, list[ExamStatus]] | None:
+        '''
+        Returns the time of the last check and the latest known results.
+        '''
+        return await asyncio.to_thread(self.__latest, participant)
+
+    def __changes(self, participant: str) -> list[Change]:
+        with self.lock:
+            row = self.db.execute(
+                "SELECT MAX(id) FROM snapshots WHERE participant = ?", (participant,)
+            ).fetchone()
+            if row[0] is None:
+                return []
+
+            changes = []
+            rows = self.db.execute(
+                "SELECT exam_id, is_oral, " + ", ".join(STATE_FIELDS) + " FROM states "
+                "WHERE snapshot = ? AND removed = 0", (row[0],)
+            ).fetchall()
+            for exam_id, is_oral, *state in rows:
+                previous = self.db.execute(
+                    "SELECT removed, " + ", ".join(STATE_FIELDS) + " FROM states "
+                    "WHERE participant = ? AND exam_id IS ? AND is_oral = ? AND snapshot < ? "
+                    "ORDER BY snapshot DESC LIMIT 1",
+                    (participant, exam_id, is_oral, row[0])
+                ).fetchone()
+                # an exam listed again after being removed is new
+                changes.append(Change(
+                    state_exam(exam_id, bool(is_oral), tuple(state)),
+                    state_exam(exam_id, bool(is_oral), previous[1:]) if previous and not previous[0] else None
+                ))
+            return changes
+
+    async def changes(self, participant: str) -> list[Change]:
+        '''
+        Returns what has changed at the last check.
+        '''
+        return await asyncio.to_thread(self.__changes, participant)
+
+    def __timeline(self, participant: str, exam_id: int, is_oral: bool) -> list[tuple[float, ExamStatus]]:
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT checked, " + ", ".join("s." + field for field in STATE_FIELDS) + " FROM states s "
+                "JOIN snapshots ON snapshots.id = s.snapshot "
+                "WHERE s.participant = ? AND s.exam_id IS ? AND s.is_oral = ? AND s.removed = 0 ORDER BY s.snapshot",
+                (participant, exam_id, is_oral)
+            ).fetchall()
+        return [(row[0], state_exam(exam_id, is_oral, row[1:])) for row in rows]
+
+    async def timeline(self, participant: str, exam_id: int, is_oral: bool = False) -> list[tuple[float, ExamStatus]]:
+        '''
+        Returns every known state of the exam with the time it was first seen.
+        '''
+        return await asyncio.to_thread(self.__timeline, participant, exam_id, is_oral)
+
+    def clear(self):
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM states")
+            self.db.execute("DELETE FROM snapshots")
+
+    def close(self):
+        self.db.close()
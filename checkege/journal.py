@@ -0,0 +1,153 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+class BatchJournal:
+    '''
+    Checkpoint of a batch run, to resume it after a crash or Ctrl+C.
+    An append-only JSONL file of checked roster positions, bound to
+    `source` (the roster and its version). Positions are kept as a
+    watermark below which all of them are checked plus the few checked
+    above it and the failed ones below it, so memory does not grow with
+    the roster. With `restart` the previous progress is forgotten.
+    Records are written every `checkpoint_every` results or
+    `checkpoint_interval` seconds, after flushing everything in `durable`
+    (sessions, exports): whatever the journal lists is saved for sure,
+    only results after the last checkpoint are checked again.
+    '''
+
+    def __init__(self, source: str, path: str | None = None, durable: list | None = None,
+                 checkpoint_every: int = 64, checkpoint_interval: float = 5, restart: bool = False):
+        self.source = source
+        self.path = path or self.default_path(source)
+        self.durable = durable or []
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_interval = checkpoint_interval
+        self.watermark = 0
+        self.checked: set[int] = set()
+        self.failed: set[int] = set()
+        self.resumed = 0
+        self.written = 0
+        self.pending: list[dict] = []
+        self.saved = time.monotonic()
+        self.lock = asyncio.Lock()
+
+        if restart and os.path.exists(self.path):
+            os.remove(self.path)
+        self.__load()
+        self.file = open(self.path, "a", encoding="utf-8")
+        if self.file.tell() == 0:
+            self.file.write(json.dumps({"source": source, "started": time.time()}, ensure_ascii=False) + "\n")
+            self.file.flush()
+
+    @staticmethod
+    def default_path(source: str):
+        '''
+        Returns the path to the journal of a roster.
+        '''
+        name = hashlib.sha256(source.split("\0", 1)[0].encode("utf-8")).hexdigest()[:16] + ".jsonl"
+        if os.getenv("CHECKEGE_CHECKPOINTS"):
+            return os.path.join(os.getenv("CHECKEGE_CHECKPOINTS"), name)
+
+        path = os.path.join("checkpoints", name)
+        if os.name == "nt":
+            path = os.path.join(os.getenv("APPDATA"), "checkege", "checkpoints", name)
+        elif os.name == "posix":
+            path = os.path.join(os.getenv("HOME"), ".checkege", "checkpoints", name)
+
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        return path
+
+    @staticmethod
+    def file_source(path: str) -> str:
+        '''
+        Source of a roster file: its path and version.
+        '''
+        stat = os.stat(path)
+        return f"{os.path.abspath(path)}\0{stat.st_size}\0{stat.st_mtime_ns}"
+
+    def __load(self):
+        try:
+            f = open(self.path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return
+
+        with f:
+            try:
+                header = json.loads(f.readline() or "{}")
+            except ValueError:
+                header = {}
+            if header.get("source") != self.source:
+                # another version of the roster, positions mean nothing
+                f.close()
+                os.remove(self.path)
+                return
+
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # the last line may be cut short by a crash
+                    continue
+                self.__mark(record["index"], record["ok"])
+                self.resumed += record["ok"]
+
+    def __mark(self, index: int, ok: bool):
+        if ok:
+            self.failed.discard(index)
+        else:
+            self.failed.add(index)
+        if index < self.watermark:
+            return
+
+        self.checked.add(index)
+        while self.watermark in self.checked:
+            self.checked.remove(self.watermark)
+            self.watermark += 1
+
+    @property
+    def is_resumed(self) -> bool:
+        return self.resumed > 0 or self.watermark > 0
+
+    def is_done(self, index: int) -> bool:
+        '''
+        Whether the entry at this roster position was checked successfully.
+        '''
+        checked = index < self.watermark or index in self.checked
+        return checked and index not in self.failed
+
+    async def record(self, index: int, ok: bool, error: Exception | None = None):
+        record = {"index": index, "ok": ok}
+        if error is not None:
+            record["error"] = str(error)
+        self.pending.append(record)
+        if len(self.pending) >= self.checkpoint_every or time.monotonic() - self.saved > self.checkpoint_interval:
+            await self.checkpoint()
+
+    def __write(self, lines: str):
+        self.file.write(lines)
+        self.file.flush()
+
+    async def checkpoint(self):
+        async with self.lock:
+            if not self.pending:
+                return
+            records, self.pending = self.pending, []
+            for target in self.durable:
+                await target.flush()
+            await asyncio.to_thread(self.__write, "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+            self.saved = time.monotonic()
+            self.written += len(records)
+
+    async def close(self, complete: bool = False):
+        '''
+        Write the last checkpoint. A `complete` run needs no resuming,
+        its journal is removed.
+        '''
+        await self.checkpoint()
+        self.file.close()
+        if complete:
+            os.remove(self.path)
@@ -1,5 +1,4 @@
 import hashlib
-import aiohttp
 
 class LoginData:
     def __init__(self, name: str, surname: str, patronymic: str, passnum: str, region: int):
@@ -19,6 +18,13 @@ class LoginData:
         prefix = '0' * (length - count)
         return prefix + self.passnum
     
+    def participant_key(self) -> str:
+        '''
+        Stable key identifying the participant, e.g. for storing their session.
+        '''
+        raw = f"{self.__simplifyName()}:{self.__transformPassnum()}:{self.region}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
     def setCaptcha(self, token, code):
         self.captcha_token = token
         self.captcha_code = code
@@ -39,4 +45,5 @@ class LoginData:
         }
     
     def form(self):
+        import aiohttp
         return aiohttp.FormData(self.json(), charset='utf-8')
\ No newline at end of file
@@ -0,0 +1,244 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+
+# Histogram buckets in seconds, from a cached DNS hit to a stuck portal.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# name: (type, label names, help)
+METRICS = {
+    "dns_seconds": ("histogram", ("endpoint",), "DNS resolution time."),
+    "connect_seconds": ("histogram", ("endpoint", "tls"), "Time to open a connection, TLS handshake included."),
+    "ttfb_seconds": ("histogram", ("endpoint",), "Time from sending a request to response headers."),
+    "request_seconds": ("histogram", ("endpoint",), "Total request time with the body, retries excluded."),
+    "responses_total": ("counter", ("endpoint", "status"), "Responses by status code."),
+    "request_errors_total": ("counter", ("endpoint", "error"), "Requests failed without a response."),
+    "retries_total": ("counter", ("endpoint",), "Retried requests."),
+    "phase_seconds": ("histogram", ("phase",), "Time spent in local phases."),
+}
+
+PREFIX = "checkege_"
+
+def endpoint_of(url) -> str:
+    '''
+    Endpoint name of a portal URL, e.g. "participant/login".
+    '''
+    path = url.path if hasattr(url, "path") else str(url).split("?", 1)[0]
+    path = path.strip("/")
+    return path[len("api/"):] if path.startswith("api/") else path
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+class Histogram:
+    __slots__ = ("counts", "count", "sum", "min", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: float):
+        i = 0
+        while i < len(BUCKETS) and value > BUCKETS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: "Histogram"):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.count += other.count
+        self.sum += other.sum
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def quantile(self, q: float) -> float | None:
+        '''
+        Estimate a quantile by linear interpolation inside its bucket.
+        '''
+        if not self.count:
+            return None
+
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                low = BUCKETS[i - 1] if i > 0 else 0.0
+                high = BUCKETS[i] if i < len(BUCKETS) else self.max
+                value = low + (high - low) * (rank - seen) / count
+                return min(max(value, self.min), self.max)
+            seen += count
+        return self.max
+
+class Metrics:
+    '''
+    In-memory registry of request timings, counters and local phase
+    timings. Cheap enough to stay always on; nothing is written unless
+    `write` is called.
+    '''
+
+    def __init__(self):
+        self.histograms: dict[str, dict[tuple, Histogram]] = {}
+        self.counters: dict[str, dict[tuple, int]] = {}
+        self.started = time.time()
+
+    def observe(self, name: str, labels: tuple, value: float):
+        series = self.histograms.setdefault(name, {})
+        histogram = series.get(labels)
+        if histogram is None:
+            histogram = series[labels] = Histogram()
+        histogram.observe(value)
+
+    def increment(self, name: str, labels: tuple, value: int = 1):
+        series = self.counters.setdefault(name, {})
+        series[labels] = series.get(labels, 0) + value
+
+    def merge(self, other: "Metrics"):
+        '''
+        Add up metrics collected elsewhere, e.g. in a worker process.
+        '''
+        for name, series in other.histograms.items():
+            for labels, histogram in series.items():
+                mine = self.histograms.setdefault(name, {}).get(labels)
+                if mine is None:
+                    mine = self.histograms[name][labels] = Histogram()
+                mine.merge(histogram)
+        for name, series in other.counters.items():
+            for labels, value in series.items():
+                self.increment(name, labels, value)
+
+    @contextmanager
+    def phase(self, name: str):
+        '''
+        Time a local phase: with metrics.phase("render"): ...
+        '''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("phase_seconds", (name,), time.perf_counter() - start)
+
+    def trace_config(self):
+        '''
+        aiohttp tracing of DNS, connection, time to first byte,
+        statuses and errors of every request.
+        '''
+        import aiohttp
+
+        trace = aiohttp.TraceConfig()
+
+        async def on_request_start(session, ctx, params):
+            ctx.endpoint = endpoint_of(params.url)
+            ctx.start = time.perf_counter()
+            ctx.is_ssl = params.url.scheme == "https"
+
+        async def on_request_end(session, ctx, params):
+            self.observe("ttfb_seconds", (ctx.endpoint,), time.perf_counter() - ctx.start)
+            self.increment("responses_total", (ctx.endpoint, str(params.response.status)))
+
+        async def on_request_exception(session, ctx, params):
+            self.increment("request_errors_total", (ctx.endpoint, type(params.exception).__name__))
+
+        async def on_dns_start(session, ctx, params):
+            ctx.dns_start = time.perf_counter()
+
+        async def on_dns_end(session, ctx, params):
+            elapsed = time.perf_counter() - ctx.dns_start
+            ctx.dns_elapsed = getattr(ctx, "dns_elapsed", 0.0) + elapsed
+            self.observe("dns_seconds", (ctx.endpoint,), elapsed)
+
+        async def on_connect_start(session, ctx, params):
+            ctx.connect_start = time.perf_counter()
+            ctx.dns_elapsed = 0.0
+
+        async def on_connect_end(session, ctx, params):
+            # DNS resolution runs inside connection setup, count it only once
+            elapsed = time.perf_counter() - ctx.connect_start - ctx.dns_elapsed
+            self.observe("connect_seconds", (ctx.endpoint, str(ctx.is_ssl).lower()), max(0.0, elapsed))
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_request_end.append(on_request_end)
+        trace.on_request_exception.append(on_request_exception)
+        trace.on_dns_resolvehost_start.append(on_dns_start)
+        trace.on_dns_resolvehost_end.append(on_dns_end)
+        trace.on_connection_create_start.append(on_connect_start)
+        trace.on_connection_create_end.append(on_connect_end)
+        return trace
+
+    def prometheus(self) -> str:
+        '''
+        Metrics in Prometheus text exposition format.
+        '''
+
+        lines = []
+        for name, (kind, label_names, help) in METRICS.items():
+            series = self.histograms.get(name) if kind == "histogram" else self.counters.get(name)
+            if not series:
+                continue
+
+            full = PREFIX + name
+            lines += [f"# HELP {full} {help}", f"# TYPE {full} {kind}"]
+            for labels, value in sorted(series.items()):
+                pairs = [f'{label}="{escape(str(v))}"' for label, v in zip(label_names, labels)]
+                if kind == "counter":
+                    lines.append(f"{full}{{{','.join(pairs)}}} {value}")
+                    continue
+
+                cumulative = 0
+                for bound, count in zip(BUCKETS + (None,), value.counts):
+                    cumulative += count
+                    le = "le=\"" + ("+Inf" if bound is None else f"{bound:g}") + "\""
+                    lines.append(f"{full}_bucket{{{','.join(pairs + [le])}}} {cumulative}")
+                lines.append(f"{full}_sum{{{','.join(pairs)}}} {value.sum:.6f}")
+                lines.append(f"{full}_count{{{','.join(pairs)}}} {value.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict:
+        '''
+        Human-oriented summary: count, mean and percentiles of every timing
+        (in milliseconds) and all counters.
+        '''
+
+        def key(name: str, labels: tuple) -> str:
+            return name + "{" + ",".join(f"{label}={v}" for label, v in zip(METRICS[name][1], labels)) + "}"
+
+        def ms(value: float | None) -> float | None:
+            return None if value is None else round(value * 1000, 2)
+
+        result = {"started": self.started, "finished": time.time(), "timings": {}, "counters": {}}
+        for name, series in self.histograms.items():
+            for labels, histogram in sorted(series.items()):
+                result["timings"][key(name, labels)] = {
+                    "count": histogram.count,
+                    "mean_ms": ms(histogram.sum / histogram.count),
+                    "min_ms": ms(histogram.min),
+                    "p50_ms": ms(histogram.quantile(0.5)),
+                    "p90_ms": ms(histogram.quantile(0.9)),
+                    "p99_ms": ms(histogram.quantile(0.99)),
+                    "max_ms": ms(histogram.max),
+                }
+        for name, series in self.counters.items():
+            for labels, value in sorted(series.items()):
+                result["counters"][key(name, labels)] = value
+        return result
+
+    def write(self, directory: str, name: str = "checkege"):
+        '''
+        Write `name.prom` (for node_exporter's textfile collector) and
+        `name.json` into the directory, atomically.
+        '''
+
+        os.makedirs(directory, exist_ok=True)
+        for ext, text in ((".prom", self.prometheus()), (".json", json.dumps(self.summary(), indent=2, ensure_ascii=False))):
+            path = os.path.join(directory, name + ext)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(path + ".tmp", path)
@@ -0,0 +1,64 @@
+import asyncio
+import os
+import sys
+import threading
+from getpass import getpass
+from typing import Callable
+
+# reader threads that may still be blocked on stdin
+readers: set[threading.Thread] = set()
+
+def _set_result(future: asyncio.Future, result):
+    if not future.done():
+        future.set_result(result)
+
+def _set_exception(future: asyncio.Future, error: BaseException):
+    if not future.done():
+        future.set_exception(error)
+
+async def run_in_reader(func: Callable[..., str], *args) -> str:
+    '''
+    Run a blocking prompt in a daemon thread, so the event loop keeps
+    running while the user types. Unlike asyncio.to_thread, a prompt
+    left waiting on Ctrl+C does not keep the process from exiting.
+    '''
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def read():
+        try:
+            result = func(*args)
+        except BaseException as e:
+            loop.call_soon_threadsafe(_set_exception, future, e)
+        else:
+            loop.call_soon_threadsafe(_set_result, future, result)
+        finally:
+            readers.discard(threading.current_thread())
+
+    thread = threading.Thread(target=read, name="checkege-prompt", daemon=True)
+    readers.add(thread)
+    thread.start()
+    return await future
+
+def exit_process(code: int = 0):
+    '''
+    Exit, e.g. on Ctrl+C. If a prompt is still waiting for input, the
+    interpreter can't finalize stdin under it, so exit right away.
+    '''
+    sys.stdout.flush()
+    sys.stderr.flush()
+    if any(thread.is_alive() for thread in readers):
+        os._exit(code)
+    sys.exit(code)
+
+async def ainput(prompt: str = "") -> str:
+    '''
+    input() that doesn't block the event loop.
+    '''
+    return await run_in_reader(input, prompt)
+
+async def agetpass(prompt: str = "") -> str:
+    '''
+    getpass() that doesn't block the event loop.
+    '''
+    return await run_in_reader(getpass, prompt)
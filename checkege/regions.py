@@ -1,3 +1,10 @@
+import asyncio
+import bisect
+import json
+import os
+import time
+from typing import Awaitable, Callable
+
 regions = {
     1: "Республика Адыгея",
     2: "Республика Башкортостан",
@@ -90,3 +97,128 @@ regions = {
     90: "ОУ, находящиеся в новых регионах и за пределами РФ",
     92: "г. Севастополь",
 }
+
+def normalize(name: str) -> str:
+    '''
+    Normalize region name for lookup: casefold, ё -> е, single spaces.
+    '''
+    return " ".join(name.casefold().replace("ё", "е").split())
+
+class RegionIndex:
+    '''
+    Prebuilt lookup tables over a region catalog.
+    '''
+
+    def __init__(self, regions: dict[int, str]):
+        self.regions = regions
+        self.by_name = {normalize(name): id for id, name in regions.items()}
+        self.sorted = sorted((normalize(name), name) for name in regions.values())
+        self.keys = [key for key, _ in self.sorted]
+
+    def resolve(self, query: str | int) -> int | None:
+        '''
+        Returns region number by its number or exact (normalized) name.
+        '''
+        query = str(query).strip()
+        if query.isnumeric():
+            return int(query) if int(query) in self.regions else None
+        return self.by_name.get(normalize(query))
+
+    def search(self, text: str) -> list[str]:
+        '''
+        Returns region names starting with the text first,
+        then names that contain it anywhere.
+        '''
+        text = normalize(text)
+        if not text:
+            return [name for _, name in self.sorted]
+
+        start = bisect.bisect_left(self.keys, text)
+        prefixed = []
+        for key, name in self.sorted[start:]:
+            if not key.startswith(text): break
+            prefixed.append(name)
+
+        contains = [name for key, name in self.sorted if text in key and not key.startswith(text)]
+        return prefixed + contains
+
+index = RegionIndex(regions)
+
+class RegionCatalog:
+    '''
+    On-disk cache of regions eligible on the portal.
+    Until the first successful fetch the static table is used.
+    '''
+
+    def __init__(self, path: str | None = None, ttl: float = 24 * 60 * 60):
+        self.path = path or self.default_path()
+        self.ttl = ttl
+        self.fetched = 0.0
+        self.regions = regions
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+                self.regions = {int(id): name for id, name in data["regions"].items()}
+                self.fetched = data["fetched"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+        self.index = RegionIndex(self.regions)
+
+    @staticmethod
+    def default_path():
+        '''
+        Returns the path to the region cache file.
+        '''
+        if os.getenv("CHECKEGE_REGIONS"):
+            return os.getenv("CHECKEGE_REGIONS")
+
+        path = "regions.json"
+        if os.name == "nt":
+            path = os.path.join(os.getenv("APPDATA"), "checkege", "regions.json")
+        elif os.name == "posix":
+            path = os.path.join(os.getenv("HOME"), ".checkege", "regions.json")
+
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        return path
+
+    @property
+    def is_stale(self) -> bool:
+        return time.time() - self.fetched > self.ttl
+
+    def __save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"fetched": self.fetched, "regions": self.regions}, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    async def revalidate(self, fetch: Callable[[], Awaitable[dict[int, str]]]):
+        '''
+        Fetch fresh regions and update the cache.
+        '''
+        fetched = await fetch()
+        if not fetched:
+            return
+
+        self.regions = fetched
+        self.index = RegionIndex(fetched)
+        self.fetched = time.time()
+        await asyncio.to_thread(self.__save)
+
+    def revalidate_in_background(self, fetch: Callable[[], Awaitable[dict[int, str]]]) -> asyncio.Task | None:
+        '''
+        Start revalidation if the cache is stale. Failures are ignored,
+        the cached table stays in use.
+        '''
+        if not self.is_stale:
+            return None
+
+        async def revalidate():
+            try:
+                await self.revalidate(fetch)
+            except Exception:
+                pass
+
+        return asyncio.get_running_loop().create_task(revalidate())
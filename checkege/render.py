@@ -0,0 +1,135 @@
+import sys
+from typing import TextIO
+from .colors import RESET_COLOR, ITALIC, RED, GRAY
+from .exams_model import ExamStatus
+
+LINETYPE_FIRST = 0
+LINETYPE_MIDDLE = 1
+LINETYPE_LAST = 2
+
+UNKNOWN_MARK = "Неизвестно"
+SEPARATOR = f"{GRAY} ┃ {RESET_COLOR}"
+
+# A table row is a list of cells, every cell is (text, color).
+Cell = tuple[str, str]
+
+def exam_cells(exam: ExamStatus, with_type: bool) -> list[Cell]:
+    mark = exam.mark
+    cells = [
+        (exam.date, ""),
+        (exam.subject, ITALIC),
+        (exam.display_status, exam.display_status_color),
+        (mark.display if mark else UNKNOWN_MARK, mark.color if mark else GRAY),
+    ]
+    if with_type:
+        cells.append((exam.exam_type, GRAY))
+    return cells
+
+def exam_rows(exams: list[ExamStatus]) -> list[list[Cell]]:
+    with_type = any(exam.is_oral for exam in exams)
+    return [exam_cells(exam, with_type) for exam in exams]
+
+def participant_rows(participant: str, exams: list[ExamStatus] | None,
+                     error: Exception | None = None) -> list[list[Cell]]:
+    '''
+    Rows of a table with results of many participants.
+    '''
+
+    if error is not None:
+        return [[(participant, ""), ("", ""), ("", ""), (f"Ошибка: {error}", RED), ("", ""), ("", "")]]
+    if not exams:
+        return [[(participant, ""), ("", ""), ("", ""), ("Нет доступных экзаменов", GRAY), ("", ""), ("", "")]]
+
+    rows = []
+    for exam in exams:
+        rows.append([(participant if not rows else "", "")] + exam_cells(exam, True))
+    return rows
+
+def measure(rows: list[list[Cell]]) -> list[int]:
+    widths = []
+    for row in rows:
+        for i, (text, _) in enumerate(row):
+            if i == len(widths):
+                widths.append(len(text))
+            elif len(text) > widths[i]:
+                widths[i] = len(text)
+    return widths
+
+def border(type: int, widths: list[int]) -> str:
+    corner1 = "┏" if type == LINETYPE_FIRST else "┣" if type == LINETYPE_MIDDLE else "┗"
+    corner2 = "┓" if type == LINETYPE_FIRST else "┫" if type == LINETYPE_MIDDLE else "┛"
+    connector = "┳" if type == LINETYPE_FIRST else "╋" if type == LINETYPE_MIDDLE else "┻"
+    return f"{corner1}{connector.join('━' * (width + 2) for width in widths)}{corner2}\n{RESET_COLOR}"
+
+def row_line(row: list[Cell], widths: list[int]) -> str:
+    cells = []
+    for (text, color), width in zip(row, widths):
+        if len(text) > width:
+            text = text[:width - 1] + "…"
+        cells.append(f"{color}{text:<{width}}{RESET_COLOR}")
+    # the line is finished by the following border
+    return f"{GRAY}┃{RESET_COLOR} {SEPARATOR.join(cells)} {GRAY}┃{RESET_COLOR}{GRAY}\n"
+
+def render(rows: list[list[Cell]], widths: list[int] | None = None) -> str:
+    '''
+    Render the whole table into one string.
+    '''
+
+    widths = widths or measure(rows)
+    parts = [GRAY, "\n", border(LINETYPE_FIRST, widths)]
+    for i, row in enumerate(rows):
+        parts.append(row_line(row, widths))
+        parts.append(border(LINETYPE_LAST if i == len(rows) - 1 else LINETYPE_MIDDLE, widths))
+    return "".join(parts)
+
+def write(text: str, out: TextIO | None = None):
+    '''
+    Write a frame with a single write and flush.
+    '''
+    out = out or sys.stdout
+    out.write(text)
+    out.flush()
+
+def print_exams(exams: list[ExamStatus], out: TextIO | None = None):
+    write(render(exam_rows(exams)), out)
+
+class StreamingTable:
+    '''
+    Table printed row by row as the data arrives.
+    With fixed `widths` longer cells are truncated, otherwise columns are
+    widened whenever wider rows come in (from those rows on).
+    '''
+
+    def __init__(self, widths: list[int] | None = None, out: TextIO | None = None):
+        self.widths = list(widths) if widths else None
+        self.fixed = widths is not None
+        self.out = out
+        self.started = False
+
+    def add(self, rows: list[list[Cell]]):
+        '''
+        Print a group of rows at once.
+        '''
+        if not rows:
+            return
+
+        if self.widths is None:
+            self.widths = measure(rows)
+        elif not self.fixed:
+            self.widths = measure([[(" " * width, "") for width in self.widths]] + rows)
+
+        parts = []
+        for row in rows:
+            if not self.started:
+                parts += [GRAY, "\n", border(LINETYPE_FIRST, self.widths)]
+                self.started = True
+            else:
+                parts.append(border(LINETYPE_MIDDLE, self.widths))
+            parts.append(row_line(row, self.widths))
+
+        write("".join(parts), self.out)
+
+    def close(self):
+        if self.started:
+            write(border(LINETYPE_LAST, self.widths), self.out)
+            self.started = False
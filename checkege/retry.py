@@ -0,0 +1,140 @@
+import asyncio
+import contextlib
+import email.utils
+import random
+import time
+
+# Statuses meaning "try again later": the request was not processed.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+def parse_retry_after(value: str | None) -> float | None:
+    '''
+    Returns the delay from a Retry-After header (seconds or HTTP date).
+    '''
+    if not value:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+class RetryPolicy:
+    '''
+    Exponential backoff with full jitter. Retry-After from the server
+    is honored, but never waited for longer than `max_delay`.
+    '''
+
+    def __init__(self, attempts: int = 4, base_delay: float = 0.5, max_delay: float = 30):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, retry_after: float | None = None) -> float:
+        '''
+        Delay before retry number `attempt` (starting from 0).
+        '''
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if retry_after is not None:
+            backoff = max(backoff, retry_after)
+        return min(backoff, self.max_delay)
+
+class CircuitBreaker:
+    '''
+    Pauses all requests going through it when the portal is clearly
+    overloaded: after `threshold` failures in a row (or an explicit
+    Retry-After) the circuit opens and requests wait. Once the pause is
+    over, a single probe request is let through: on success the circuit
+    closes, otherwise it opens again for twice as long.
+    One breaker can be shared by many clients.
+    '''
+
+    def __init__(self, threshold: int = 5, reset_timeout: float = 10, max_timeout: float = 300):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.max_timeout = max_timeout
+        self.failures = 0
+        self.timeout = reset_timeout
+        self.opened_until = 0.0
+        self.probe = asyncio.Lock()
+        self.opened = 0
+
+    @property
+    def is_open(self) -> bool:
+        return time.monotonic() < self.opened_until
+
+    @contextlib.asynccontextmanager
+    async def request(self):
+        '''
+        Wrap a request: waits while the circuit is open.
+        '''
+        while True:
+            while self.is_open:
+                await asyncio.sleep(self.opened_until - time.monotonic())
+
+            if self.failures < self.threshold:
+                yield
+                return
+
+            # half-open: requests go one by one until one succeeds
+            async with self.probe:
+                if self.is_open:
+                    continue
+                if self.failures >= self.threshold:
+                    yield
+                    return
+
+    def open(self, duration: float | None = None):
+        self.opened += 1
+        self.opened_until = max(self.opened_until, time.monotonic() + (duration or self.timeout))
+        self.timeout = min(self.timeout * 2, self.max_timeout)
+
+    def record_success(self):
+        self.failures = 0
+        self.timeout = self.reset_timeout
+
+    def record_failure(self, retry_after: float | None = None):
+        self.failures += 1
+        if retry_after is not None and retry_after > 0:
+            self.open(retry_after)
+        elif self.failures >= self.threshold:
+            self.open()
+
+class RateLimit:
+    '''
+    Budget of `rate` requests per second with bursts of up to `burst`
+    (generic cell rate algorithm): every request reserves the next free
+    slot and sleeps until it. Made with a multiprocessing `context`, the
+    budget lives in shared memory and is enforced across processes.
+    '''
+
+    def __init__(self, rate: float, burst: int = 1, context=None):
+        self.interval = 1 / rate
+        self.tolerance = (max(1, burst) - 1) * self.interval
+        # theoretical arrival time of the next request
+        self.tat = context.Value("d", 0.0) if context is not None else None
+        self.local_tat = 0.0
+
+    def reserve(self) -> float:
+        '''
+        Take a slot, returns how long to wait for it.
+        '''
+        now = time.monotonic()
+        if self.tat is None:
+            tat = max(self.local_tat, now)
+            self.local_tat = tat + self.interval
+        else:
+            with self.tat.get_lock():
+                tat = max(self.tat.value, now)
+                self.tat.value = tat + self.interval
+        return max(0.0, tat - self.tolerance - now)
+
+    async def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
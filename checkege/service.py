@@ -0,0 +1,252 @@
+import asyncio
+import hmac
+import json
+import time
+from collections import OrderedDict
+from aiohttp import web
+from .batch import CaptchaReportFunc, CaptchaSolveFunc, RosterEntry
+from .captcha_pool import Captcha
+from .client import CheckegeClient
+from .errors import CheckegeError, LoginError, PortalUnavailableError, SessionExpiredError
+from .exams_model import ExamStatus
+from .export import FIELDS, exam_record
+from .login_model import LoginData
+from .metrics import Metrics
+from .retry import CircuitBreaker
+from .sessions import SessionStore
+from .transport import TransportConfig
+
+def exam_json(exam: ExamStatus) -> dict:
+    data = dict(zip(FIELDS[1:], exam_record("", exam)[1:]))
+    data["display_status"] = exam.display_status
+    return data
+
+class Results:
+    def __init__(self, exams: list[ExamStatus], fetched: float):
+        self.exams = exams
+        self.fetched = fetched
+        self.expires = 0.0
+
+class ResultsService:
+    '''
+    Results of many participants for many local consumers.
+    Warm per-participant sessions are kept in an LRU pool of at most
+    `max_sessions` clients sharing one connection pool and circuit
+    breaker. Concurrent requests for a participant are coalesced into
+    one upstream request (a request able to log in retries on its own
+    when a shared one without login data fails), and its results are
+    served from memory for `ttl` seconds. Without an unattended
+    `solve_captcha` only participants with a saved session can be
+    checked, and the outcome of every captcha login is passed to
+    `report_captcha`.
+    '''
+
+    def __init__(self, store: SessionStore, solve_captcha: CaptchaSolveFunc | None = None,
+                 ttl: float = 60, max_sessions: int = 1000, refresh_margin: float = 300,
+                 transport: TransportConfig | None = None, metrics: Metrics | None = None,
+                 report_captcha: CaptchaReportFunc | None = None):
+        self.store = store
+        self.solve_captcha = solve_captcha
+        self.report_captcha = report_captcha
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.refresh_margin = refresh_margin
+        self.transport = transport or TransportConfig(limit_per_host=16)
+        self.metrics = metrics or Metrics()
+        self.breaker = CircuitBreaker()
+        self.session = None
+        self.clients: OrderedDict[str, CheckegeClient] = OrderedDict()
+        self.cache: OrderedDict[str, Results] = OrderedDict()
+        # fetches in flight, and whether they can log in with a captcha
+        self.inflight: dict[str, tuple[asyncio.Task, bool]] = {}
+        self.upstream = 0
+
+    async def __client(self, key: str) -> CheckegeClient:
+        client = self.clients.get(key)
+        if client is not None:
+            self.clients.move_to_end(key)
+            return client
+
+        if self.session is None:
+            self.session = self.transport.shared_session(CheckegeClient.BASE_URL, [self.metrics.trace_config()])
+        client = CheckegeClient(store=self.store, session_key=key, breaker=self.breaker,
+                                transport=self.transport, session=self.session, metrics=self.metrics)
+        await client.restore()
+        self.clients[key] = client
+        for old_key in list(self.clients):
+            if len(self.clients) <= self.max_sessions:
+                break
+            # sessions in use are kept even above the limit
+            if old_key not in self.inflight:
+                await self.clients.pop(old_key).stop()
+        return client
+
+    async def __load(self, key: str, data: LoginData | None) -> Results:
+        results = await self.__fetch(key, data)
+        results.expires = time.monotonic() + self.ttl
+        self.cache[key] = results
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.max_sessions:
+            self.cache.popitem(last=False)
+        return results
+
+    async def __fetch(self, key: str, data: LoginData | None) -> Results:
+        can_login = data is not None and self.solve_captcha is not None
+        if not can_login and key not in self.clients:
+            # unknown keys must not fill the pool with useless clients
+            state = await self.store.load(key)
+            if state is None or state.is_expired:
+                raise SessionExpiredError("No saved session, login with a captcha is required")
+
+        client = await self.__client(key)
+        if client.is_logged_in and not client.needs_refresh(self.refresh_margin):
+            try:
+                self.upstream += 1
+                return Results(await client.get_results(bypass_cache=True), time.time())
+            except SessionExpiredError:
+                if data is None or self.solve_captcha is None:
+                    raise
+
+        if data is None or self.solve_captcha is None:
+            raise SessionExpiredError("No valid session, login with a captcha is required")
+
+        captcha = Captcha(*await client.get_captcha())
+        if not captcha.token or not captcha.image:
+            raise CheckegeError("Failed to fetch captcha.")
+        with self.metrics.phase("captcha_solve"):
+            code = await self.solve_captcha(captcha.image)
+        if not code:
+            raise CheckegeError("Captcha was not solved.")
+
+        data.setCaptcha(captcha.token, code)
+        try:
+            await client.login(data)
+        except LoginError:
+            if self.report_captcha:
+                await self.report_captcha(captcha.image, False)
+            raise
+        if self.report_captcha:
+            await self.report_captcha(captcha.image, True)
+        self.upstream += 1
+        return Results(await client.get_results(bypass_cache=True), time.time())
+
+    async def results(self, key: str, data: LoginData | None = None) -> tuple[Results, bool]:
+        '''
+        Results of the participant with session `key`, and whether they
+        came from the cache. `data` allows a captcha login when the
+        session is missing or expired.
+        '''
+        cached = self.cache.get(key)
+        if cached is not None and cached.expires > time.monotonic():
+            self.cache.move_to_end(key)
+            return cached, True
+
+        can_login = data is not None and self.solve_captcha is not None
+        while True:
+            entry = self.inflight.get(key)
+            if entry is None:
+                entry = (asyncio.get_running_loop().create_task(self.__load(key, data)), can_login)
+                self.inflight[key] = entry
+                entry[0].add_done_callback(lambda _, entry=entry: self.__done(key, entry))
+            task, logs_in = entry
+            try:
+                # one consumer going away must not cancel the fetch for the others
+                return await asyncio.shield(task), False
+            except SessionExpiredError:
+                # the shared fetch could not log in, but this request can
+                if logs_in or not can_login:
+                    raise
+
+    def __done(self, key: str, entry: tuple[asyncio.Task, bool]):
+        if self.inflight.get(key) is entry:
+            del self.inflight[key]
+
+    def response(self, key: str, results: Results, cached: bool) -> web.Response:
+        return web.json_response({
+            "participant": key,
+            "fetched": results.fetched,
+            "cached": cached,
+            "exams": [exam_json(exam) for exam in results.exams],
+        }, dumps=lambda data: json.dumps(data, ensure_ascii=False))
+
+    async def __respond(self, key: str, data: LoginData | None = None) -> web.Response:
+        try:
+            results, cached = await self.results(key, data)
+        except SessionExpiredError as e:
+            return web.json_response({"participant": key, "error": str(e)}, status=401)
+        except PortalUnavailableError as e:
+            return web.json_response({"participant": key, "error": str(e)}, status=503)
+        except CheckegeError as e:
+            return web.json_response({"participant": key, "error": str(e)}, status=502)
+        return self.response(key, results, cached)
+
+    async def handle_get(self, request: web.Request) -> web.Response:
+        return await self.__respond(request.match_info["key"])
+
+    async def handle_post(self, request: web.Request) -> web.Response:
+        try:
+            row = await request.json()
+            if not isinstance(row, dict):
+                raise ValueError("expected a JSON object")
+            data = RosterEntry.from_row(row).login_data()
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400)
+        return await self.__respond(data.participant_key(), data)
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "sessions": len(self.clients),
+            "cached": len(self.cache),
+            "inflight": len(self.inflight),
+            "upstream": self.upstream,
+            "circuit_open": self.breaker.is_open,
+        })
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.metrics.prometheus(), content_type="text/plain")
+
+    def app(self, token: str | None = None) -> web.Application:
+        '''
+        The HTTP API. With a `token`, every request must carry
+        "Authorization: Bearer <token>".
+        '''
+
+        @web.middleware
+        async def authorize(request: web.Request, handler):
+            if token is not None:
+                given = request.headers.get("Authorization", "")
+                if not hmac.compare_digest(given.encode(), f"Bearer {token}".encode()):
+                    return web.json_response({"error": "unauthorized"}, status=401)
+            return await handler(request)
+
+        app = web.Application(middlewares=[authorize])
+        app.add_routes([
+            web.get("/results/{key}", self.handle_get),
+            web.post("/results", self.handle_post),
+            web.get("/health", self.handle_health),
+            web.get("/metrics", self.handle_metrics),
+        ])
+        return app
+
+    async def serve(self, host: str = "localhost", port: int = 8080, token: str | None = None):
+        '''
+        Serve the API until cancelled.
+        '''
+        runner = web.AppRunner(self.app(token), access_log=None)
+        await runner.setup()
+        try:
+            await web.TCPSite(runner, host, port).start()
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+            await self.close()
+
+    async def close(self):
+        for task, _ in list(self.inflight.values()):
+            task.cancel()
+        for client in self.clients.values():
+            await client.stop()
+        self.clients.clear()
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
@@ -0,0 +1,204 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from http.cookies import SimpleCookie
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import aiohttp
+
+# Morsel attributes worth keeping between runs. "max-age" is relative
+# to the moment the cookie was set, so it is not restored.
+COOKIE_ATTRS = ("domain", "path", "expires", "secure", "httponly", "samesite")
+
+def dump_cookies(jar: "aiohttp.CookieJar") -> str:
+    '''
+    Serialize all cookies of the jar into a JSON string.
+    '''
+
+    cookies = []
+    for morsel in jar:
+        cookie = {"key": morsel.key, "value": morsel.value}
+        for attr in COOKIE_ATTRS:
+            if morsel[attr]:
+                cookie[attr] = morsel[attr]
+        cookies.append(cookie)
+    return json.dumps(cookies, ensure_ascii=False)
+
+def cookie_expiry(jar: "aiohttp.CookieJar", name: str) -> float | None:
+    '''
+    Returns when the cookie expires (unix time), None for session cookies.
+    Must be called right after the cookie is set, as "max-age" counts from then.
+    '''
+    import email.utils
+
+    morsel = next((morsel for morsel in jar if morsel.key == name), None)
+    if morsel is None:
+        return None
+    if morsel["max-age"]:
+        try:
+            return time.time() + int(morsel["max-age"])
+        except ValueError:
+            pass
+    if morsel["expires"]:
+        try:
+            return email.utils.parsedate_to_datetime(morsel["expires"]).timestamp()
+        except (TypeError, ValueError):
+            pass
+    return None
+
+def load_cookies(jar: "aiohttp.CookieJar", data: str, url: str):
+    '''
+    Restore cookies previously serialized with `dump_cookies`.
+    '''
+    from yarl import URL
+
+    response_url = URL(url)
+    for cookie in json.loads(data):
+        morsels = SimpleCookie()
+        morsels[cookie["key"]] = cookie["value"]
+        morsel = morsels[cookie["key"]]
+        for attr in COOKIE_ATTRS:
+            # cookies set without a domain are host-only, keep them that way
+            if attr == "domain" and cookie.get(attr) == response_url.raw_host:
+                continue
+            if cookie.get(attr):
+                morsel[attr] = cookie[attr]
+        jar.update_cookies(morsels, response_url)
+
+class SessionState:
+    '''
+    Saved session: cookies, when the session cookie expires, when the
+    session was last used successfully and whose it is (participant key).
+    '''
+
+    def __init__(self, cookies: str, expires: float | None = None, used: float | None = None,
+                 participant: str | None = None):
+        self.cookies = cookies
+        self.expires = expires
+        self.used = used
+        self.participant = participant
+
+    @property
+    def is_expired(self) -> bool:
+        return self.expires is not None and self.expires <= time.time()
+
+class SessionStore:
+    '''
+    SQLite-backed storage of per-participant cookie jars.
+    Sessions are loaded one by one on demand, while writes are collected
+    in memory and committed in batches, off the event loop.
+    '''
+
+    def __init__(self, path: str | None = None, batch_size: int = 64):
+        self.path = path or self.default_path()
+        self.batch_size = batch_size
+        self.pending: dict[str, SessionState | None] = {}
+        self.writing: dict[str, SessionState | None] = {}
+        self.flush_task: asyncio.Task | None = None
+        self.flush_lock = asyncio.Lock()
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "key TEXT PRIMARY KEY, cookies TEXT NOT NULL, updated REAL NOT NULL, expires REAL, used REAL, participant TEXT)"
+        )
+        # databases created before expiry tracking
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(sessions)")}
+        for column, kind in (("expires", "REAL"), ("used", "REAL"), ("participant", "TEXT")):
+            if column not in columns:
+                self.db.execute(f"ALTER TABLE sessions ADD COLUMN {column} {kind}")
+        self.db.commit()
+
+    @staticmethod
+    def default_path():
+        '''
+        Returns the path to the session database.
+        '''
+        if os.getenv("CHECKEGE_SESSIONS"):
+            return os.getenv("CHECKEGE_SESSIONS")
+
+        path = "sessions.db"
+        if os.name == "nt":
+            path = os.path.join(os.getenv("APPDATA"), "checkege", "sessions.db")
+        elif os.name == "posix":
+            path = os.path.join(os.getenv("HOME"), ".checkege", "sessions.db")
+
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        return path
+
+    def __select(self, key: str) -> SessionState | None:
+        with self.lock:
+            row = self.db.execute("SELECT cookies, expires, used, participant FROM sessions WHERE key = ?", (key,)).fetchone()
+        return SessionState(*row) if row else None
+
+    def __commit(self, items: dict[str, SessionState | None]):
+        now = time.time()
+        with self.lock, self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO sessions (key, cookies, updated, expires, used, participant) VALUES (?, ?, ?, ?, ?, ?)",
+                [(key, state.cookies, now, state.expires, state.used, state.participant)
+                 for key, state in items.items() if state is not None]
+            )
+            self.db.executemany(
+                "DELETE FROM sessions WHERE key = ?",
+                [(key,) for key, state in items.items() if state is None]
+            )
+
+    async def load(self, key: str) -> SessionState | None:
+        '''
+        Returns the saved session, or None if there is none.
+        '''
+        if key in self.pending:
+            return self.pending[key]
+        if key in self.writing:
+            return self.writing[key]
+        return await asyncio.to_thread(self.__select, key)
+
+    def put(self, key: str, cookies: str, expires: float | None = None, used: float | None = None,
+            participant: str | None = None):
+        self.pending[key] = SessionState(cookies, expires, used, participant)
+        self.__schedule_flush()
+
+    def delete(self, key: str):
+        self.pending[key] = None
+        self.__schedule_flush()
+
+    def __schedule_flush(self):
+        if len(self.pending) < self.batch_size:
+            return
+        if self.flush_task and not self.flush_task.done():
+            return
+
+        try:
+            self.flush_task = asyncio.get_running_loop().create_task(self.flush())
+        except RuntimeError:
+            # no event loop, commit right away
+            self.__commit(self.pending)
+            self.pending = {}
+
+    async def flush(self):
+        '''
+        Commit all pending changes in one transaction.
+        '''
+        async with self.flush_lock:
+            while self.pending:
+                self.writing, self.pending = self.pending, {}
+                try:
+                    await asyncio.to_thread(self.__commit, self.writing)
+                finally:
+                    self.writing = {}
+
+    def clear(self):
+        self.pending = {}
+        self.writing = {}
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM sessions")
+
+    async def close(self):
+        await self.flush()
+        self.db.close()
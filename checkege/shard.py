@@ -0,0 +1,358 @@
+import asyncio
+import inspect
+import itertools
+import math
+import multiprocessing
+import signal
+import threading
+from typing import Awaitable, Callable, Iterable
+from . import errors
+from .batch import READ_CHUNK, BatchResult, BatchRunner, CaptchaReportFunc, CaptchaSolveFunc, RosterEntry
+from .metrics import Metrics
+from .retry import RateLimit
+from .sessions import SessionStore
+from .transport import ConnectionStats
+from .vault import VaultEntry, decrypt_profile
+
+# Results a worker sends at once, and how long it may hold them.
+FLUSH_SIZE = 64
+FLUSH_INTERVAL = 0.2
+# Roster entries sent to a worker at once.
+FEED_SIZE = 32
+
+def encode_error(error: Exception | None) -> tuple[str, str] | None:
+    # exceptions don't always survive pickling, their text is enough
+    return None if error is None else (type(error).__name__, str(error))
+
+def decode_error(error: tuple[str, str] | None) -> Exception | None:
+    if error is None:
+        return None
+    name, message = error
+    kind = getattr(errors, name, None)
+    if isinstance(kind, type) and issubclass(kind, errors.CheckegeError):
+        return kind(message)
+    return errors.CheckegeError(message)
+
+async def run_worker(conn, concurrency: int, prefetch: int, store_path: str | None,
+                     rate_limit: RateLimit | None):
+    '''
+    Check the entries the parent streams to this process. Vault profiles
+    come as tokens with their key and are decrypted here. Captchas are
+    solved by the parent, which also learns whether the portal accepted
+    them; results go back in chunks, each after the sessions it relies on
+    are saved, and metrics once at the end.
+    '''
+    loop = asyncio.get_running_loop()
+    pending: dict[int, asyncio.Future] = {}
+    ids = itertools.count()
+    incoming: asyncio.Queue = asyncio.Queue()
+
+    def resolve(request_id: int, code: str | None):
+        future = pending.pop(request_id, None)
+        if future is not None and not future.done():
+            future.set_result(code)
+
+    def read():
+        try:
+            while True:
+                message = conn.recv()
+                if message[0] == "code":
+                    loop.call_soon_threadsafe(resolve, message[1], message[2])
+                elif message[0] == "entries":
+                    loop.call_soon_threadsafe(incoming.put_nowait, message[1:])
+                elif message[0] == "end":
+                    loop.call_soon_threadsafe(incoming.put_nowait, None)
+        except (EOFError, OSError):
+            for request_id in list(pending):
+                loop.call_soon_threadsafe(resolve, request_id, None)
+            loop.call_soon_threadsafe(incoming.put_nowait, None)
+
+    threading.Thread(target=read, name="checkege-shard", daemon=True).start()
+
+    async def solve(image: bytes) -> str | None:
+        request_id = next(ids)
+        pending[request_id] = loop.create_future()
+        conn.send(("captcha", request_id, image))
+        return await pending[request_id]
+
+    async def report(image: bytes, accepted: bool):
+        conn.send(("report", image, accepted))
+
+    fernet = None
+    # roster positions of the entries by their position in this worker
+    indexes: dict[int, int] = {}
+
+    def decrypt(chunk: list[tuple[int, RosterEntry | bytes]], profile_key: bytes | None) -> list[tuple[int, RosterEntry]]:
+        nonlocal fernet
+        if profile_key is not None and fernet is None:
+            from cryptography.fernet import Fernet
+            fernet = Fernet(profile_key)
+        return [(index, decrypt_profile(fernet, entry) if isinstance(entry, bytes) else entry)
+                for index, entry in chunk]
+
+    async def source():
+        position = 0
+        while (message := await incoming.get()) is not None:
+            # vault profiles are decrypted off the event loop, a chunk at a time
+            for index, entry in await asyncio.to_thread(decrypt, *message):
+                indexes[position] = index
+                position += 1
+                yield entry
+
+    buffer = []
+
+    async def flush():
+        if buffer:
+            chunk = buffer[:]
+            buffer.clear()
+            # the parent may checkpoint these entries as soon as it gets
+            # them, so their sessions have to be saved first
+            if store:
+                await store.flush()
+            conn.send(("results", chunk))
+
+    async def on_result(result: BatchResult):
+        # the parent gets the decrypted entry to show, it doesn't decrypt again
+        buffer.append((indexes.pop(result.index), result.entry, result.exams, encode_error(result.error),
+                       result.elapsed))
+        if len(buffer) >= FLUSH_SIZE:
+            await flush()
+
+    async def flush_periodically():
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            await flush()
+
+    store = SessionStore(store_path) if store_path else None
+    metrics = Metrics()
+    runner = BatchRunner(solve, concurrency, store, prefetch, metrics=metrics, rate_limit=rate_limit,
+                         report_captcha=report)
+    flusher = loop.create_task(flush_periodically())
+    try:
+        await runner.run(source(), on_result, collect=False)
+    finally:
+        flusher.cancel()
+        await flush()
+        if store:
+            await store.close()
+
+    conn.send(("done", metrics, {
+        "reused": runner.reused,
+        "logins": runner.logins,
+        "created": runner.stats.created,
+        "reused_connections": runner.stats.reused,
+    }))
+
+def worker_main(conn, concurrency: int, prefetch: int, store_path: str | None, rate_limit: RateLimit | None):
+    # Ctrl+C is handled by the parent, which stops the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        asyncio.run(run_worker(conn, concurrency, prefetch, store_path, rate_limit))
+    except Exception as e:
+        conn.send(("failed", f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+class ShardedRunner:
+    '''
+    BatchRunner spread over `processes` worker processes, for rosters
+    too large for one core. Each worker runs its own event loop, session
+    and connection pool, the roster is streamed to whichever of them has
+    the least work, and all of them share a request budget of `rate`
+    requests per second.
+    Captchas are solved in this process with `solve_captcha` and their
+    outcome goes to `report_captcha`; results, metrics and errors are
+    gathered here as well. `concurrency` is the total over all workers.
+    '''
+
+    def __init__(self, solve_captcha: CaptchaSolveFunc, processes: int, concurrency: int = 8,
+                 store: SessionStore | None = None, prefetch: int = 0, rate: float | None = None,
+                 burst: int = 1, metrics: Metrics | None = None,
+                 report_captcha: CaptchaReportFunc | None = None):
+        self.solve_captcha = solve_captcha
+        self.report_captcha = report_captcha
+        self.processes = processes
+        self.concurrency = concurrency
+        self.store_path = store.path if store else None
+        self.prefetch = prefetch
+        self.rate = rate
+        self.burst = burst
+        self.metrics = metrics
+        self.stats = ConnectionStats()
+        self.reused = 0
+        self.logins = 0
+
+    async def __solve(self, conn, request_id: int, image: bytes):
+        try:
+            code = await self.solve_captcha(image)
+        except Exception:
+            code = None
+        try:
+            conn.send(("code", request_id, code))
+        except OSError:
+            # the worker is gone
+            pass
+
+    async def run(self, entries: Iterable,
+                  on_result: Callable[[BatchResult], Awaitable[None] | None] | None = None,
+                  skip: Callable[[int], bool] | None = None, collect: bool = True) -> list[BatchResult]:
+        '''
+        Check all entries, like `BatchRunner.run`: the roster is read
+        lazily and streamed to the workers, each of them holding at most
+        a few chunks at a time, so memory use doesn't depend on the roster
+        size unless the results are collected.
+        '''
+        context = multiprocessing.get_context("spawn")
+        rate_limit = RateLimit(self.rate, self.burst, context) if self.rate else None
+        concurrency = max(1, math.ceil(self.concurrency / self.processes))
+        # entries a worker may hold: what it checks and the next chunks
+        backlog = 2 * (FEED_SIZE + concurrency)
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        workers = []
+        for number in range(self.processes):
+            conn, child_conn = context.Pipe()
+            process = context.Process(target=worker_main, name=f"checkege-worker-{number}", daemon=True,
+                                      args=(child_conn, concurrency, self.prefetch, self.store_path, rate_limit))
+            process.start()
+            child_conn.close()
+
+            def read(number=number, conn=conn):
+                try:
+                    while True:
+                        loop.call_soon_threadsafe(queue.put_nowait, (number, conn.recv()))
+                except (EOFError, OSError):
+                    try:
+                        loop.call_soon_threadsafe(queue.put_nowait, (number, ("exit",)))
+                    except RuntimeError:
+                        # the loop is already closed
+                        pass
+
+            threading.Thread(target=read, name=f"checkege-shard-{number}", daemon=True).start()
+            workers.append((process, conn))
+
+        results: list[BatchResult] = []
+        # entries sent to every worker and not checked yet, failed if it exits
+        unfinished: list[dict[int, object]] = [{} for _ in workers]
+        alive = [True] * len(workers)
+        room = asyncio.Event()
+        failures: dict[int, str] = {}
+        solving: set[asyncio.Task] = set()
+        reporting: set[asyncio.Task] = set()
+
+        async def emit(result: BatchResult):
+            if on_result:
+                ret = on_result(result)
+                if inspect.isawaitable(ret):
+                    await ret
+            if collect:
+                results.append(result)
+
+        async def fail(chunk, message: str):
+            error = errors.CheckegeError(message)
+            for index, entry in chunk:
+                await emit(BatchResult(entry, error=error, index=index))
+
+        async def assign(chunk: list[tuple[int, object]]):
+            while True:
+                live = [number for number in range(len(workers)) if alive[number]]
+                if not live:
+                    await fail(chunk, "No worker processes left")
+                    return
+                number = min(live, key=lambda number: len(unfinished[number]))
+                if len(unfinished[number]) < backlog:
+                    break
+                room.clear()
+                await room.wait()
+
+            unfinished[number].update(chunk)
+            # vault profiles are decrypted by the workers, the key goes with them
+            profile_key = next((entry.vault.profile_key for _, entry in chunk if isinstance(entry, VaultEntry)), None)
+            payload = [(index, entry.token if isinstance(entry, VaultEntry) else entry) for index, entry in chunk]
+            try:
+                workers[number][1].send(("entries", payload, profile_key))
+            except OSError:
+                # the worker is gone, its exit fails the chunk
+                pass
+
+        async def feed():
+            iterator = iter(entries)
+            index = 0
+            chunk = []
+            try:
+                # a roster file is read off the event loop
+                while rows := await asyncio.to_thread(list, itertools.islice(iterator, READ_CHUNK)):
+                    for entry in rows:
+                        if skip is None or not skip(index):
+                            chunk.append((index, entry))
+                        index += 1
+                    while len(chunk) >= FEED_SIZE:
+                        await assign(chunk[:FEED_SIZE])
+                        del chunk[:FEED_SIZE]
+                # the tail is split so that a short roster still uses every worker
+                live = sum(alive) or 1
+                for part in (chunk[i::live] for i in range(live)):
+                    if part:
+                        await assign(part)
+            finally:
+                for number, (_, conn) in enumerate(workers):
+                    if alive[number]:
+                        try:
+                            conn.send(("end",))
+                        except OSError:
+                            pass
+
+        feeder = loop.create_task(feed())
+        live = len(workers)
+        try:
+            while live:
+                number, message = await queue.get()
+                kind = message[0]
+                if kind == "results":
+                    for index, entry, exams, error, elapsed in message[1]:
+                        unfinished[number].pop(index, None)
+                        await emit(BatchResult(entry, exams, decode_error(error), index, elapsed))
+                    room.set()
+                elif kind == "captcha":
+                    task = loop.create_task(self.__solve(workers[number][1], message[1], message[2]))
+                    solving.add(task)
+                    task.add_done_callback(solving.discard)
+                elif kind == "report":
+                    if self.report_captcha:
+                        task = loop.create_task(self.report_captcha(message[1], message[2]))
+                        reporting.add(task)
+                        task.add_done_callback(reporting.discard)
+                elif kind == "done":
+                    metrics, counters = message[1], message[2]
+                    if self.metrics:
+                        self.metrics.merge(metrics)
+                    self.reused += counters["reused"]
+                    self.logins += counters["logins"]
+                    self.stats.created += counters["created"]
+                    self.stats.reused += counters["reused_connections"]
+                elif kind == "failed":
+                    failures[number] = message[1]
+                elif kind == "exit":
+                    live -= 1
+                    alive[number] = False
+                    lost = list(unfinished[number].items())
+                    unfinished[number].clear()
+                    await fail(lost, failures.get(number, "Worker process exited"))
+                    room.set()
+            # with every worker gone the rest of the roster is failed here
+            await feeder
+        finally:
+            feeder.cancel()
+            for task in solving:
+                task.cancel()
+            # reports are quick, let them finish
+            await asyncio.gather(*reporting, return_exceptions=True)
+            for process, conn in workers:
+                # workers still running here were interrupted
+                if live:
+                    process.terminate()
+                await asyncio.to_thread(process.join)
+                conn.close()
+
+        return sorted(results, key=lambda result: result.index)
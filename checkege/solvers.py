@@ -0,0 +1,223 @@
+import asyncio
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+def parse_code(text: str) -> str | None:
+    '''
+    Returns the captcha code if the text is exactly 6 digits.
+    Kept as a string: leading zeros matter.
+    '''
+    text = text.strip()
+    if len(text) != 6 or not text.isdigit():
+        return None
+    return text
+
+class CaptchaSolver:
+    '''
+    Base class of captcha solvers. `solve` never blocks the event loop:
+    blocking work of `solve_blocking` runs in a worker thread.
+    Solvers needing a human handle one captcha at a time.
+    Unattended solvers need no terminal and can run from cron.
+    '''
+
+    interactive = True
+    unattended = False
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+
+    def solve_blocking(self, image: bytes) -> str | None:
+        raise NotImplementedError
+
+    async def solve(self, image: bytes) -> str | None:
+        '''
+        Returns the captcha code, or None if the captcha was skipped.
+        '''
+        if not self.interactive:
+            return await asyncio.to_thread(self.solve_blocking, image)
+
+        async with self.lock:
+            return await asyncio.to_thread(self.solve_blocking, image)
+
+    async def report(self, image: bytes, accepted: bool):
+        '''
+        Called once the portal has accepted or rejected a code from `solve`.
+        '''
+        pass
+
+class GuiSolver(CaptchaSolver):
+    '''
+    Shows the captcha in a tkinter window. The window runs in a child
+    process, since tkinter wants to own the main thread.
+    '''
+
+    async def solve(self, image: bytes) -> str | None:
+        async with self.lock:
+            proc = await asyncio.create_subprocess_exec(
+                sys.executable, os.path.join(os.path.dirname(__file__), "captcha_gui.py"),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+            )
+            stdout, _ = await proc.communicate(image)
+            return parse_code(stdout.decode())
+
+class TerminalSolver(CaptchaSolver):
+    '''
+    Draws the captcha right in the terminal with ANSI half-block characters,
+    which works over SSH without a display.
+    '''
+
+    def __init__(self, width: int | None = None):
+        super().__init__()
+        self.width = width
+
+    def render(self, image: bytes) -> str:
+        from PIL import Image
+
+        img = Image.open(io.BytesIO(image)).convert("RGB")
+        width = self.width or min(shutil.get_terminal_size().columns - 1, img.width)
+        height = max(2, round(img.height * width / img.width / 2) * 2)
+        img = img.resize((width, height))
+        pixels = img.load()
+
+        # every character cell shows two pixels: the upper one as foreground
+        # color of "▀" and the lower one as background
+        lines = []
+        for y in range(0, height, 2):
+            line = []
+            for x in range(width):
+                top, bottom = pixels[x, y], pixels[x, y + 1]
+                line.append(f"\033[38;2;{top[0]};{top[1]};{top[2]}m\033[48;2;{bottom[0]};{bottom[1]};{bottom[2]}m▀")
+            lines.append("".join(line) + "\033[0m")
+        return "\n".join(lines)
+
+    def solve_blocking(self, image: bytes) -> str | None:
+        sys.stdout.write(self.render(image) + "\n")
+        sys.stdout.flush()
+
+        while True:
+            text = input("Введите 6 цифр с картинки (пусто - пропустить): ").strip()
+            if not text:
+                return None
+
+            code = parse_code(text)
+            if code:
+                return code
+            print("Капча должна содержать ровно 6 цифр.")
+
+class StdinSolver(CaptchaSolver):
+    '''
+    For automation: saves the captcha to a file, prints its path to stderr
+    and reads the code as a line from stdin.
+    '''
+
+    unattended = True
+
+    def __init__(self, directory: str | None = None):
+        super().__init__()
+        self.directory = directory or os.path.join(tempfile.gettempdir(), "checkege-captcha")
+
+    def save(self, image: bytes) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        fd, path = tempfile.mkstemp(prefix="captcha-", suffix=".png", dir=self.directory)
+        with os.fdopen(fd, "wb") as f:
+            f.write(image)
+        return path
+
+    def solve_blocking(self, image: bytes) -> str | None:
+        path = self.save(image)
+        print(f"captcha: {path}", file=sys.stderr, flush=True)
+        try:
+            line = sys.stdin.readline()
+        finally:
+            os.remove(path)
+        return parse_code(line)
+
+class FileSolver(StdinSolver):
+    '''
+    For automation: saves the captcha as `captcha-XXX.png` and waits for
+    someone (a person or a script) to write the code to `captcha-XXX.txt`.
+    Captchas are independent, so many of them can be pending at once.
+    '''
+
+    def __init__(self, directory: str | None = None, timeout: float = 300, poll_interval: float = 0.5):
+        super().__init__(directory)
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+
+    async def solve(self, image: bytes) -> str | None:
+        path = await asyncio.to_thread(self.save, image)
+        answer = os.path.splitext(path)[0] + ".txt"
+        deadline = time.monotonic() + self.timeout
+        try:
+            while time.monotonic() < deadline:
+                if os.path.exists(answer):
+                    with open(answer, "r") as f:
+                        return parse_code(f.read())
+                await asyncio.sleep(self.poll_interval)
+            return None
+        finally:
+            for file in (path, answer):
+                if os.path.exists(file):
+                    os.remove(file)
+
+class CommandSolver(CaptchaSolver):
+    '''
+    For automation: pipes the captcha image into a command (a recognizer
+    service client, a solving API wrapper...) and reads the code from
+    its stdout. The command is taken from CHECKEGE_CAPTCHA_COMMAND
+    unless given explicitly.
+    '''
+
+    interactive = False
+    unattended = True
+
+    def __init__(self, command: str | None = None, timeout: float = 120):
+        super().__init__()
+        self.command = command or os.getenv("CHECKEGE_CAPTCHA_COMMAND")
+        self.timeout = timeout
+
+    async def solve(self, image: bytes) -> str | None:
+        if not self.command:
+            raise ValueError("Captcha command is not set")
+
+        proc = await asyncio.create_subprocess_shell(
+            self.command,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+        )
+        try:
+            stdout, _ = await asyncio.wait_for(proc.communicate(image), self.timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            return None
+        if proc.returncode != 0:
+            return None
+        return parse_code(stdout.decode(errors="replace"))
+
+SOLVERS = {
+    "gui": GuiSolver,
+    "terminal": TerminalSolver,
+    "stdin": StdinSolver,
+    "file": FileSolver,
+    "command": CommandSolver,
+}
+
+def default_solver_name() -> str:
+    '''
+    The tkinter window when a display is available, the terminal renderer otherwise.
+    '''
+    if os.name == "nt" or sys.platform == "darwin" or os.getenv("DISPLAY") or os.getenv("WAYLAND_DISPLAY"):
+        return "gui"
+    return "terminal"
+
+def get_solver(name: str | None = None) -> CaptchaSolver:
+    name = name or default_solver_name()
+    if name not in SOLVERS:
+        raise ValueError(f"Unknown captcha solver \"{name}\"")
+    return SOLVERS[name]()
@@ -0,0 +1,344 @@
+import csv
+import json
+import math
+import os
+from array import array
+from collections import Counter
+from .colors import GRAY, ITALIC
+from .exams_model import (ExamStatus, STATUS_NAMES, STATUS_COLORS, COLOR_SYSTEM,
+                          COLOR_BAD, COLOR_ACCEPTABLE, COLOR_GOOD, COLOR_GREAT)
+from .render import Cell
+
+# Grouping dimensions of the summary.
+DIMENSIONS = ("subject", "region", "date", "oral")
+DIMENSION_TITLES = {"subject": "Предмет", "region": "Регион", "date": "Дата", "oral": "Тип"}
+
+# Mark bands, the colors marks are printed with.
+BANDS = ("bad", "acceptable", "good", "great")
+BAND_TITLES = ("< мин.", "мин.–59", "60–74", "75+")
+BAND_COLORS = (COLOR_BAD, COLOR_ACCEPTABLE, COLOR_GOOD, COLOR_GREAT)
+BAND_OF_COLOR = {color: band for band, color in enumerate(BAND_COLORS)}
+
+QUANTILES = (0.25, 0.5, 0.75, 0.9)
+
+SUMMARY_FORMATS = (".json", ".csv")
+
+NAN = float("nan")
+
+def load_numpy():
+    '''
+    numpy if it's installed, the summary is computed without it otherwise.
+    '''
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+def parse_dimensions(text: str) -> tuple[str, ...]:
+    by = tuple(dict.fromkeys(part.strip() for part in text.split(",") if part.strip()))
+    unknown = [dimension for dimension in by if dimension not in DIMENSIONS]
+    if unknown or not by:
+        raise ValueError(f"Unknown grouping \"{','.join(unknown)}\", use some of: {', '.join(DIMENSIONS)}")
+    return by
+
+def mark_band(mark5: int | None, mark100: int | None, min100: int | None) -> int:
+    '''
+    Band of a mark from exported values. Exports have no exam scope, so
+    exams with a 100-point mark are banded by it and the rest by Mark5,
+    as basic math is.
+    '''
+    if mark100 is not None and min100 is not None:
+        if mark100 < min100:
+            return 0
+        return 1 if mark100 < 60 else 2 if mark100 < 75 else 3
+    if mark5 is not None:
+        return min(3, max(0, mark5 - 2))
+    return -1
+
+class Categories:
+    '''
+    Distinct values of a string column, rows keep their codes.
+    '''
+
+    def __init__(self):
+        self.values: list[str] = []
+        self.codes: dict[str, int] = {}
+
+    def code(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+class ResultColumns:
+    '''
+    Results of many participants, one row per exam, as columns of typed
+    arrays: codes of subjects and dates, region (-1 when unknown), oral
+    flag, status, 100-point mark (NaN without one), whether the minimum
+    is passed and the mark band (-1 without results). A row costs a few
+    dozen bytes, and numpy reads the arrays without copying.
+    '''
+
+    def __init__(self):
+        self.subjects = Categories()
+        self.dates = Categories()
+        self.subject = array("i")
+        self.region = array("i")
+        self.date = array("i")
+        self.oral = array("b")
+        self.status = array("i")
+        self.mark100 = array("d")
+        self.passed = array("b")
+        self.band = array("b")
+
+    def __len__(self):
+        return len(self.subject)
+
+    def append(self, subject: str | None, region: int | None, date: str | None, oral: bool | None,
+               status: int | None, mark100: int | None, passed: bool | None, band: int):
+        self.subject.append(self.subjects.code(subject or ""))
+        self.region.append(-1 if region is None else region)
+        # the portal gives the time as well, always midnight
+        self.date.append(self.dates.code((date or "")[:10]))
+        self.oral.append(bool(oral))
+        self.status.append(-1 if status is None else status)
+        self.mark100.append(NAN if mark100 is None else mark100)
+        self.passed.append(-1 if passed is None else bool(passed))
+        self.band.append(band)
+
+    def add(self, exams: list[ExamStatus], region: int | None = None):
+        for exam in exams:
+            mark = exam.mark
+            self.append(exam.subject, region, exam.date, exam.is_oral, exam.int_status,
+                        mark.mark100 if mark else None, mark.completion if mark else None,
+                        BAND_OF_COLOR.get(mark.color, -1) if mark else -1)
+
+    def add_records(self, columns: dict[str, list]):
+        '''
+        Add rows of an export loaded with `export.read_export`.
+        '''
+        for subject, date, oral, status, mark5, mark100, min100, completion in zip(
+                columns["subject"], columns["date"], columns["is_oral"], columns["status"],
+                columns["mark5"], columns["mark100"], columns["min100"], columns["completion"]):
+            self.append(subject, None, date, oral, status, mark100, completion, mark_band(mark5, mark100, min100))
+
+    def codes(self, dimension: str) -> array:
+        return {"subject": self.subject, "region": self.region, "date": self.date, "oral": self.oral}[dimension]
+
+    def label(self, dimension: str, code: int) -> str:
+        if dimension == "subject":
+            return self.subjects.values[code]
+        if dimension == "date":
+            return self.dates.values[code]
+        if dimension == "oral":
+            return "устный" if code else "письменный"
+        if code < 0:
+            return "—"
+        from .regions import regions
+        return regions.get(code, str(code))
+
+class GroupStats:
+    '''
+    Statistics of one group: exams in it, exams with results, passed ones,
+    mean and QUANTILES of the 100-point mark, exams per mark band.
+    '''
+
+    __slots__ = ("key", "exams", "results", "passed", "mean", "quantiles", "bands")
+
+    def __init__(self, key: tuple, exams: int, results: int, passed: int,
+                 mean: float | None, quantiles: list[float | None], bands: list[int]):
+        self.key = key
+        self.exams = exams
+        self.results = results
+        self.passed = passed
+        self.mean = mean
+        self.quantiles = quantiles
+        self.bands = bands
+
+    @property
+    def pass_rate(self) -> float | None:
+        return self.passed / self.results if self.results else None
+
+def interpolate(values: list[float], q: float) -> float | None:
+    # linear between the closest ranks, as numpy.quantile by default
+    if not values:
+        return None
+    position = (len(values) - 1) * q
+    low = math.floor(position)
+    high = math.ceil(position)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+def aggregate_python(columns: ResultColumns, by: tuple[str, ...]) -> list[tuple]:
+    keys = list(zip(*(columns.codes(dimension) for dimension in by)))
+    groups: dict[tuple, list] = {}
+    for key, mark, passed, band in zip(keys, columns.mark100, columns.passed, columns.band):
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = [0, 0, 0, [], [0] * len(BANDS)]
+        group[0] += 1
+        if passed >= 0:
+            group[1] += 1
+            group[2] += passed
+        if mark == mark:  # NaN without a mark
+            group[3].append(mark)
+        if band >= 0:
+            group[4][band] += 1
+
+    rows = []
+    for key, (exams, results, passed, marks, bands) in groups.items():
+        marks.sort()
+        mean = math.fsum(marks) / len(marks) if marks else None
+        rows.append((key, exams, results, passed, mean, [interpolate(marks, q) for q in QUANTILES], bands))
+    return rows
+
+def aggregate_numpy(np, columns: ResultColumns, by: tuple[str, ...]) -> list[tuple]:
+    count = len(columns)
+    codes = [np.frombuffer(columns.codes(dimension), dtype=columns.codes(dimension).typecode).astype(np.int64)
+             for dimension in by]
+    # one integer key per row, dimensions as digits of a mixed radix number
+    keys = np.zeros(count, dtype=np.int64)
+    for column in codes:
+        keys = keys * (int(column.max()) + 2) + column + 1
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    groups = len(first)
+
+    passed = np.frombuffer(columns.passed, dtype="b")
+    exams = np.bincount(inverse, minlength=groups)
+    results = np.bincount(inverse, weights=passed >= 0, minlength=groups)
+    passes = np.bincount(inverse, weights=passed == 1, minlength=groups)
+
+    marks = np.frombuffer(columns.mark100, dtype="d")
+    known = ~np.isnan(marks)
+    group_of_mark = inverse[known]
+    marks = marks[known]
+    marked = np.bincount(group_of_mark, minlength=groups)
+    sums = np.bincount(group_of_mark, weights=marks, minlength=groups)
+    # marks sorted within groups, groups one after another
+    marks = marks[np.lexsort((marks, group_of_mark))]
+    starts = np.cumsum(marked) - marked
+    quantiles = []
+    for q in QUANTILES:
+        position = starts + (np.maximum(marked, 1) - 1) * q
+        low = np.floor(position).astype(np.int64)
+        high = np.ceil(position).astype(np.int64)
+        if len(marks):
+            low = np.minimum(low, len(marks) - 1)
+            high = np.minimum(high, len(marks) - 1)
+            quantiles.append(marks[low] + (marks[high] - marks[low]) * (position - low))
+        else:
+            quantiles.append(np.zeros(groups))
+
+    band = np.frombuffer(columns.band, dtype="b")
+    banded = band >= 0
+    bands = np.bincount(inverse[banded] * len(BANDS) + band[banded],
+                        minlength=groups * len(BANDS)).reshape(groups, len(BANDS))
+
+    rows = []
+    for group in range(groups):
+        key = tuple(int(column[first[group]]) for column in codes)
+        has_marks = marked[group] > 0
+        rows.append((key, int(exams[group]), int(results[group]), int(passes[group]),
+                     float(sums[group] / marked[group]) if has_marks else None,
+                     [float(values[group]) if has_marks else None for values in quantiles],
+                     [int(value) for value in bands[group]]))
+    return rows
+
+def aggregate(columns: ResultColumns, by: tuple[str, ...] = ("subject",), numpy=None) -> list[GroupStats]:
+    '''
+    Statistics of the results grouped by `by` (some of DIMENSIONS), in one
+    vectorized pass with numpy when it's installed (or given as `numpy`).
+    Groups are sorted by their labels.
+    '''
+    if not len(columns):
+        return []
+
+    np = numpy or load_numpy()
+    rows = aggregate_numpy(np, columns, by) if np else aggregate_python(columns, by)
+    groups = [GroupStats(tuple(columns.label(dimension, code) for dimension, code in zip(by, key)), *values)
+              for key, *values in rows]
+    groups.sort(key=lambda group: tuple(sorted_label(dimension, label) for dimension, label in zip(by, group.key)))
+    return groups
+
+def sorted_label(dimension: str, label: str):
+    # written parts go before oral ones
+    return (label != "письменный") if dimension == "oral" else label
+
+def status_counts(columns: ResultColumns) -> list[tuple[int, int]]:
+    '''
+    Number of exams per status code, the most common first.
+    '''
+    return Counter(columns.status).most_common()
+
+def status_name(status: int) -> str:
+    return STATUS_NAMES.get(status, "Неизвестно" if status < 0 else str(status))
+
+def format_number(value: float | None, digits: int = 1) -> str:
+    return "—" if value is None else f"{value:.{digits}f}"
+
+def summary_rows(groups: list[GroupStats], by: tuple[str, ...]) -> list[list[Cell]]:
+    header = [(DIMENSION_TITLES[dimension], GRAY) for dimension in by]
+    header += [("Экзаменов", GRAY), ("С результатом", GRAY), ("Сдали", GRAY), ("Средний", GRAY)]
+    header += [(f"p{round(q * 100)}", GRAY) for q in QUANTILES]
+    header += [(title, color) for title, color in zip(BAND_TITLES, BAND_COLORS)]
+
+    rows = [header]
+    for group in groups:
+        row = [(label, ITALIC if dimension == "subject" else "") for dimension, label in zip(by, group.key)]
+        rate = group.pass_rate
+        row += [
+            (str(group.exams), ""),
+            (str(group.results), ""),
+            ("—" if rate is None else f"{rate:.0%}", COLOR_SYSTEM if rate is None else
+             COLOR_GREAT if rate == 1 else COLOR_BAD if rate < 0.5 else COLOR_ACCEPTABLE),
+            (format_number(group.mean), ""),
+        ]
+        row += [(format_number(value), "") for value in group.quantiles]
+        row += [(str(count), color if count else GRAY) for count, color in zip(group.bands, BAND_COLORS)]
+        rows.append(row)
+    return rows
+
+def status_rows(counts: list[tuple[int, int]]) -> list[list[Cell]]:
+    rows = [[("Статус", GRAY), ("Код", GRAY), ("Экзаменов", GRAY)]]
+    for status, count in counts:
+        rows.append([(status_name(status), STATUS_COLORS.get(status, COLOR_SYSTEM)), (str(status), GRAY), (str(count), "")])
+    return rows
+
+def summary_format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in SUMMARY_FORMATS:
+        raise ValueError(f"Unknown summary format \"{ext}\", use one of: {', '.join(SUMMARY_FORMATS)}")
+    return ext
+
+def group_record(group: GroupStats, by: tuple[str, ...]) -> dict:
+    record = dict(zip(by, group.key))
+    record.update(exams=group.exams, results=group.results, passed=group.passed,
+                  pass_rate=group.pass_rate, mean=group.mean)
+    record.update({f"p{round(q * 100)}": value for q, value in zip(QUANTILES, group.quantiles)})
+    record.update(zip(BANDS, group.bands))
+    return record
+
+def write_summary(path: str, groups: list[GroupStats], counts: list[tuple[int, int]], by: tuple[str, ...]):
+    '''
+    Save the summary to a file: .json with groups and statuses, or
+    .csv with groups only.
+    '''
+    ext = summary_format(path)
+    records = [group_record(group, by) for group in groups]
+    if ext == ".json":
+        data = {
+            "by": list(by),
+            "groups": records,
+            "statuses": [{"status": status, "name": status_name(status), "exams": count} for status, count in counts],
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+    else:
+        fields = list(by) + ["exams", "results", "passed", "pass_rate", "mean"] + \
+                 [f"p{round(q * 100)}" for q in QUANTILES] + list(BANDS)
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fields)
+            writer.writeheader()
+            writer.writerows(records)
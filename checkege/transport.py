@@ -0,0 +1,124 @@
+import time
+import aiohttp
+
+# Per-endpoint timeouts, "default" applies to everything else.
+# Results may take a while on release day, captcha and regions must be fast.
+DEFAULT_TIMEOUTS = {
+    "default": aiohttp.ClientTimeout(total=30, sock_connect=10, sock_read=20),
+    "region": aiohttp.ClientTimeout(total=15, sock_connect=10, sock_read=10),
+    "captcha": aiohttp.ClientTimeout(total=15, sock_connect=10, sock_read=10),
+    "participant/login": aiohttp.ClientTimeout(total=30, sock_connect=10, sock_read=25),
+    "exam": aiohttp.ClientTimeout(total=45, sock_connect=10, sock_read=40),
+}
+
+class ConnectionStats:
+    '''
+    Cheap connection reuse counters collected through aiohttp tracing.
+    '''
+
+    def __init__(self):
+        self.requests = 0
+        self.created = 0
+        self.reused = 0
+        self.connect_time = 0.0
+        self.dns_hits = 0
+        self.dns_misses = 0
+
+    @property
+    def reuse_ratio(self) -> float:
+        total = self.created + self.reused
+        return self.reused / total if total else 0.0
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+
+        async def on_request_end(session, ctx, params):
+            self.requests += 1
+
+        async def on_create_start(session, ctx, params):
+            ctx.connect_start = time.perf_counter()
+
+        async def on_create_end(session, ctx, params):
+            self.created += 1
+            self.connect_time += time.perf_counter() - ctx.connect_start
+
+        async def on_reuse(session, ctx, params):
+            self.reused += 1
+
+        async def on_dns_hit(session, ctx, params):
+            self.dns_hits += 1
+
+        async def on_dns_miss(session, ctx, params):
+            self.dns_misses += 1
+
+        trace.on_request_end.append(on_request_end)
+        trace.on_connection_create_start.append(on_create_start)
+        trace.on_connection_create_end.append(on_create_end)
+        trace.on_connection_reuseconn.append(on_reuse)
+        trace.on_dns_cache_hit.append(on_dns_hit)
+        trace.on_dns_cache_miss.append(on_dns_miss)
+        return trace
+
+    def __str__(self):
+        return (f"{self.requests} requests, {self.created} connections opened "
+                f"({self.connect_time * 1000:.0f} ms), {self.reused} reused")
+
+class TransportConfig:
+    '''
+    Connection settings of the portal client.
+    `limit_per_host` bounds the pool of connections to the portal,
+    idle connections are kept alive for `keepalive` seconds and resolved
+    addresses are cached for `dns_ttl` seconds, so a batch sweep pays
+    for DNS and TLS handshakes only a few times.
+    '''
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 8, keepalive: float = 30,
+                 dns_ttl: int = 300, timeouts: dict[str, aiohttp.ClientTimeout] | None = None,
+                 auto_decompress: bool = True, accept_encoding: str | None = None):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive = keepalive
+        self.dns_ttl = dns_ttl
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        self.auto_decompress = auto_decompress
+        # None keeps aiohttp's default (gzip, deflate and br when available)
+        self.accept_encoding = accept_encoding
+
+    def timeout(self, endpoint: str) -> aiohttp.ClientTimeout:
+        endpoint = endpoint.split("?", 1)[0].strip("/")
+        return self.timeouts.get(endpoint, self.timeouts["default"])
+
+    def connector(self) -> aiohttp.TCPConnector:
+        return aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive,
+            ttl_dns_cache=self.dns_ttl,
+            use_dns_cache=True,
+        )
+
+    def session(self, base_url: str, cookie_jar: aiohttp.abc.AbstractCookieJar,
+                connector: aiohttp.BaseConnector | None = None,
+                traces: list[aiohttp.TraceConfig] | None = None) -> aiohttp.ClientSession:
+        '''
+        Create a client session. A passed `connector` is shared and not
+        closed with the session.
+        '''
+        headers = {"Accept-Encoding": self.accept_encoding} if self.accept_encoding else None
+        return aiohttp.ClientSession(
+            base_url,
+            cookie_jar=cookie_jar,
+            connector=connector or self.connector(),
+            connector_owner=connector is None,
+            timeout=self.timeouts["default"],
+            auto_decompress=self.auto_decompress,
+            headers=headers,
+            trace_configs=traces or None,
+        )
+
+    def shared_session(self, base_url: str, traces: list[aiohttp.TraceConfig] | None = None) -> aiohttp.ClientSession:
+        '''
+        Create a session to be shared by many clients. It keeps no cookies,
+        every client sends and stores its own.
+        '''
+        return self.session(base_url, aiohttp.DummyCookieJar(), traces=traces)
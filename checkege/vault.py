@@ -0,0 +1,241 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import sqlite3
+import threading
+import time
+from .batch import RosterEntry
+
+VERIFIER = b"checkege-vault"
+
+# scrypt parameters of new vaults, ~100 ms and 32 MB to derive
+KDF_PARAMS = {"n": 2 ** 15, "r": 8, "p": 1}
+
+def profile_json(entry: RosterEntry) -> bytes:
+    return json.dumps({
+        "name": entry.name,
+        "surname": entry.surname,
+        "patronymic": entry.patronymic,
+        "passnum": entry.passnum,
+        "region": entry.region,
+    }, ensure_ascii=False).encode("utf-8")
+
+def decrypt_profile(fernet, token: bytes) -> RosterEntry:
+    return RosterEntry(**json.loads(fernet.decrypt(token)))
+
+def name_key(name: str) -> str:
+    return " ".join(name.casefold().replace("ё", "е").split())
+
+class VaultEntry:
+    '''
+    Roster entry decrypted only when it is first used.
+    '''
+
+    def __init__(self, vault: "Vault", profile_id: str, token: bytes):
+        self.vault = vault
+        self.profile_id = profile_id
+        self.token = token
+        self.__entry = None
+
+    @property
+    def entry(self) -> RosterEntry:
+        if self.__entry is None:
+            self.__entry = self.vault.decrypt(self.token)
+        return self.__entry
+
+    @property
+    def display_name(self) -> str:
+        return self.entry.display_name
+
+    def login_data(self):
+        return self.entry.login_data()
+
+class Vault:
+    '''
+    Encrypted storage of many participant profiles.
+    The master key is derived from a password with scrypt once per
+    session; every profile is a separate Fernet token, so any one of them
+    can be decrypted without touching the rest. Profiles are indexed by
+    keyed hashes of the participant and of the name, which reveal
+    nothing without the password.
+    '''
+
+    def __init__(self, path: str | None = None):
+        self.path = path or self.default_path()
+        self.fernet = None
+        self.index_key = None
+        # Fernet key of the profiles, for worker processes to decrypt them
+        self.profile_key = None
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.executescript(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS profiles ("
+            "  id TEXT PRIMARY KEY, name TEXT NOT NULL, token BLOB NOT NULL, updated REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS profiles_name ON profiles (name);"
+        )
+        self.db.commit()
+
+    @staticmethod
+    def default_path():
+        '''
+        Returns the path to the vault database.
+        '''
+        if os.getenv("CHECKEGE_VAULT"):
+            return os.getenv("CHECKEGE_VAULT")
+
+        path = "vault.db"
+        if os.name == "nt":
+            path = os.path.join(os.getenv("APPDATA"), "checkege", "vault.db")
+        elif os.name == "posix":
+            path = os.path.join(os.getenv("HOME"), ".checkege", "vault.db")
+
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        return path
+
+    def __meta(self, key: str) -> str | None:
+        with self.lock:
+            row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    @property
+    def exists(self) -> bool:
+        '''
+        Whether the vault has been created (its password is set).
+        '''
+        return self.__meta("kdf") is not None
+
+    @property
+    def is_unlocked(self) -> bool:
+        return self.fernet is not None
+
+    def __unlock(self, password: str):
+        from cryptography.fernet import Fernet, InvalidToken
+        from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+
+        kdf = self.__meta("kdf")
+        if kdf is None:
+            params = dict(KDF_PARAMS, salt=base64.b64encode(os.urandom(16)).decode())
+        else:
+            params = json.loads(kdf)
+
+        key = Scrypt(salt=base64.b64decode(params["salt"]), length=64,
+                     n=params["n"], r=params["r"], p=params["p"]).derive(password.encode("utf-8"))
+        profile_key = base64.urlsafe_b64encode(key[:32])
+        fernet = Fernet(profile_key)
+
+        if kdf is None:
+            with self.lock, self.db:
+                self.db.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [
+                    ("kdf", json.dumps(params)),
+                    ("verifier", fernet.encrypt(VERIFIER).decode()),
+                ])
+        else:
+            try:
+                fernet.decrypt(self.__meta("verifier"))
+            except InvalidToken:
+                raise ValueError("Wrong vault password") from None
+
+        self.fernet = fernet
+        self.profile_key = profile_key
+        self.index_key = key[32:]
+
+    async def unlock(self, password: str):
+        '''
+        Derive the master key, creating the vault on first use.
+        Raises ValueError if the password is wrong.
+        '''
+        await asyncio.to_thread(self.__unlock, password)
+
+    def __hash(self, value: str) -> str:
+        if self.index_key is None:
+            raise ValueError("Vault is locked")
+        return hmac.new(self.index_key, value.encode("utf-8"), hashlib.sha256).hexdigest()
+
+    def decrypt(self, token: bytes) -> RosterEntry:
+        if self.fernet is None:
+            raise ValueError("Vault is locked")
+        return decrypt_profile(self.fernet, token)
+
+    def __put(self, entries: list[RosterEntry]):
+        now = time.time()
+        rows = [(
+            self.__hash(entry.login_data().participant_key()),
+            self.__hash(name_key(entry.display_name)),
+            self.fernet.encrypt(profile_json(entry)),
+            now,
+        ) for entry in entries]
+        with self.lock, self.db:
+            self.db.executemany("INSERT OR REPLACE INTO profiles (id, name, token, updated) VALUES (?, ?, ?, ?)", rows)
+
+    async def put(self, entry: RosterEntry):
+        await asyncio.to_thread(self.__put, [entry])
+
+    async def import_entries(self, entries: list[RosterEntry]) -> int:
+        '''
+        Add or update many profiles in one transaction.
+        '''
+        await asyncio.to_thread(self.__put, entries)
+        return len(entries)
+
+    def __select(self, query: str, params: tuple = ()) -> list[VaultEntry]:
+        with self.lock:
+            rows = self.db.execute(query, params).fetchall()
+        return [VaultEntry(self, profile_id, token) for profile_id, token in rows]
+
+    async def entries(self) -> list[VaultEntry]:
+        '''
+        All profiles, decrypted lazily one by one.
+        '''
+        if not self.is_unlocked:
+            raise ValueError("Vault is locked")
+        return await asyncio.to_thread(self.__select, "SELECT id, token FROM profiles ORDER BY rowid")
+
+    async def find(self, name: str) -> list[VaultEntry]:
+        '''
+        Profiles with the given full name ("surname name patronymic").
+        '''
+        return await asyncio.to_thread(self.__select, "SELECT id, token FROM profiles WHERE name = ?",
+                                       (self.__hash(name_key(name)),))
+
+    def __export(self) -> list[RosterEntry]:
+        with self.lock:
+            tokens = [token for (token,) in self.db.execute("SELECT token FROM profiles ORDER BY rowid")]
+        return [self.decrypt(token) for token in tokens]
+
+    async def export_entries(self) -> list[RosterEntry]:
+        '''
+        All profiles, decrypted at once in a worker thread.
+        '''
+        if not self.is_unlocked:
+            raise ValueError("Vault is locked")
+        return await asyncio.to_thread(self.__export)
+
+    async def delete(self, entry: RosterEntry):
+        profile_id = self.__hash(entry.login_data().participant_key())
+        def delete():
+            with self.lock, self.db:
+                self.db.execute("DELETE FROM profiles WHERE id = ?", (profile_id,))
+        await asyncio.to_thread(delete)
+
+    def count(self) -> int:
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+
+    def fingerprint(self) -> str:
+        '''
+        Digest of the profiles in the order of `entries()`, changes
+        whenever any of them is added, updated or removed.
+        '''
+        digest = hashlib.sha256()
+        with self.lock:
+            for profile_id, updated in self.db.execute("SELECT id, updated FROM profiles ORDER BY rowid"):
+                digest.update(f"{profile_id}:{updated!r}\n".encode())
+        return digest.hexdigest()
+
+    def close(self):
+        self.db.close()
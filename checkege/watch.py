@@ -0,0 +1,89 @@
+import asyncio
+import inspect
+import random
+from typing import Awaitable, Callable
+from .client import CheckegeClient
+from .errors import SessionExpiredError
+from .exams_model import ExamStatus
+
+def snapshot(exams: list[ExamStatus]) -> dict[tuple, tuple]:
+    '''
+    Returns the part of results that is worth reporting:
+    status and marks of every exam.
+    '''
+
+    result = {}
+    for exam in exams:
+        mark = exam.mark
+        marks = (mark.mark5, mark.mark100, mark.min100) if mark else None
+        result[(exam.id, exam.is_oral)] = (exam.int_status, marks)
+    return result
+
+class Watcher:
+    '''
+    Polls results over one open session and reports only changes.
+    With `refresh`, it is called to login again shortly before the
+    session expires (within two poll intervals by default); if it fails,
+    watching stops with SessionExpiredError.
+    '''
+
+    def __init__(self, client: CheckegeClient, interval: float = 60, jitter: float = 0.1,
+                 refresh: Callable[[], Awaitable[bool]] | None = None, refresh_margin: float | None = None):
+        self.client = client
+        self.interval = interval
+        self.jitter = jitter
+        self.refresh = refresh
+        self.refresh_margin = refresh_margin if refresh_margin is not None else 2 * interval
+        self.last = None
+        self.last_exams: dict[tuple, ExamStatus] = {}
+
+    def delay(self) -> float:
+        '''
+        Poll interval with random jitter, so many watchers don't hit the portal at once.
+        '''
+        return self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    async def poll(self) -> tuple[list[ExamStatus], set[tuple], list[ExamStatus]] | None:
+        '''
+        Returns results, keys of changed exams and exams no longer listed,
+        or None if nothing has changed since the previous poll.
+        '''
+
+        exams = await self.client.poll_results()
+        if exams is None:
+            return None
+
+        current = snapshot(exams)
+        if current == self.last:
+            return None
+
+        previous, self.last = self.last or {}, current
+        changed = {key for key, value in current.items() if previous.get(key) != value}
+        removed = [exam for key, exam in self.last_exams.items() if key not in current]
+        self.last_exams = {(exam.id, exam.is_oral): exam for exam in exams}
+        return exams, changed, removed
+
+    async def watch(self, on_change: Callable[[list[ExamStatus], set[tuple], list[ExamStatus]], Awaitable[None] | None],
+                    on_error: Callable[[Exception], bool] | None = None):
+        '''
+        Poll forever, calling `on_change` with results, changed exam keys
+        and removed exams. `on_error` decides whether to keep polling after
+        a failed poll.
+        '''
+
+        while True:
+            if self.refresh and self.client.needs_refresh(self.refresh_margin):
+                if not await self.refresh():
+                    raise SessionExpiredError("Failed to login again before the session expired")
+
+            try:
+                update = await self.poll()
+                if update:
+                    ret = on_change(*update)
+                    if inspect.isawaitable(ret):
+                        await ret
+            except Exception as e:
+                if on_error is None or not on_error(e):
+                    raise
+
+            await asyncio.sleep(self.delay())
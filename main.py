@@ -3,13 +3,14 @@
 import checkege.cli as c
 import asyncio
 
-async def main():
+async def main() -> int:
     cli = c.Cli()
-    await cli.run()
+    return await cli.run()
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        code = asyncio.run(main())
     except KeyboardInterrupt:
         print(f"\n{c.RESET_COLOR}{c.GRAY}{c.ITALIC}Прерывание пользователем.{c.RESET_COLOR}")
-        exit(0)    
+        c.prompt.exit_process(c.EXIT_INTERRUPTED)
+    c.prompt.exit_process(code)
@@ -0,0 +1,15 @@
+import asyncio
+import pytest
+from checkege import vault as vault_module
+from checkege.batch import RosterEntry
+
+@pytest.fixture
+def fast_vault(tmp_path, monkeypatch):
+    monkeypatch.setitem(vault_module.KDF_PARAMS, "n", 2 ** 4)
+    v = vault_module.Vault(str(tmp_path / "vault.db"))
+    asyncio.run(v.unlock("password"))
+    yield v
+    v.close()
+
+def roster(*passnums: str) -> list[RosterEntry]:
+    return [RosterEntry("Иван", "Иванов", "Иванович", passnum, 77) for passnum in passnums]
@@ -0,0 +1,40 @@
+import asyncio
+import os
+import sys
+import pytest
+from checkege.batch import BatchRunner, RosterEntry
+from checkege.client import CheckegeClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+from mock_server import MockPortal
+
+def test_failed_roster_read_stops_the_workers(monkeypatch):
+    portal = MockPortal(captchas=4, seed=1)
+    failed = False
+    late = []
+
+    async def generate():
+        for i in range(4):
+            yield RosterEntry("Иван", "Иванов", "Иванович", f"{i:06d}", "77")
+        # the workers are busy with the entries read so far
+        await asyncio.sleep(0.05)
+        raise ValueError("broken roster")
+
+    async def solve(image: bytes) -> str | None:
+        await asyncio.sleep(0.2)
+        late.append(failed)
+        return portal.code_of(image)
+
+    async def run():
+        nonlocal failed
+        monkeypatch.setattr(CheckegeClient, "BASE_URL", await portal.start())
+        try:
+            with pytest.raises(ValueError):
+                await BatchRunner(solve, concurrency=4).run(generate())
+            failed = True
+            # nothing goes on with the closed session
+            await asyncio.sleep(0.3)
+        finally:
+            await portal.runner.cleanup()
+    asyncio.run(run())
+    assert late == []
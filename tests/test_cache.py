@@ -0,0 +1,127 @@
+import asyncio
+import pytest
+from checkege import cache as cache_module
+from checkege.cache import DiskCache, ResponseCache
+
+class Clock:
+    '''
+    Stands in for time.time() of the cache module.
+    '''
+
+    def __init__(self, monkeypatch):
+        self.now = 1000.0
+        monkeypatch.setattr(cache_module.time, "time", lambda: self.now)
+
+class Portal:
+    '''
+    Returns numbered bodies, or fails when `down`.
+    '''
+
+    def __init__(self):
+        self.calls = 0
+        self.down = False
+
+    async def fetch(self) -> bytes:
+        await asyncio.sleep(0.01)
+        if self.down:
+            raise ConnectionError("down")
+        self.calls += 1
+        return f"body {self.calls}".encode()
+
+def test_fresh_and_stale_responses(monkeypatch):
+    clock = Clock(monkeypatch)
+    portal = Portal()
+    cache = ResponseCache(ttls={"exam": 30}, stale={"exam": 60})
+
+    async def run():
+        get = lambda: cache.get("key", "exam", portal.fetch)
+        assert await get() == b"body 1"
+        clock.now += 10
+        assert await get() == b"body 1"
+        assert portal.calls == 1
+
+        # stale: served at once by every request, revalidated only once
+        clock.now += 30
+        assert await asyncio.gather(get(), get(), get()) == [b"body 1"] * 3
+        assert portal.calls == 1
+        await asyncio.gather(*cache.revalidating.values())
+        assert portal.calls == 2
+        assert await get() == b"body 2"
+
+        # too old to be served
+        clock.now += 100
+        assert await get() == b"body 3"
+        await cache.close()
+    asyncio.run(run())
+    assert (cache.hits, cache.stale_hits, cache.misses) == (2, 3, 2)
+
+def test_failed_revalidation_keeps_the_stale_response(monkeypatch):
+    clock = Clock(monkeypatch)
+    portal = Portal()
+    cache = ResponseCache(ttls={"exam": 30}, stale={"exam": 60})
+
+    async def run():
+        await cache.get("key", "exam", portal.fetch)
+        clock.now += 40
+        portal.down = True
+        assert await cache.get("key", "exam", portal.fetch) == b"body 1"
+        await asyncio.gather(*cache.revalidating.values())
+        assert not cache.revalidating
+        assert await cache.get("key", "exam", portal.fetch) == b"body 1"
+
+        # past the stale window the failure is seen
+        clock.now += 60
+        with pytest.raises(ConnectionError):
+            await cache.get("key", "exam", portal.fetch)
+        await cache.close()
+    asyncio.run(run())
+
+def test_bypass_and_uncached_endpoints():
+    portal = Portal()
+    cache = ResponseCache(ttls={"exam": 30})
+
+    async def run():
+        await cache.get("key", "exam", portal.fetch)
+        assert await cache.get("key", "exam", portal.fetch, bypass=True) == b"body 2"
+        assert await cache.get("key", "exam", portal.fetch) == b"body 2"
+        assert await cache.get("other", "captcha", portal.fetch) == b"body 3"
+        assert await cache.get("other", "captcha", portal.fetch) == b"body 4"
+        cache.invalidate("key", "exam")
+        assert await cache.get("key", "exam", portal.fetch) == b"body 5"
+    asyncio.run(run())
+
+def test_memory_is_bounded():
+    cache = ResponseCache(max_entries=2, max_bytes=10, ttls={"exam": 30})
+
+    async def run():
+        await cache.put("a", "exam", b"aaaa")
+        await cache.put("b", "exam", b"bbbb")
+        # "a" is used, so "b" is the least recently used
+        await cache.get("a", "exam", Portal().fetch)
+        await cache.put("c", "exam", b"cccc")
+        assert list(cache.entries) == ["a", "c"]
+        await cache.put("d", "exam", b"dddddd")
+        assert list(cache.entries) == ["c", "d"] and cache.size == 10
+        await cache.put("f", "exam", b"f")
+        assert list(cache.entries) == ["d", "f"]
+        # larger than the whole cache, not kept at all
+        await cache.put("e", "exam", b"e" * 11)
+        assert "e" not in cache.entries
+    asyncio.run(run())
+
+def test_disk_tier(tmp_path):
+    path = str(tmp_path / "cache.db")
+    portal = Portal()
+
+    async def run():
+        cache = ResponseCache(ttls={"exam": 30, "region": 30}, disk=DiskCache(path), disk_endpoints=("region",))
+        await cache.get("regions", "region", portal.fetch)
+        await cache.get("results", "exam", portal.fetch)
+        await cache.close()
+
+        # a new cache (e.g. the next run) finds only what went to disk
+        cache = ResponseCache(ttls={"exam": 30, "region": 30}, disk=DiskCache(path), disk_endpoints=("region",))
+        assert await cache.get("regions", "region", portal.fetch) == b"body 1"
+        assert await cache.get("results", "exam", portal.fetch) == b"body 3"
+        await cache.close()
+    asyncio.run(run())
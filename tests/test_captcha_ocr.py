@@ -0,0 +1,80 @@
+import asyncio
+import os
+import sys
+import pytest
+from checkege.batch import BatchRunner, RosterEntry
+from checkege.captcha_ocr import CaptchaRecognizer, RecognizingSolver
+from checkege.client import CheckegeClient
+from checkege.solvers import CaptchaSolver
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+from mock_server import MockPortal
+
+class Fallback(CaptchaSolver):
+    interactive = False
+
+    def __init__(self, solve):
+        super().__init__()
+        self.solve_blocking = solve
+
+def solver(tmp_path, solve) -> RecognizingSolver:
+    # an untrained recognizer passes every captcha to the fallback
+    return RecognizingSolver(Fallback(solve), CaptchaRecognizer(), corpus=str(tmp_path / "corpus"))
+
+def samples(tmp_path) -> list[str]:
+    corpus = tmp_path / "corpus"
+    return sorted(name.split("_")[0] for name in os.listdir(corpus)) if corpus.exists() else []
+
+def test_sample_is_saved_only_when_accepted(tmp_path):
+    s = solver(tmp_path, lambda image: "123456")
+
+    async def run():
+        assert await s.solve(b"accepted") == "123456"
+        assert await s.solve(b"rejected") == "123456"
+        assert samples(tmp_path) == []
+
+        await s.report(b"rejected", False)
+        await s.report(b"accepted", True)
+        # a verdict for a captcha the fallback didn't solve saves nothing
+        await s.report(b"unknown", True)
+    asyncio.run(run())
+
+    assert samples(tmp_path) == ["123456"]
+    assert s.unconfirmed == {}
+
+def test_unconfirmed_samples_are_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr("checkege.captcha_ocr.UNCONFIRMED_SAMPLES", 2)
+    s = solver(tmp_path, lambda image: "123456")
+
+    async def run():
+        for image in (b"1", b"2", b"3"):
+            await s.solve(image)
+        await s.report(b"1", True)
+    asyncio.run(run())
+
+    assert list(s.unconfirmed) == [b"2", b"3"]
+    assert samples(tmp_path) == []
+
+@pytest.fixture
+def portal(monkeypatch):
+    portal = MockPortal(captchas=4, seed=1)
+    monkeypatch.setattr(CheckegeClient, "BASE_URL", None)
+    return portal
+
+@pytest.mark.parametrize("right", [True, False])
+def test_batch_reports_login_outcome(tmp_path, portal, right):
+    s = solver(tmp_path, lambda image: portal.code_of(image) if right else "000000")
+    entries = [RosterEntry("Иван", "Иванов", "Иванович", f"00000{i}", "77") for i in range(3)]
+
+    async def run():
+        CheckegeClient.BASE_URL = await portal.start()
+        try:
+            runner = BatchRunner(s.solve, concurrency=2, report_captcha=s.report)
+            return await runner.run(entries)
+        finally:
+            await portal.runner.cleanup()
+    results = asyncio.run(run())
+
+    assert all(result.ok == right for result in results)
+    assert len(samples(tmp_path)) == (3 if right else 0)
+    assert s.unconfirmed == {}
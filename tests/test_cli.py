@@ -0,0 +1,49 @@
+import asyncio
+import gc
+import pytest
+from checkege import cli
+from checkege.errors import PortalUnavailableError
+
+class Client:
+    '''
+    Fails to load the captcha, or takes forever to, and remembers if the
+    captcha task was over when the session closed.
+    '''
+
+    def __init__(self, fails: bool):
+        self.fails = fails
+        self.task = None
+        self.stopped_after_task = None
+
+    async def get_captcha(self):
+        if self.fails:
+            raise PortalUnavailableError("down")
+        await asyncio.sleep(10)
+
+    async def stop(self):
+        self.stopped_after_task = self.task.done()
+
+@pytest.mark.parametrize("fails", [True, False])
+def test_captcha_prefetch_is_finished_on_exit(fails):
+    app = cli.Cli()
+    app.client = client = Client(fails)
+    unhandled = []
+
+    async def run_safe():
+        app.prefetch_captcha()
+        client.task = app.captcha_task
+        # the login fails before the captcha is needed
+        await asyncio.sleep(0.01)
+        return cli.EXIT_ERROR
+    app._Cli__run_safe = run_safe
+
+    async def run():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: unhandled.append(context))
+        code = await app.run()
+        app.captcha_task = client.task = None
+        gc.collect()
+        return code
+
+    assert asyncio.run(run()) == cli.EXIT_ERROR
+    assert client.stopped_after_task
+    assert unhandled == []
@@ -0,0 +1,38 @@
+from checkege.exams_model import (ExamStatus, COLOR_ACCEPTABLE, COLOR_BAD, COLOR_GOOD, COLOR_GREAT,
+                                  COLOR_SYSTEM, SCOPE_BASIC_MATH, SCOPE_COMPOSITION)
+
+def row(**fields) -> dict:
+    return {"ExamId": 1, "ExamDate": "2025-06-02T00:00:00", "Subject": "Физика", "Status": None,
+            "HasResult": True, "Mark5": 4, "TestMark": 68, "MinMark": 41, **fields}
+
+def test_mark_is_parsed_once():
+    exam = ExamStatus(row())
+    assert (exam.id, exam.subject, exam.exam_type, exam.is_oral) == (1, "Физика", "письменный", False)
+    assert (exam.mark.mark100, exam.mark.min100, exam.mark.completion) == (68, 41, True)
+    assert exam.mark.color == COLOR_GOOD
+    assert str(exam.mark) == "прошел (68 / 41)"
+    assert (exam.display_status, exam.display_status_color) == ("Имеются результаты", COLOR_GREAT)
+    # the JSON is not kept
+    assert not hasattr(exam, "__dict__")
+
+def test_mark_bands():
+    assert ExamStatus(row(TestMark=40)).mark.color == COLOR_BAD
+    assert ExamStatus(row(TestMark=41)).mark.color == COLOR_ACCEPTABLE
+    assert ExamStatus(row(TestMark=75)).mark.color == COLOR_GREAT
+
+def test_special_scopes():
+    math = ExamStatus(row(IsBasicMath=True, Mark5=3, TestMark=None, MinMark=None))
+    assert math.mark.scope == SCOPE_BASIC_MATH
+    assert (math.mark.completion, math.mark.color, str(math.mark)) == (True, COLOR_ACCEPTABLE, "прошел (3 / 3)")
+
+    composition = ExamStatus(row(IsComposition=True, Mark5=2, TestMark=None, MinMark=None))
+    assert composition.mark.scope == SCOPE_COMPOSITION
+    assert (composition.mark.completion, composition.mark.color, str(composition.mark)) == (False, COLOR_BAD, "не прошел")
+
+def test_oral_part_and_status():
+    exam = ExamStatus(row(OralExamId=2, OralSubject="Английский язык (устный)", OralStatus=11,
+                          HasOralResult=False), is_oral=True)
+    assert (exam.id, exam.subject, exam.exam_type, exam.mark) == (2, "Английский язык (устный)", "устный", None)
+    assert (exam.display_status, exam.display_status_color) == ("Распечатаны бланки", COLOR_SYSTEM)
+
+    assert ExamStatus(row(HasResult=False, Status=999)).display_status == "999"
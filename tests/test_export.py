@@ -0,0 +1,59 @@
+import asyncio
+import pytest
+from checkege.exams_model import ExamStatus
+from checkege.export import FIELDS, open_sink, read_export
+
+EXAMS = [
+    ExamStatus({"ExamId": 1, "ExamDate": "2025-06-02T00:00:00", "Subject": "Физика", "Status": None,
+                "HasResult": True, "Mark5": 4, "TestMark": 68, "MinMark": 41}),
+    ExamStatus({"ExamId": 2, "ExamDate": "2025-06-05T00:00:00", "Subject": "Русский язык", "Status": 11,
+                "HasResult": False}),
+]
+
+EXPECTED = {
+    "participant": ["Иванов", "Иванов", "Петров, \"П.\"", "Петров, \"П.\""],
+    "exam_id": [1, 2, 1, 2],
+    "subject": ["Физика", "Русский язык"] * 2,
+    "date": ["2025-06-02T00:00:00", "2025-06-05T00:00:00"] * 2,
+    "status": [None, 11] * 2,
+    "mark5": [4, None] * 2,
+    "mark100": [68, None] * 2,
+    "min100": [41, None] * 2,
+    "completion": [True, None] * 2,
+    "is_oral": [False, False] * 2,
+}
+
+@pytest.mark.parametrize("ext", [".ccol", ".jsonl", ".csv"])
+def test_export_is_read_back(tmp_path, ext):
+    path = str(tmp_path / f"results{ext}")
+
+    async def write(participant: str, append: bool):
+        sink = open_sink(path, append=append)
+        # one row group per write
+        sink.chunk_size = 1
+        await sink.write(participant, EXAMS)
+        await sink.close()
+
+    asyncio.run(write("Иванов", False))
+    # a resumed run appends to the same file
+    asyncio.run(write("Петров, \"П.\"", True))
+    assert read_export(path) == EXPECTED
+
+def test_columnar_export_of_nothing(tmp_path):
+    path = str(tmp_path / "results.ccol")
+
+    async def write():
+        sink = open_sink(path)
+        await sink.write("Иванов", [])
+        await sink.close()
+    asyncio.run(write())
+    assert read_export(path) == {field: [] for field in FIELDS}
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        open_sink(str(tmp_path / "results.xlsx"))
+
+    path = tmp_path / "results.ccol"
+    path.write_bytes(b"not columnar")
+    with pytest.raises(ValueError):
+        read_export(str(path))
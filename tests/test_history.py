@@ -0,0 +1,65 @@
+import asyncio
+from checkege.exams_model import ExamStatus
+from checkege.history import ResultsHistory
+
+def exam(exam_id: int, subject: str, status: int = 11, mark: int | None = None) -> ExamStatus:
+    return ExamStatus({"ExamId": exam_id, "ExamDate": "2025-06-02T00:00:00", "Subject": subject, "Status": status,
+                       "HasResult": mark is not None, "Mark5": 4, "TestMark": mark, "MinMark": 36})
+
+def checks(tmp_path, *snapshots: list[ExamStatus]):
+    '''
+    Records the snapshots one by one, returns the changes of every check
+    and what the history knows after the last one.
+    '''
+    history = ResultsHistory(str(tmp_path / "history.db"))
+
+    async def run():
+        recorded = [await history.record("participant", exams) for exams in snapshots]
+        return recorded, await history.latest("participant"), await history.changes("participant")
+    try:
+        return asyncio.run(run())
+    finally:
+        history.close()
+
+def test_only_changes_are_recorded(tmp_path):
+    math, physics = exam(1, "Математика"), exam(2, "Физика")
+    recorded, (_, latest), last = checks(tmp_path, [math, physics], [math, physics],
+                                         [math, exam(2, "Физика", 100, 80)])
+
+    assert [[change.exam.id for change in changes] for changes in recorded] == [[1, 2], [], [2]]
+    assert all(change.is_new for change in recorded[0])
+    change = recorded[2][0]
+    assert change.previous.int_status == 11 and change.previous.mark is None
+    assert change.exam.mark.mark100 == 80
+    assert [(exam.id, exam.int_status) for exam in latest] == [(1, 11), (2, 100)]
+    assert [(change.exam.id, change.previous.int_status) for change in last] == [(2, 11)]
+
+def test_removed_exams(tmp_path):
+    math, physics = exam(1, "Математика"), exam(2, "Физика")
+    recorded, (_, latest), last = checks(tmp_path, [math, physics], [math], [math, physics])
+
+    assert recorded[1] == []
+    # listed again after being removed, the exam is new
+    assert [(change.exam.id, change.is_new) for change in recorded[2]] == [(2, True)]
+    assert [(change.exam.id, change.is_new) for change in last] == [(2, True)]
+    assert [exam.id for exam in latest] == [1, 2]
+
+def test_removed_exams_are_not_latest(tmp_path):
+    _, (_, latest), last = checks(tmp_path, [exam(1, "Математика"), exam(2, "Физика")], [exam(1, "Математика")])
+    assert [exam.id for exam in latest] == [1]
+    assert last == []
+
+def test_timeline(tmp_path):
+    history = ResultsHistory(str(tmp_path / "history.db"))
+
+    async def run():
+        for exams in ([exam(1, "Физика")], [exam(1, "Физика", 20)], [exam(1, "Физика", 20)], [exam(1, "Физика", 100, 70)]):
+            await history.record("participant", exams)
+        return await history.timeline("participant", 1), await history.latest("nobody")
+    try:
+        timeline, nobody = asyncio.run(run())
+    finally:
+        history.close()
+    assert [state.int_status for _, state in timeline] == [11, 20, 100]
+    assert timeline[-1][1].mark.mark100 == 70
+    assert nobody is None
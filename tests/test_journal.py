@@ -0,0 +1,124 @@
+import asyncio
+import json
+import os
+from checkege.journal import BatchJournal
+
+SOURCE = "/roster.csv\0100\0123"
+
+class Durable:
+    def __init__(self):
+        self.flushed = 0
+
+    async def flush(self):
+        self.flushed += 1
+
+def journal(path, source: str = SOURCE, **kwargs) -> BatchJournal:
+    return BatchJournal(source, path=str(path), **kwargs)
+
+def record(j: BatchJournal, *results: tuple[int, bool]):
+    async def run():
+        for index, ok in results:
+            await j.record(index, ok)
+    asyncio.run(run())
+
+def close(j: BatchJournal, complete: bool = False):
+    asyncio.run(j.close(complete))
+
+def reopen(path, *results: tuple[int, bool]) -> BatchJournal:
+    j = journal(path)
+    record(j, *results)
+    close(j)
+    return journal(path)
+
+def test_watermark_moves_over_contiguous_positions(tmp_path):
+    j = reopen(tmp_path / "j.jsonl", (0, True), (1, True), (3, True))
+    assert j.watermark == 2
+    assert j.checked == {3}
+    assert [j.is_done(index) for index in range(5)] == [True, True, False, True, False]
+    close(j)
+
+    j = reopen(tmp_path / "j.jsonl", (2, True))
+    assert j.watermark == 4
+    assert j.checked == set()
+    close(j)
+
+def test_failed_positions_are_not_done(tmp_path):
+    j = reopen(tmp_path / "j.jsonl", (0, True), (1, False), (2, True))
+    # failures don't hold the watermark back, they are kept aside
+    assert j.watermark == 3
+    assert j.failed == {1}
+    assert not j.is_done(1)
+    close(j)
+
+    j = reopen(tmp_path / "j.jsonl", (1, True))
+    assert j.failed == set()
+    assert j.is_done(1)
+    close(j)
+
+def test_resume_after_reopening(tmp_path):
+    path = tmp_path / "j.jsonl"
+    j = journal(path)
+    record(j, (0, True), (1, False), (2, True), (5, True))
+    close(j)
+
+    j = journal(path)
+    assert j.is_resumed
+    assert j.resumed == 3
+    assert [j.is_done(index) for index in range(6)] == [True, False, True, False, False, True]
+    close(j)
+
+def test_cut_short_line_is_skipped(tmp_path):
+    path = tmp_path / "j.jsonl"
+    j = journal(path)
+    record(j, (0, True), (1, True))
+    close(j)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"index": 2, "o')
+
+    j = journal(path)
+    assert j.is_done(1)
+    assert not j.is_done(2)
+    close(j)
+
+def test_other_source_forgets_progress(tmp_path):
+    path = tmp_path / "j.jsonl"
+    j = journal(path)
+    record(j, (0, True), (1, True))
+    close(j)
+
+    j = journal(path, source="/roster.csv\0101\0456")
+    assert not j.is_resumed
+    assert not j.is_done(0)
+    close(j)
+    with open(path, encoding="utf-8") as f:
+        assert json.loads(f.readline())["source"] == "/roster.csv\0101\0456"
+
+def test_restart_forgets_progress(tmp_path):
+    path = tmp_path / "j.jsonl"
+    j = journal(path)
+    record(j, (0, True))
+    close(j)
+
+    j = journal(path, restart=True)
+    assert not j.is_done(0)
+    close(j)
+
+def test_complete_run_removes_journal(tmp_path):
+    path = tmp_path / "j.jsonl"
+    j = journal(path)
+    record(j, (0, True))
+    close(j, complete=True)
+    assert not os.path.exists(path)
+
+def test_checkpoint_flushes_durable_targets_first(tmp_path):
+    path = tmp_path / "j.jsonl"
+    target = Durable()
+    j = journal(path, durable=[target], checkpoint_every=2, checkpoint_interval=3600)
+    record(j, (0, True))
+    assert target.flushed == 0
+    assert j.written == 0
+
+    record(j, (1, True))
+    assert target.flushed == 1
+    assert j.written == 2
+    close(j)
@@ -0,0 +1,55 @@
+import json
+import pytest
+from yarl import URL
+from checkege.metrics import Histogram, Metrics, endpoint_of
+
+def test_prometheus_output():
+    metrics = Metrics()
+    for value in (0.003, 0.02, 0.02, 7):
+        metrics.observe("request_seconds", ("exam",), value)
+    metrics.increment("responses_total", ("exam", "200"), 3)
+    metrics.increment("request_errors_total", ("captcha", 'Quoted"Error'))
+    lines = metrics.prometheus().splitlines()
+
+    assert lines[:3] == [
+        "# HELP checkege_request_seconds Total request time with the body, retries excluded.",
+        "# TYPE checkege_request_seconds histogram",
+        'checkege_request_seconds_bucket{endpoint="exam",le="0.005"} 1',
+    ]
+    assert 'checkege_request_seconds_bucket{endpoint="exam",le="0.025"} 3' in lines
+    assert 'checkege_request_seconds_bucket{endpoint="exam",le="5"} 3' in lines
+    assert 'checkege_request_seconds_bucket{endpoint="exam",le="10"} 4' in lines
+    assert 'checkege_request_seconds_bucket{endpoint="exam",le="+Inf"} 4' in lines
+    assert 'checkege_request_seconds_sum{endpoint="exam"} 7.043000' in lines
+    assert 'checkege_request_seconds_count{endpoint="exam"} 4' in lines
+    assert "# TYPE checkege_responses_total counter" in lines
+    assert 'checkege_responses_total{endpoint="exam",status="200"} 3' in lines
+    assert 'checkege_request_errors_total{endpoint="captcha",error="Quoted\\"Error"} 1' in lines
+    # nothing is written for metrics without observations
+    assert not any("dns_seconds" in line for line in lines)
+
+def test_histogram_quantiles_and_merge():
+    first, second = Histogram(), Histogram()
+    for value in (0.01, 0.02, 0.03):
+        first.observe(value)
+    second.observe(1.5)
+    first.merge(second)
+
+    assert (first.count, first.min, first.max) == (4, 0.01, 1.5)
+    assert first.sum == pytest.approx(1.56)
+    assert 0.01 <= first.quantile(0.5) <= 0.025
+    assert first.quantile(0.99) <= 1.5
+    assert Histogram().quantile(0.5) is None
+
+def test_metrics_are_written(tmp_path):
+    metrics = Metrics()
+    metrics.observe("phase_seconds", ("render",), 0.002)
+    metrics.write(str(tmp_path))
+
+    assert "checkege_phase_seconds_count{phase=\"render\"} 1" in (tmp_path / "checkege.prom").read_text()
+    summary = json.loads((tmp_path / "checkege.json").read_text())
+    assert summary["timings"]["phase_seconds{phase=render}"]["count"] == 1
+
+def test_endpoint_of():
+    assert endpoint_of(URL("http://localhost/api/participant/login?x=1")) == "participant/login"
+    assert endpoint_of("exam?x=1") == "exam"
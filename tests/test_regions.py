@@ -0,0 +1,39 @@
+import asyncio
+import time
+from checkege.regions import RegionCatalog, RegionIndex, index
+
+def test_resolve_by_number_and_name():
+    assert index.resolve(77) == 77
+    assert index.resolve(" 77 ") == 77
+    assert index.resolve("1000") is None
+    assert index.resolve("г. Москва") == 77
+    assert index.resolve("  Г.   МОСКВА ") == 77
+    assert index.resolve("Москва") is None
+
+def test_resolve_treats_yo_as_ye():
+    catalog = RegionIndex({1: "Орёл", 2: "Ёлкино"})
+    assert catalog.resolve("Орел") == 1
+    assert catalog.resolve("орёл") == 1
+    assert catalog.resolve("елкино") == 2
+
+def test_search_puts_prefixes_first():
+    catalog = RegionIndex({1: "Московская область", 2: "г. Москва", 3: "Мурманская область"})
+    assert catalog.search("моск") == ["Московская область", "г. Москва"]
+    assert catalog.search("область") == ["Московская область", "Мурманская область"]
+    assert catalog.search("") == ["г. Москва", "Московская область", "Мурманская область"]
+
+def test_catalog_is_cached_on_disk(tmp_path):
+    path = str(tmp_path / "regions.json")
+    catalog = RegionCatalog(path)
+    assert catalog.is_stale
+    assert catalog.index.resolve(77) == 77
+
+    async def fetch():
+        return {1: "Новый регион"}
+    asyncio.run(catalog.revalidate(fetch))
+
+    cached = RegionCatalog(path)
+    assert not cached.is_stale
+    assert cached.fetched <= time.time()
+    assert cached.index.resolve("новый регион") == 1
+    assert cached.index.resolve(77) is None
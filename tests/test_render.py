@@ -0,0 +1,62 @@
+import io
+import re
+from checkege.render import StreamingTable, measure, participant_rows, render
+
+ANSI = re.compile(r"\x1b\[[0-9;]*m")
+
+def plain(text: str) -> list[str]:
+    return ANSI.sub("", text).strip("\n").split("\n")
+
+class Out(io.StringIO):
+    '''
+    Counts writes, every frame should be one.
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, text: str) -> int:
+        self.writes += 1
+        return super().write(text)
+
+def test_render_table():
+    rows = [[("a", ""), ("long cell", "")], [("bbb", ""), ("c", "")]]
+    assert measure(rows) == [3, 9]
+    assert plain(render(rows)) == [
+        "┏━━━━━┳━━━━━━━━━━━┓",
+        "┃ a   ┃ long cell ┃",
+        "┣━━━━━╋━━━━━━━━━━━┫",
+        "┃ bbb ┃ c         ┃",
+        "┗━━━━━┻━━━━━━━━━━━┛",
+    ]
+
+def test_streaming_table_with_fixed_widths():
+    out = Out()
+    table = StreamingTable([3, 4], out)
+    table.add([[("a", ""), ("truncated", "")]])
+    table.add([[("b", ""), ("c", "")]])
+    table.close()
+
+    assert out.writes == 3
+    assert plain(out.getvalue()) == [
+        "┏━━━━━┳━━━━━━┓",
+        "┃ a   ┃ tru… ┃",
+        "┣━━━━━╋━━━━━━┫",
+        "┃ b   ┃ c    ┃",
+        "┗━━━━━┻━━━━━━┛",
+    ]
+
+def test_streaming_table_widens():
+    out = io.StringIO()
+    table = StreamingTable(out=out)
+    table.add([[("a", "")]])
+    table.add([[("wider", "")]])
+    table.close()
+    assert plain(out.getvalue())[-2:] == ["┃ wider ┃", "┗━━━━━━━┛"]
+
+def test_participant_error_row():
+    rows = participant_rows("Иванов", None, ValueError("boom"))
+    assert len(rows) == 1 and rows[0][0][0] == "Иванов"
+    assert rows[0][3][0] == "Ошибка: boom"
+    assert participant_rows("Иванов", [])[0][3][0] == "Нет доступных экзаменов"
@@ -0,0 +1,267 @@
+import asyncio
+import email.utils
+import multiprocessing
+import time
+import aiohttp
+import pytest
+from aiohttp import web
+from checkege import retry
+from checkege.batch import RosterEntry
+from checkege.client import CheckegeClient
+from checkege.errors import LoginError, PortalUnavailableError
+from checkege.retry import CircuitBreaker, RateLimit, RetryPolicy, parse_retry_after
+from checkege.transport import TransportConfig
+
+class Clock:
+    '''
+    Stands in for time.monotonic() of the retry module.
+    '''
+
+    def __init__(self, monkeypatch):
+        self.now = 1000.0
+        monkeypatch.setattr(retry.time, "monotonic", lambda: self.now)
+
+def test_parse_retry_after():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("") is None
+    assert parse_retry_after(" 7 ") == 7.0
+    assert parse_retry_after("soon") is None
+
+    date = email.utils.formatdate(time.time() + 60, usegmt=True)
+    assert 55 <= parse_retry_after(date) <= 60
+    # a date in the past means "right away"
+    assert parse_retry_after(email.utils.formatdate(time.time() - 60, usegmt=True)) == 0.0
+
+def test_retry_delay_is_bounded():
+    policy = RetryPolicy(base_delay=1, max_delay=5)
+    for attempt in range(8):
+        assert 0 <= policy.delay(attempt) <= min(5, 2 ** attempt)
+    assert policy.delay(0, retry_after=3) == 3
+    assert policy.delay(0, retry_after=100) == 5
+
+def test_breaker_opens_after_threshold(monkeypatch):
+    clock = Clock(monkeypatch)
+    breaker = CircuitBreaker(threshold=3, reset_timeout=10, max_timeout=25)
+
+    breaker.record_failure()
+    breaker.record_failure()
+    assert not breaker.is_open
+    breaker.record_failure()
+    assert breaker.is_open
+    assert breaker.opened_until == 1010
+    assert breaker.opened == 1
+
+    clock.now = 1010
+    assert not breaker.is_open
+    # a failed probe opens the circuit again for twice as long, up to max_timeout
+    breaker.record_failure()
+    assert breaker.opened_until == 1030
+    clock.now = 1030
+    breaker.record_failure()
+    assert breaker.opened_until == 1055
+
+    breaker.record_success()
+    assert breaker.failures == 0
+    assert breaker.timeout == 10
+
+def test_breaker_opens_on_retry_after(monkeypatch):
+    Clock(monkeypatch)
+    breaker = CircuitBreaker(threshold=5)
+    breaker.record_failure(retry_after=42)
+    assert breaker.is_open
+    assert breaker.opened_until == 1042
+    # zero doesn't pause anything
+    breaker = CircuitBreaker(threshold=5)
+    breaker.record_failure(retry_after=0)
+    assert not breaker.is_open
+
+def test_breaker_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=0.05)
+    order = []
+
+    async def request():
+        async with breaker.request():
+            order.append("start")
+            await asyncio.sleep(0.02)
+            order.append("end")
+            # the first probe fails, the rest succeed
+            if len(order) == 2:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+
+    async def run():
+        breaker.record_failure()
+        assert breaker.is_open
+        start = time.monotonic()
+        await asyncio.gather(*(request() for _ in range(3)))
+        return time.monotonic() - start
+
+    elapsed = asyncio.run(run())
+    # requests waited for the pause, went one by one while half-open,
+    # and the failed probe paused them again for twice as long
+    assert order == ["start", "end"] * 3
+    assert elapsed >= 0.05 + 0.1
+    assert breaker.failures == 0
+    assert not breaker.is_open
+
+def test_breaker_closed_lets_requests_through_together():
+    breaker = CircuitBreaker(threshold=3)
+    running = []
+
+    async def request():
+        async with breaker.request():
+            running.append(1)
+            await asyncio.sleep(0.01)
+            return len(running)
+
+    async def run():
+        breaker.record_failure()
+        return await asyncio.gather(*(request() for _ in range(3)))
+    assert asyncio.run(run()) == [3, 3, 3]
+
+def test_rate_limit_spacing(monkeypatch):
+    clock = Clock(monkeypatch)
+    limit = RateLimit(rate=10)
+    assert [limit.reserve() for _ in range(3)] == pytest.approx([0, 0.1, 0.2])
+
+    # an idle limit doesn't save up slots beyond the burst
+    clock.now += 10
+    assert [limit.reserve() for _ in range(2)] == pytest.approx([0, 0.1])
+
+def test_rate_limit_burst(monkeypatch):
+    clock = Clock(monkeypatch)
+    limit = RateLimit(rate=10, burst=3)
+    assert [limit.reserve() for _ in range(5)] == pytest.approx([0, 0, 0, 0.1, 0.2])
+    clock.now += 0.1
+    assert limit.reserve() == pytest.approx(0.2)
+
+def test_rate_limit_shared_between_processes(monkeypatch):
+    Clock(monkeypatch)
+    context = multiprocessing.get_context("spawn")
+    limit = RateLimit(rate=4, context=context)
+    # a copy in another process works on the same shared value
+    other = RateLimit.__new__(RateLimit)
+    other.__dict__.update(limit.__dict__)
+    other.local_tat = 0.0
+    assert [limit.reserve(), other.reserve(), limit.reserve()] == pytest.approx([0, 0.25, 0.5])
+
+def test_rate_limit_acquire_sleeps():
+    limit = RateLimit(rate=50)
+
+    async def run():
+        start = time.monotonic()
+        for _ in range(6):
+            await limit.acquire()
+        return time.monotonic() - start
+    assert asyncio.run(run()) >= 0.09
+
+class Portal:
+    '''
+    Answers every request with the next of `statuses` (the last one repeats).
+    '''
+
+    def __init__(self, statuses: list[int], delay: float = 0, headers: dict | None = None):
+        self.statuses = statuses
+        self.delay = delay
+        self.headers = headers or {}
+        self.hits = 0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        status = self.statuses[min(self.hits, len(self.statuses) - 1)]
+        self.hits += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if status == 200:
+            return web.json_response({"Token": "token", "Image": ""})
+        return web.Response(status=status, headers=self.headers if status != 204 else None)
+
+def call(monkeypatch, portal: Portal | None, request: str, **kwargs):
+    async def run():
+        runner = None
+        if portal is None:
+            # nothing listens on this port
+            base = "http://127.0.0.1:9/api/"
+        else:
+            app = web.Application()
+            app.router.add_route("*", "/api/{endpoint:.*}", portal.handle)
+            runner = web.AppRunner(app, access_log=None)
+            await runner.setup()
+            site = web.TCPSite(runner, "127.0.0.1", 0)
+            await site.start()
+            base = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/api/"
+        monkeypatch.setattr(CheckegeClient, "BASE_URL", base)
+
+        client = CheckegeClient(retry=RetryPolicy(attempts=3, base_delay=0.001), **kwargs)
+        try:
+            if request == "captcha":
+                return await client.get_captcha()
+            data = RosterEntry("Иван", "Иванов", "Иванович", "123456", "77").login_data()
+            data.setCaptcha("token", "000000")
+            return await client.login(data)
+        finally:
+            await client.stop()
+            if runner:
+                await runner.cleanup()
+    return asyncio.run(run())
+
+@pytest.mark.parametrize("status", [429, 500, 502, 503, 504])
+def test_idempotent_request_is_retried(monkeypatch, status):
+    portal = Portal([status, 200])
+    assert call(monkeypatch, portal, "captcha") == ("token", b"")
+    assert portal.hits == 2
+
+def test_retries_are_limited(monkeypatch):
+    portal = Portal([503])
+    with pytest.raises(PortalUnavailableError) as e:
+        call(monkeypatch, portal, "captcha")
+    assert e.value.status == 503
+    assert portal.hits == 3
+
+@pytest.mark.parametrize("status", [400, 403, 404])
+def test_client_errors_are_not_retried(monkeypatch, status):
+    portal = Portal([status, 200])
+    with pytest.raises(Exception) as e:
+        call(monkeypatch, portal, "captcha")
+    assert not isinstance(e.value, PortalUnavailableError)
+    assert portal.hits == 1
+
+@pytest.mark.parametrize("status, hits", [(500, 1), (502, 1), (504, 1), (429, 2), (503, 2)])
+def test_login_is_retried_only_when_not_processed(monkeypatch, status, hits):
+    portal = Portal([status, 204])
+    if hits == 1:
+        with pytest.raises(LoginError):
+            call(monkeypatch, portal, "login")
+    else:
+        call(monkeypatch, portal, "login")
+    assert portal.hits == hits
+
+def test_connection_error_is_retried(monkeypatch):
+    breaker = CircuitBreaker(threshold=10)
+    with pytest.raises(PortalUnavailableError):
+        call(monkeypatch, None, "captcha", breaker=breaker)
+    assert breaker.failures == 3
+
+def test_timeout_of_login_is_not_retried(monkeypatch):
+    portal = Portal([204], delay=0.5)
+    transport = TransportConfig(timeouts={"participant/login": aiohttp.ClientTimeout(total=0.1)})
+    with pytest.raises(PortalUnavailableError):
+        call(monkeypatch, portal, "login", transport=transport)
+    assert portal.hits == 1
+
+def test_timeout_of_idempotent_request_is_retried(monkeypatch):
+    portal = Portal([200], delay=0.5)
+    transport = TransportConfig(timeouts={"captcha": aiohttp.ClientTimeout(total=0.1)})
+    with pytest.raises(PortalUnavailableError):
+        call(monkeypatch, portal, "captcha", transport=transport)
+    assert portal.hits == 3
+
+def test_retry_after_opens_shared_breaker(monkeypatch):
+    portal = Portal([429, 200], headers={"Retry-After": "1"})
+    breaker = CircuitBreaker(threshold=10)
+    start = time.monotonic()
+    call(monkeypatch, portal, "captcha", breaker=breaker)
+    # the retry waited for Retry-After, and success reset the breaker
+    assert time.monotonic() - start >= 0.9
+    assert breaker.opened == 1
+    assert breaker.failures == 0
@@ -0,0 +1,105 @@
+import asyncio
+import os
+import sys
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from checkege.client import CheckegeClient
+from checkege.service import ResultsService
+from checkege.sessions import SessionStore
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+from mock_server import MockPortal
+
+PARTICIPANT = {"name": "Иван", "surname": "Иванов", "patronymic": "Иванович", "passnum": "123456", "region": "77"}
+
+def post(tmp_path, body) -> tuple[int, dict]:
+    async def run():
+        store = SessionStore(str(tmp_path / "sessions.db"))
+        # without a captcha solver valid data ends at 401, no request is made
+        service = ResultsService(store)
+        async with TestClient(TestServer(service.app())) as client:
+            response = await client.post("/results", json=body)
+            data = await response.json()
+        await service.close()
+        await store.close()
+        return response.status, data
+    return asyncio.run(run())
+
+@pytest.mark.parametrize("changes", [
+    {},
+    {"passnum": 123456},
+    {"passnum": None, "passport": 123456},
+    {"region": 77},
+    {"region": "г. Москва"},
+])
+def test_valid_participant(tmp_path, changes):
+    status, data = post(tmp_path, {**PARTICIPANT, **changes})
+    assert status == 401
+    assert len(data["participant"]) == 64
+
+@pytest.mark.parametrize("body, error", [
+    ([PARTICIPANT], "JSON object"),
+    ({**PARTICIPANT, "name": 5}, "\"name\" must be a string"),
+    ({**PARTICIPANT, "surname": ["Иванов"]}, "\"surname\" must be a string"),
+    ({**PARTICIPANT, "patronymic": ""}, "Missing field \"patronymic\""),
+    ({**PARTICIPANT, "passnum": 12345}, "6 digits"),
+    ({**PARTICIPANT, "passnum": 123456.0}, "6 digits"),
+    ({**PARTICIPANT, "region": 1000}, "Unknown region"),
+    ({**PARTICIPANT, "region": {"id": 77}}, "Unknown region"),
+])
+def test_invalid_participant(tmp_path, body, error):
+    status, data = post(tmp_path, body)
+    assert status == 400
+    assert error in data["error"]
+
+def run_service(tmp_path, monkeypatch, scenario, **kwargs):
+    '''
+    Runs `scenario(service, client, portal)` against a mock portal.
+    '''
+    portal = MockPortal(captchas=4, seed=1, latency={"exam": 0.1})
+
+    async def solve(image: bytes) -> str | None:
+        return portal.code_of(image)
+
+    async def run():
+        monkeypatch.setattr(CheckegeClient, "BASE_URL", await portal.start())
+        store = SessionStore(str(tmp_path / "sessions.db"))
+        service = ResultsService(store, solve, **kwargs)
+        try:
+            async with TestClient(TestServer(service.app())) as client:
+                return await scenario(service, client, portal)
+        finally:
+            await service.close()
+            await store.close()
+            await portal.runner.cleanup()
+    return asyncio.run(run())
+
+def test_unknown_participant_takes_no_session(tmp_path, monkeypatch):
+    async def scenario(service, client, portal):
+        response = await client.get(f"/results/{'0' * 64}")
+        return response.status, len(service.clients)
+    assert run_service(tmp_path, monkeypatch, scenario) == (401, 0)
+
+def test_login_is_not_lost_behind_a_shared_fetch(tmp_path, monkeypatch):
+    async def scenario(service, client, portal):
+        key = (await (await client.post("/results", json=PARTICIPANT)).json())["participant"]
+        # the portal forgets the session, the service doesn't know yet
+        portal.sessions.clear()
+
+        async def post():
+            await asyncio.sleep(0.001)
+            return await client.post("/results", json=PARTICIPANT)
+        responses = await asyncio.gather(client.get(f"/results/{key}"), post())
+        return [response.status for response in responses]
+    # without login data the GET can only fail, the POST logs in again
+    assert run_service(tmp_path, monkeypatch, scenario, ttl=0) == [401, 200]
+
+def test_concurrent_requests_share_one_fetch(tmp_path, monkeypatch):
+    async def scenario(service, client, portal):
+        first = await client.post("/results", json=PARTICIPANT)
+        key = (await first.json())["participant"]
+        upstream = service.upstream
+        service.cache.clear()
+        responses = await asyncio.gather(*(client.get(f"/results/{key}") for _ in range(5)))
+        return [response.status for response in responses], service.upstream - upstream
+    assert run_service(tmp_path, monkeypatch, scenario) == ([200] * 5, 1)
@@ -0,0 +1,134 @@
+import asyncio
+import os
+import sys
+import time
+from http.cookies import SimpleCookie
+import aiohttp
+from yarl import URL
+from checkege.batch import RosterEntry
+from checkege.client import CheckegeClient
+from checkege.sessions import SessionStore, dump_cookies, load_cookies
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+from mock_server import MockPortal
+
+URL_BASE = "https://checkege.rustest.ru/api/"
+
+def jar_with(**cookies: str) -> aiohttp.CookieJar:
+    async def make():
+        return aiohttp.CookieJar()
+    jar = asyncio.run(make())
+    morsels = SimpleCookie()
+    for key, value in cookies.items():
+        morsels[key] = value
+        morsels[key]["path"] = "/"
+    jar.update_cookies(morsels, URL(URL_BASE))
+    return jar
+
+def test_cookies_round_trip():
+    jar = jar_with(Participant="token", other="value")
+    restored = jar_with()
+    load_cookies(restored, dump_cookies(jar), URL_BASE)
+
+    cookies = restored.filter_cookies(URL(URL_BASE))
+    assert {key: morsel.value for key, morsel in cookies.items()} == {"Participant": "token", "other": "value"}
+    # host-only cookies stay host-only
+    assert not restored.filter_cookies(URL("https://other.rustest.ru/api/"))
+
+def test_store_round_trip(tmp_path):
+    path = str(tmp_path / "sessions.db")
+
+    async def write():
+        store = SessionStore(path)
+        store.put("first", "[]", expires=2000000000.0, used=1000.0, participant="key")
+        store.put("second", "[1]")
+        # pending writes are seen before they are committed
+        assert (await store.load("first")).cookies == "[]"
+        await store.close()
+
+    async def read():
+        store = SessionStore(path)
+        try:
+            first = await store.load("first")
+            second = await store.load("second")
+            store.delete("second")
+            await store.flush()
+            return first, second, await store.load("second"), await store.load("third")
+        finally:
+            await store.close()
+
+    asyncio.run(write())
+    first, second, deleted, missing = asyncio.run(read())
+    assert (first.cookies, first.expires, first.used, first.participant) == ("[]", 2000000000.0, 1000.0, "key")
+    assert (second.cookies, second.expires, second.used, second.participant) == ("[1]", None, None, None)
+    assert deleted is None and missing is None
+
+def test_writes_are_committed_in_batches(tmp_path):
+    store = SessionStore(str(tmp_path / "sessions.db"), batch_size=3)
+
+    def committed() -> int:
+        return store.db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    async def run():
+        store.put("a", "[]")
+        store.put("b", "[]")
+        await asyncio.sleep(0.05)
+        before = committed()
+        store.put("c", "[]")
+        await store.flush_task
+        return before, committed()
+    try:
+        assert asyncio.run(run()) == (0, 3)
+    finally:
+        asyncio.run(store.close())
+
+def test_session_validity(tmp_path, monkeypatch):
+    portal = MockPortal(captchas=4, seed=1, session_ttl=600)
+    store = SessionStore(str(tmp_path / "sessions.db"))
+
+    def exam_requests() -> int:
+        return portal.counts.get(("exam", 200), 0)
+
+    async def run():
+        monkeypatch.setattr(CheckegeClient, "BASE_URL", await portal.start())
+        try:
+            client = CheckegeClient(store=store, session_key="key")
+            token, image = await client.get_captcha()
+            data = RosterEntry("Иван", "Иванов", "Иванович", "123456", "77").login_data()
+            data.setCaptcha(token, portal.code_of(image))
+            await client.login(data)
+            await client.stop()
+
+            client = CheckegeClient(store=store, session_key="key")
+            await client.restore()
+            try:
+                assert client.is_logged_in
+                assert 590 < client.expires_in <= 600
+                assert client.needs_refresh(900) and not client.needs_refresh(300)
+                # the session has just worked, it is trusted without a request
+                assert await client.validate(trust=300)
+                assert exam_requests() == 0
+                # otherwise it is probed, and the probe serves the next results
+                assert await client.validate(trust=0)
+                assert len(await client.get_results()) > 0
+                assert exam_requests() == 1
+            finally:
+                await client.stop()
+        finally:
+            await store.close()
+            await portal.runner.cleanup()
+    asyncio.run(run())
+
+def test_expired_session_is_dropped(tmp_path):
+    store = SessionStore(str(tmp_path / "sessions.db"))
+
+    async def run():
+        store.put("key", "[]", expires=time.time() - 1)
+        client = CheckegeClient(store=store, session_key="key")
+        try:
+            await client.restore()
+            return client.is_logged_in, await store.load("key")
+        finally:
+            await client.stop()
+            await store.close()
+    assert asyncio.run(run()) == (False, None)
@@ -0,0 +1,99 @@
+import asyncio
+import os
+import sqlite3
+import sys
+from checkege import vault as vault_module
+from checkege.batch import READ_CHUNK, RosterEntry
+from checkege.shard import FEED_SIZE, ShardedRunner
+from checkege.sessions import SessionStore
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+from mock_server import MockPortal
+from conftest import roster
+
+def test_sessions_are_saved_before_results_arrive(tmp_path, monkeypatch):
+    portal = MockPortal(captchas=4, seed=1)
+    store = SessionStore(str(tmp_path / "sessions.db"))
+    entries = [RosterEntry("Иван", "Иванов", "Иванович", f"00000{i}", "77") for i in range(6)]
+    saved = []
+
+    async def solve(image: bytes) -> str | None:
+        return portal.code_of(image)
+
+    def on_result(result):
+        # what a journal checkpoint taken right now would rely on
+        key = result.entry.login_data().participant_key()
+        with sqlite3.connect(store.path) as db:
+            saved.append(db.execute("SELECT 1 FROM sessions WHERE key = ?", (key,)).fetchone() is not None)
+
+    async def run():
+        # workers are separate processes, they find the mock through the environment
+        monkeypatch.setenv("CHECKEGE_BASE_URL", await portal.start())
+        try:
+            return await ShardedRunner(solve, processes=2, concurrency=2, store=store).run(entries, on_result)
+        finally:
+            await portal.runner.cleanup()
+            await store.close()
+    results = asyncio.run(run())
+
+    assert all(result.ok for result in results)
+    assert saved == [True] * len(entries)
+
+def test_vault_profiles_are_decrypted_by_workers(fast_vault, monkeypatch):
+    portal = MockPortal(captchas=4, seed=1)
+    asyncio.run(fast_vault.import_entries(roster("000001", "000002", "000003", "000004")))
+    entries = asyncio.run(fast_vault.entries())
+
+    def decrypt(self, token):
+        raise AssertionError("decrypted in the parent")
+    monkeypatch.setattr(vault_module.Vault, "decrypt", decrypt)
+
+    async def solve(image: bytes) -> str | None:
+        return portal.code_of(image)
+
+    async def run():
+        monkeypatch.setenv("CHECKEGE_BASE_URL", await portal.start())
+        try:
+            return await ShardedRunner(solve, processes=2, concurrency=2).run(entries)
+        finally:
+            await portal.runner.cleanup()
+    results = asyncio.run(run())
+
+    assert all(result.ok for result in results)
+    assert [result.entry.passnum for result in results] == ["000001", "000002", "000003", "000004"]
+
+def test_roster_is_streamed_to_workers(monkeypatch):
+    portal = MockPortal(captchas=4, seed=1)
+    size = 1200
+    read = 0
+    lead = []
+    checked = []
+
+    def generate():
+        nonlocal read
+        for i in range(size):
+            # skipped rows are not counted, they never reach the workers
+            read += 1 if i % 3 else 0
+            yield RosterEntry("Иван", "Иванов", "Иванович", f"{i:06d}", "77")
+
+    async def solve(image: bytes) -> str | None:
+        return portal.code_of(image)
+
+    def on_result(result):
+        assert result.ok
+        checked.append(result.index)
+        lead.append(read - len(checked))
+
+    async def run():
+        monkeypatch.setenv("CHECKEGE_BASE_URL", await portal.start())
+        try:
+            runner = ShardedRunner(solve, processes=2, concurrency=4)
+            return await runner.run(generate(), on_result, skip=lambda index: index % 3 == 0, collect=False)
+        finally:
+            await portal.runner.cleanup()
+    results = asyncio.run(run())
+
+    assert results == []
+    assert sorted(checked) == [index for index in range(size) if index % 3]
+    # the parent reads ahead only a chunk and what the workers hold
+    assert max(lead) < READ_CHUNK + 2 * 2 * (FEED_SIZE + 2) + FEED_SIZE
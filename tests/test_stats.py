@@ -0,0 +1,48 @@
+import random
+import pytest
+from checkege.stats import ResultColumns, aggregate, aggregate_numpy, aggregate_python
+
+def columns(size: int, seed: int = 1) -> ResultColumns:
+    rng = random.Random(seed)
+    result = ResultColumns()
+    for _ in range(size):
+        passed = rng.choice([None, False, True])
+        mark = rng.randint(0, 100) if passed is not None and rng.random() < 0.8 else None
+        result.append(rng.choice(["Математика", "Физика", "Русский язык", None]),
+                      rng.choice([None, 50, 77, 78]),
+                      rng.choice(["2025-06-02T00:00:00", "2025-06-05T00:00:00"]),
+                      rng.random() < 0.2, rng.choice([None, 0, 100]), mark, passed,
+                      rng.randint(0, 3) if passed is not None else -1)
+    return result
+
+def rows(found: list[tuple]) -> list[tuple]:
+    return sorted((tuple(key), *values) for key, *values in found)
+
+@pytest.mark.parametrize("by", [("subject",), ("region",), ("subject", "region"),
+                                ("date", "oral"), ("subject", "region", "date", "oral")])
+def test_numpy_matches_python(by):
+    np = pytest.importorskip("numpy")
+    data = columns(2000)
+    expected = rows(aggregate_python(data, by))
+    found = rows(aggregate_numpy(np, data, by))
+
+    assert [row[:4] for row in found] == [row[:4] for row in expected]
+    assert [row[6] for row in found] == [row[6] for row in expected]
+    for (*_, mean, quantiles, _), (*_, expected_mean, expected_quantiles, _) in zip(found, expected):
+        assert mean == pytest.approx(expected_mean)
+        assert quantiles == pytest.approx(expected_quantiles)
+
+def test_groups_without_marks():
+    np = pytest.importorskip("numpy")
+    data = ResultColumns()
+    data.append("Математика", 77, "2025-06-02", False, 0, None, None, -1)
+    data.append("Физика", 77, "2025-06-05", False, 100, 80, True, 3)
+    data.append("Физика", 77, "2025-06-05", False, 100, 60, True, 2)
+
+    groups = aggregate(data, ("subject",), numpy=np)
+    assert [group.key for group in groups] == [("Математика",), ("Физика",)]
+    assert groups[0].mean is None and groups[0].quantiles == [None] * 4
+    assert groups[0].pass_rate is None
+    assert groups[1].mean == 70 and groups[1].quantiles[1] == 70
+    assert groups[1].bands == [0, 0, 1, 1]
+    assert rows(aggregate_numpy(np, data, ("subject",))) == rows(aggregate_python(data, ("subject",)))
@@ -0,0 +1,36 @@
+import asyncio
+import os
+import sys
+import aiohttp
+from checkege.client import CheckegeClient
+from checkege.transport import DEFAULT_TIMEOUTS, ConnectionStats, TransportConfig
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+from mock_server import MockPortal
+
+def test_timeouts_per_endpoint():
+    short = aiohttp.ClientTimeout(total=1)
+    transport = TransportConfig(timeouts={"captcha": short})
+    assert transport.timeout("captcha") is short
+    assert transport.timeout("/captcha?x=1") is short
+    assert transport.timeout("exam") is DEFAULT_TIMEOUTS["exam"]
+    assert transport.timeout("something/else") is DEFAULT_TIMEOUTS["default"]
+
+def test_connections_are_reused(monkeypatch):
+    portal = MockPortal(captchas=4, seed=1)
+    stats = ConnectionStats()
+
+    async def run():
+        monkeypatch.setattr(CheckegeClient, "BASE_URL", await portal.start())
+        client = CheckegeClient(stats=stats)
+        try:
+            for _ in range(5):
+                await client.get_captcha()
+        finally:
+            await client.stop()
+            await portal.runner.cleanup()
+    asyncio.run(run())
+
+    assert stats.requests == 5
+    assert (stats.created, stats.reused) == (1, 4)
+    assert stats.reuse_ratio == 0.8
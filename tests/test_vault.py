@@ -0,0 +1,87 @@
+import asyncio
+import os
+import threading
+import pytest
+from checkege import cli
+from checkege import vault as vault_module
+from conftest import roster
+
+def test_export_decrypts_off_the_event_loop(fast_vault, monkeypatch):
+    asyncio.run(fast_vault.import_entries(roster("000001", "000002", "000003")))
+    threads = set()
+    decrypt = vault_module.Vault.decrypt
+
+    def recording(self, token):
+        threads.add(threading.current_thread())
+        return decrypt(self, token)
+    monkeypatch.setattr(vault_module.Vault, "decrypt", recording)
+
+    entries = asyncio.run(fast_vault.export_entries())
+    assert [entry.passnum for entry in entries] == ["000001", "000002", "000003"]
+    assert threads and threading.main_thread() not in threads
+
+def test_export_needs_unlocked_vault(tmp_path):
+    v = vault_module.Vault(str(tmp_path / "vault.db"))
+    with pytest.raises(ValueError):
+        asyncio.run(v.export_entries())
+    v.close()
+
+def test_vault_fingerprint_follows_updates(fast_vault):
+    asyncio.run(fast_vault.import_entries(roster("000001", "000002", "000003")))
+    before = fast_vault.fingerprint()
+    assert fast_vault.fingerprint() == before
+
+    # a re-imported profile is moved to the end, the count stays the same
+    asyncio.run(fast_vault.import_entries(roster("000001")))
+    entries = asyncio.run(fast_vault.entries())
+    assert [entry.entry.passnum for entry in entries] == ["000002", "000003", "000001"]
+    assert fast_vault.count() == 3
+    assert fast_vault.fingerprint() != before
+
+def test_vault_journal_is_not_resumed_after_reimport(fast_vault, tmp_path, monkeypatch):
+    monkeypatch.setenv("CHECKEGE_SESSIONS", str(tmp_path / "sessions.db"))
+    monkeypatch.setenv("CHECKEGE_CHECKPOINTS", str(tmp_path / "checkpoints"))
+    os.makedirs(tmp_path / "checkpoints")
+    asyncio.run(fast_vault.import_entries(roster("000001", "000002", "000003")))
+
+    app = cli.Cli()
+    app.vault = fast_vault
+    app.open_journal(None, restart=False)
+    asyncio.run(app.journal.record(0, True))
+    asyncio.run(app.journal.close())
+
+    app.open_journal(None, restart=False)
+    assert app.journal.is_done(0)
+    asyncio.run(app.journal.close())
+
+    asyncio.run(fast_vault.import_entries(roster("000001")))
+    app.open_journal(None, restart=False)
+    assert not app.journal.is_resumed
+    assert not app.journal.is_done(0)
+    asyncio.run(app.journal.close())
+    asyncio.run(app.store.close())
+
+def test_profiles_are_encrypted_at_rest(fast_vault):
+    asyncio.run(fast_vault.import_entries(roster("000001", "000002")))
+    with open(fast_vault.path, "rb") as f:
+        data = f.read()
+    assert "Иванов".encode() not in data and b"000001" not in data
+
+    found = asyncio.run(fast_vault.find("Иванов Иван Иванович"))
+    assert sorted(entry.entry.passnum for entry in found) == ["000001", "000002"]
+    asyncio.run(fast_vault.delete(roster("000001")[0]))
+    assert [entry.entry.passnum for entry in asyncio.run(fast_vault.entries())] == ["000002"]
+
+def test_wrong_password(fast_vault):
+    asyncio.run(fast_vault.import_entries(roster("000001")))
+    v = vault_module.Vault(fast_vault.path)
+    try:
+        assert v.exists and not v.is_unlocked
+        with pytest.raises(ValueError):
+            asyncio.run(v.unlock("wrong"))
+        with pytest.raises(ValueError):
+            asyncio.run(v.entries())
+        asyncio.run(v.unlock("password"))
+        assert [entry.entry.passnum for entry in asyncio.run(v.entries())] == ["000001"]
+    finally:
+        v.close()
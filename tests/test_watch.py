@@ -0,0 +1,77 @@
+import asyncio
+import pytest
+from checkege.errors import SessionExpiredError
+from checkege.exams_model import ExamStatus
+from checkege.watch import Watcher
+
+def exam(exam_id: int, subject: str, status: int = 0) -> ExamStatus:
+    return ExamStatus({"ExamId": exam_id, "ExamDate": "2025-06-02T00:00:00", "Subject": subject,
+                       "Status": status, "HasResult": False})
+
+class Client:
+    '''
+    Returns the next of `polls` on every poll, and stops the watch after the last one.
+    '''
+
+    def __init__(self, *polls: list[ExamStatus] | None, expiring: bool = False):
+        self.polls = list(polls)
+        self.expiring = expiring
+
+    async def poll_results(self) -> list[ExamStatus] | None:
+        if not self.polls:
+            raise asyncio.CancelledError
+        return self.polls.pop(0)
+
+    def needs_refresh(self, margin: float) -> bool:
+        return self.expiring
+
+def watch(watcher: Watcher) -> list[tuple]:
+    updates = []
+    watcher.delay = lambda: 0
+
+    async def run():
+        try:
+            await watcher.watch(lambda *update: updates.append(update))
+        except asyncio.CancelledError:
+            pass
+    asyncio.run(run())
+    return updates
+
+def test_only_changes_are_reported():
+    math, physics = exam(1, "Математика"), exam(2, "Физика")
+    updates = watch(Watcher(Client([math, physics], None, [math, physics], [math, exam(2, "Физика", 100)])))
+
+    assert len(updates) == 2
+    assert updates[0][1] == {(1, False), (2, False)}
+    assert updates[1][1] == {(2, False)}
+    assert updates[1][2] == []
+
+def test_removed_exams_are_reported():
+    math, physics = exam(1, "Математика"), exam(2, "Физика")
+    updates = watch(Watcher(Client([math, physics], [math])))
+
+    assert len(updates) == 2
+    exams, changed, removed = updates[1]
+    assert [e.id for e in exams] == [1]
+    assert changed == set()
+    assert [e.subject for e in removed] == ["Физика"]
+
+def test_failed_refresh_stops_watching():
+    calls = []
+
+    async def refresh() -> bool:
+        calls.append(1)
+        return False
+
+    with pytest.raises(SessionExpiredError):
+        watch(Watcher(Client([exam(1, "Математика")], expiring=True), refresh=refresh))
+    assert calls == [1]
+
+def test_successful_refresh_keeps_watching():
+    client = Client([exam(1, "Математика")], expiring=True)
+
+    async def refresh() -> bool:
+        client.expiring = False
+        return True
+
+    assert len(watch(Watcher(client, refresh=refresh))) == 1